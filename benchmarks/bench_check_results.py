@@ -0,0 +1,78 @@
+'''
+Compare the memory used and the time taken to build 50k config check
+results, using the structured NagiosCheckResult against a dictionary
+holding the output rendered up front as results were built before.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_check_results
+'''
+import time
+import tracemalloc
+from typing import Callable, List
+from station_config_check.config_check.compare_config import \
+    ConfigCheckOutput
+from station_config_check.nagios.models import NagiosOutputCode, \
+    NagiosPerformance, NagiosResult, NagiosVerbose
+from station_config_check.nagios.nrdp import NagiosCheckResult, \
+    NagiosCheckResults
+
+RESULTS = 50000
+
+DIFFERENCES = [
+    ' <apollo/acquisition/storeOnlyLocalData> ' +
+    '<http://www.w3.org/1999/02/22-rdf-syntax-ns#value> "false".'
+]
+
+
+def build_eager(index: int) -> dict:
+    performance = NagiosPerformance(label='Config', value=99.5, uom='%')
+    result = NagiosResult(
+        summary='Similarity between config files: 99.5%',
+        verbose=NagiosVerbose.multiline,
+        status=NagiosOutputCode.critical,
+        performances=[performance],
+        details='Changes:\n' + '\n'.join(DIFFERENCES)
+    )
+    return dict(
+        hostname=f'XX-STA{index}-TITAN',
+        servicename='Config Check',
+        state=NagiosOutputCode.critical.value,
+        output=str(result))
+
+
+def build_lazy(index: int) -> NagiosCheckResult:
+    return NagiosCheckResult(
+        hostname=f'XX-STA{index}-TITAN',
+        servicename='Config Check',
+        state=NagiosOutputCode.critical.value,
+        output=ConfigCheckOutput(
+            percentage=99.5,
+            state=NagiosOutputCode.critical,
+            differences=DIFFERENCES
+        ))
+
+
+def measure(
+    name: str,
+    build: Callable[[int], object]
+):
+    tracemalloc.start()
+    start = time.perf_counter()
+    results: List[object] = [build(index) for index in range(RESULTS)]
+    elapsed = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    NagiosCheckResults(results).to_xml()
+    serialised = time.perf_counter() - start
+
+    print(f'{name:>8}: built in {elapsed:.3f}s, ' +
+          f'{memory / RESULTS:.0f} bytes per result, ' +
+          f'serialised in {serialised:.3f}s')
+
+
+if __name__ == '__main__':
+    measure('eager', build_eager)
+    measure('lazy', build_lazy)
@@ -0,0 +1,45 @@
+'''
+Measure the time taken to query the drift of a fleet over 90 days of hourly
+sweeps from the similarity history, with configs that change often.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_history
+'''
+import os
+import random
+import tempfile
+import time
+from station_config_check.config_check.history import SimilarityHistory
+
+HOSTS = 5000
+DAYS = 90
+# Number of times the similarity of each host changes over the period
+CHANGES = 50
+
+
+def main():
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'similarity')
+        history = SimilarityHistory(path)
+        start = time.time() - DAYS * 86400
+        sweeps = sorted(random.sample(range(DAYS * 24), CHANGES))
+        for sweep in sweeps:
+            for host in range(HOSTS):
+                history.record(
+                    f'XX-STA{host}-TITAN', random.uniform(90, 100),
+                    start + sweep * 3600)
+            history.flush()
+        size = os.path.getsize(path)
+
+        elapsed = time.perf_counter()
+        drifts = SimilarityHistory(path).drift(since=start + 86400)
+        elapsed = time.perf_counter() - elapsed
+
+    print(f'{HOSTS * CHANGES} points, {size / 1e6:.1f} MB: drift of ' +
+          f'{len(drifts)} hosts queried in {elapsed:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
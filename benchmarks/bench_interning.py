@@ -0,0 +1,62 @@
+'''
+Compare the time taken to compare a fleet of configs that share most of
+their lines with the string backend and with the interned backend.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_interning
+'''
+import random
+import time
+from typing import List
+from station_config_check.config_check.compare_config import compare_configs
+from station_config_check.config_check.interning import LineTable
+
+HOSTS = 50
+LINES = 2000
+
+
+def make_fleet() -> List[str]:
+    random.seed(0)
+    golden = [
+        f'<apollo/setting{index}> <value> "{index % 7}".'
+        for index in range(LINES)]
+
+    fleet = []
+    for host in range(HOSTS):
+        running = list(golden)
+        running[0] = f'<apollo/station> <value> "STA{host}".'
+        for _ in range(random.randint(0, 5)):
+            index = random.randrange(LINES)
+            running[index] = running[index].replace('"', '"changed ')
+        fleet.append('\n'.join(running))
+    return ['\n'.join(golden)] + fleet
+
+
+def measure(
+    backend: str,
+    fleet: List[str]
+):
+    golden, configs = fleet[0], fleet[1:]
+    line_table = LineTable()
+    changed = 0
+
+    start = time.perf_counter()
+    for config in configs:
+        _, differences = compare_configs(
+            golden_image=golden,
+            running_config=config,
+            backend=backend,
+            line_table=line_table
+        )
+        changed += len(differences)
+    elapsed = time.perf_counter() - start
+
+    print(f'{backend:>8}: {len(configs)} configs compared in ' +
+          f'{elapsed:.3f}s, {changed} changed lines')
+
+
+if __name__ == '__main__':
+    fleet = make_fleet()
+    measure('string', fleet)
+    measure('interned', fleet)
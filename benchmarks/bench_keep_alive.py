@@ -0,0 +1,92 @@
+'''
+Measure the time taken to log into a TitanSMA and download its config, with
+a connection per request as before and over a single persistent connection.
+
+The device is a local stub server delaying each new connection and each
+request by a simulated round trip time, as a TCP handshake and a request
+each take a round trip over the link.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_keep_alive
+'''
+import http.server
+import threading
+import time
+from typing import Optional
+from station_config_check.config_check import web_interface
+
+RTT = 0.1
+
+DOWNLOADS = 10
+
+CONFIG = b'\n'.join(b'setting%d "value"' % i for i in range(2000))
+
+
+class StubDigitizer(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+        time.sleep(RTT)
+
+    def respond(self, body: bytes):
+        time.sleep(RTT)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Set-Cookie', 'session=1; Path=/')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.respond(b'somekey' if self.path == '/key' else CONFIG)
+
+    def do_POST(self):
+        self.respond(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+def download(
+    port: int,
+    keep_alive: Optional[web_interface.KeepAliveHandler]
+):
+    cookiejar = web_interface.GlobalCookieJar()
+    handlers = () if keep_alive is None else (keep_alive,)
+    digitizer = web_interface.DigitizerInterface(
+        address=f'127.0.0.1:{port}',
+        username='someone',
+        password='fakepass',
+        opener=cookiejar.getOpener(*handlers))
+    digitizer.login(cookiejar)
+    digitizer.getConfiguration()
+    if keep_alive is not None:
+        keep_alive.close()
+
+
+def main():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubDigitizer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    for name, keep_alive in (('per request', False), ('keep-alive', True)):
+        StubDigitizer.connections = 0
+        start = time.perf_counter()
+        for _ in range(DOWNLOADS):
+            download(
+                port,
+                web_interface.KeepAliveHandler() if keep_alive else None)
+        elapsed = (time.perf_counter() - start) / DOWNLOADS
+        print(
+            f'{name:>11}: {elapsed * 1000:.0f}ms per host, ' +
+            f'{StubDigitizer.connections / DOWNLOADS:.0f} connections, ' +
+            f'RTT {RTT * 1000:.0f}ms')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
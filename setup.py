@@ -30,7 +30,13 @@ setup(
             'check_all_titansma_config = \
                 station_config_check.bin.check_all_titansma:main',
             'check_all_fortimus_config = \
-                station_config_check.bin.check_all_fortimus:main'
+                station_config_check.bin.check_all_fortimus:main',
+            'report_config_outliers = \
+                station_config_check.bin.report_config_outliers:main',
+            'rebaseline_config = \
+                station_config_check.bin.rebaseline:main',
+            'query_similarity_history = \
+                station_config_check.bin.query_similarity_history:main'
         ]
     }
 )
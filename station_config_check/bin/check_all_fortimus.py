@@ -1,17 +1,38 @@
+import atexit
 import configparser
 import logging
+from typing import Callable, List, Optional
 from urllib.error import HTTPError
 import click
 from station_config_check.config import LogLevels
 from station_config_check.fortimus.running_config import get_fortimus_list, \
     get_running_config
-from station_config_check.nagios.models import NagiosOutputCode
+from station_config_check.nagios.inventory_cache import InventoryCache
+from station_config_check.nagios.nagios_api import NagiosHost
 from station_config_check.nagios.nrdp import NagiosCheckResult, \
-    NagiosCheckResults, submit
+    NagiosCheckResults
+from station_config_check.nagios.submission import SUBMISSION_BACKENDS, \
+    InvalidBackend, open_backend
+from station_config_check.config_check.history import SimilarityHistory
 from station_config_check.config_check.golden_image import \
-    GoldenImageMissing, load_golden_image, write_golden_image
+    GOLDEN_IMAGE_FORMATS, GoldenImageStore
 from station_config_check.config_check.compare_config import \
-    get_config_check_results
+    DIFF_BACKENDS
+from station_config_check.config_check.diff_cache import DiffCache
+from station_config_check.config_check.diff_pool import DiffPool
+from station_config_check.config_check.thresholds import load_thresholds
+from station_config_check.config_check.similarity import SketchStore, \
+    build_outlier_check_results, find_outliers
+from station_config_check.runner.archive import SweepRecorder, run_replay
+from station_config_check.runner.checkpoint import Checkpoint, RunLock, \
+    RunLocked
+from station_config_check.runner.pipeline import BatchSubmitter, run_sweep
+from station_config_check.runner.probe import TcpProbe
+from station_config_check.runner.profiling import RunProfiler
+from station_config_check.runner.scheduler import LinkScheduler, \
+    load_link_classes
+from station_config_check.runner.sharding import InvalidShard, Shard
+from station_config_check.runner.spool import SubmissionSpool
 
 
 @click.command()
@@ -33,98 +54,443 @@ from station_config_check.config_check.compare_config import \
     help="Log more information about the program's execution",
     default=LogLevels.WARNING
 )
+@click.option(
+    '--inventory-cache',
+    help=('Directory to cache the Nagios inventory in. Only the state of ' +
+          'hosts is queried from Nagios while the cache is fresh')
+)
+@click.option(
+    '--inventory-ttl',
+    type=float,
+    help='Time in seconds before a cached inventory is refreshed',
+    default=86400
+)
+@click.option(
+    '--diff-workers',
+    type=int,
+    help=('Number of processes comparing large configs. With 0, configs ' +
+          'are compared in the main process'),
+    default=0
+)
+@click.option(
+    '--diff-threshold',
+    type=int,
+    help='Size in characters from which configs are compared in a process',
+    default=65536
+)
+@click.option(
+    '--batch-size',
+    type=int,
+    help=('Number of results submitted to Nagios at once. With 0, all ' +
+          'results are submitted at the end of the sweep'),
+    default=500
+)
+@click.option(
+    '--queue-size',
+    type=int,
+    help='Number of Fortimus allowed to wait in each stage of the sweep',
+    default=64
+)
+@click.option(
+    '--diff-cache',
+    help=('File to cache comparisons in, so configs that were already ' +
+          'compared to the same golden image are not compared again')
+)
+@click.option(
+    '--diff-cache-size',
+    type=int,
+    help='Number of comparisons kept in the cache',
+    default=10000
+)
+@click.option(
+    '--diff-backend',
+    type=click.Choice(DIFF_BACKENDS),
+    help=('How configs are compared. interned compares lines as integers ' +
+          'and reports the similarity of lines rather than characters'),
+    default='string'
+)
+@click.option(
+    '--sketch-file',
+    help=('File to keep a sketch of the running config of each device in, ' +
+          'used to find devices whose config differs from the rest of the ' +
+          'fleet')
+)
+@click.option(
+    '--outlier-service',
+    is_flag=True,
+    help=('Also submit a Config Outlier service reporting how similar ' +
+          'the config of each device is to its nearest peers. Requires ' +
+          '--sketch-file')
+)
+@click.option(
+    '--outlier-threshold',
+    type=float,
+    help=('Similarity in percent to the nearest peer under which a ' +
+          'device is reported as an outlier'),
+    default=50
+)
+@click.option(
+    '--shard',
+    help=('Only check the devices of a shard of the fleet, given as i/N. ' +
+          'Devices are assigned to shards by hashing their hostname, so ' +
+          'N runners with shards 1/N to N/N check the fleet once')
+)
+@click.option(
+    '--lock-file',
+    help=('Lock file preventing overlapping runs. A run finding the lock ' +
+          'held by another run exits')
+)
+@click.option(
+    '--checkpoint-file',
+    help=('File recording the devices checked during the sweep, so an ' +
+          'interrupted sweep resumes with the remaining devices')
+)
+@click.option(
+    '--checkpoint-max-age',
+    type=float,
+    help=('Age in seconds after which an unfinished sweep is not resumed ' +
+          'anymore'),
+    default=86400
+)
+@click.option(
+    '--probe',
+    is_flag=True,
+    help=('Check that devices accept connections before logging into ' +
+          'them, so unreachable devices are reported within seconds')
+)
+@click.option(
+    '--probe-port',
+    type=int,
+    help='Port connected to when probing devices',
+    default=80
+)
+@click.option(
+    '--probe-timeout',
+    type=float,
+    help='Time in seconds before a probed device is considered unreachable',
+    default=2
+)
+@click.option(
+    '--probe-concurrency',
+    type=int,
+    help='Number of devices probed at the same time',
+    default=512
+)
+@click.option(
+    '--profile',
+    is_flag=True,
+    help=('Profile the run with cProfile, writing the profile and a ' +
+          'summary to --profile-dir')
+)
+@click.option(
+    '--profile-sample',
+    type=float,
+    help=('Share of devices whose download is profiled separately, from ' +
+          '0 to 1'),
+    default=0
+)
+@click.option(
+    '--trace-alloc',
+    is_flag=True,
+    help=('Trace memory allocations with tracemalloc, writing the top ' +
+          'allocation sites to --profile-dir at the end of the run')
+)
+@click.option(
+    '--profile-dir',
+    help='Directory profiles and allocation traces are written to',
+    default='.'
+)
+@click.option(
+    '--record',
+    'record_dir',
+    help=('Directory to record the running configs downloaded in, a ' +
+          'compressed archive per sweep, to replay the sweep later')
+)
+@click.option(
+    '--replay',
+    help=('Check the running configs of a recorded archive against the ' +
+          'golden images instead of polling the devices. Nothing is ' +
+          'submitted to Nagios')
+)
+@click.option(
+    '--replay-output',
+    help='File to write the NRDP XML of the replayed results to'
+)
+@click.option(
+    '--golden-format',
+    type=click.Choice(list(GOLDEN_IMAGE_FORMATS)),
+    help=('Format new golden images are written in. Existing images are ' +
+          'read whatever their format'),
+    default='text'
+)
+@click.option(
+    '--spool-file',
+    help=('File to spool the results Nagios could not be reached for. ' +
+          'Spooled results are retried by later submissions and runs')
+)
+@click.option(
+    '--submit-backend',
+    type=click.Choice(list(SUBMISSION_BACKENDS)),
+    help=('How results are handed to Nagios. command-file and checkresults ' +
+          'write them locally when running on the Nagios server, jsonl ' +
+          'appends them to a file'),
+    default='nrdp'
+)
+@click.option(
+    '--submit-path',
+    help=('The external command file, check result directory or JSON ' +
+          'lines file results are written to, for the backends other than ' +
+          'nrdp')
+)
+@click.option(
+    '--history-file',
+    help=('File to record the similarity of each config to its golden ' +
+          'image in, to query how configs drift over time')
+)
 def main(
     nagios_ip: str,
     goldenimg_dir: str,
     cred_file: str,
-    log_level: str
+    log_level: str,
+    inventory_cache: Optional[str],
+    inventory_ttl: float,
+    diff_workers: int,
+    diff_threshold: int,
+    batch_size: int,
+    queue_size: int,
+    diff_cache: Optional[str],
+    diff_cache_size: int,
+    diff_backend: str,
+    sketch_file: Optional[str],
+    outlier_service: bool,
+    outlier_threshold: float,
+    shard: Optional[str],
+    lock_file: Optional[str],
+    checkpoint_file: Optional[str],
+    checkpoint_max_age: float,
+    probe: bool,
+    probe_port: int,
+    probe_timeout: float,
+    probe_concurrency: int,
+    profile: bool,
+    profile_sample: float,
+    trace_alloc: bool,
+    profile_dir: str,
+    record_dir: Optional[str],
+    replay: Optional[str],
+    replay_output: Optional[str],
+    golden_format: str,
+    spool_file: Optional[str],
+    submit_backend: str,
+    submit_path: Optional[str],
+    history_file: Optional[str]
 ):
 
     logging.basicConfig(
         format='%(asctime)s:%(levelname)s:%(message)s',
         datefmt="%Y-%m-%d %H:%M:%S",
         level=log_level)
+
+    # Only a single run checks the devices at any time
+    if lock_file is not None:
+        lock = RunLock(path=lock_file)
+        try:
+            lock.acquire()
+        except RunLocked as e:
+            logging.warning(f'Another run is in progress, exiting: {e}')
+            return
+        atexit.register(lock.release)
+
+    profiler = RunProfiler(
+        output_dir=profile_dir,
+        profile=profile,
+        host_sample=profile_sample,
+        trace_alloc=trace_alloc
+    )
+    profiler.start()
+
     # Read the cred file
     config = configparser.ConfigParser()
     config.read(cred_file)
 
+    golden_images = GoldenImageStore(
+        goldenimg_dir=goldenimg_dir,
+        device_type='fortimus',
+        image_format=golden_format
+    )
+
+    try:
+        thresholds = load_thresholds(config=config, device_type='fortimus')
+    except ValueError as e:
+        raise click.BadParameter(f'Invalid threshold in {cred_file}: {e}')
+
+    diff_pool = DiffPool(
+        workers=diff_workers,
+        threshold=diff_threshold,
+        diff_cache=None if diff_cache is None else DiffCache(
+            path=diff_cache,
+            max_entries=diff_cache_size
+        ),
+        backend=diff_backend
+    )
+
+    if replay is not None:
+        run_replay(
+            path=replay,
+            golden_images=golden_images,
+            diff_pool=diff_pool,
+            output=replay_output,
+            queue_size=queue_size,
+            thresholds=thresholds
+        )
+        diff_pool.report()
+        diff_pool.shutdown()
+        profiler.stop()
+        return
+
     # Extract api_key from cred_file
     api_key = config['nagios']['api_key']
 
+    tcp_probe = None
+    if probe:
+        tcp_probe = TcpProbe(
+            port=probe_port,
+            timeout=probe_timeout,
+            concurrency=probe_concurrency
+        )
+
+    shard_filter = None
+    if shard is not None:
+        try:
+            shard_filter = Shard.parse(shard)
+        except InvalidShard as e:
+            raise click.BadParameter(str(e))
+
+    history = None
+    if history_file is not None:
+        history = SimilarityHistory(path=history_file)
+
+    sketches = None
+    if sketch_file is not None:
+        sketches = SketchStore(path=sketch_file)
+    elif outlier_service:
+        raise click.BadParameter(
+            '--outlier-service requires --sketch-file')
+
+    cache = None
+    if inventory_cache is not None:
+        cache = InventoryCache(cache_dir=inventory_cache, ttl=inventory_ttl)
+
     fortimus_list = get_fortimus_list(
         nagios_ip=nagios_ip,
-        api_key=api_key
+        api_key=api_key,
+        inventory_cache=cache
     )
+    if shard_filter is not None:
+        fortimus_list = shard_filter.filter(fortimus_list)
+
+    checkpoint = None
+    if checkpoint_file is not None:
+        checkpoint = Checkpoint(
+            path=checkpoint_file,
+            max_age=checkpoint_max_age
+        )
+        fortimus_list = checkpoint.filter(fortimus_list)
+
+    try:
+        backend = open_backend(
+            name=submit_backend,
+            path=submit_path,
+            nagios=f'http://{nagios_ip}',
+            token=config['nagios'].get('nrdp_token')
+        )
+    except InvalidBackend as e:
+        raise click.BadParameter(str(e))
 
-    checkresults = NagiosCheckResults()
+    submit_spooled: Callable[[NagiosCheckResults], None] = backend.submit
+    if spool_file is not None:
+        # Results left over by previous runs are submitted first, so they
+        # are superseded by the results of this run
+        spool = SubmissionSpool(
+            path=spool_file,
+            retry_errors=backend.retry_errors
+        )
+        spool.retry(backend.submit)
+        submit_spooled = spool.submitting(backend.submit)
 
-    for fortimus in fortimus_list:
-        if fortimus.status != 0:
-            checkresults.append(NagiosCheckResult(
-                hostname=fortimus.hostname,
-                servicename='Config Check',
-                output='Host unreachable.'
-            ))
-            continue
+    def submit_results(checkresults: NagiosCheckResults):
+        submit_spooled(checkresults)
+        if checkpoint is not None:
+            checkpoint.record(result.hostname for result in checkresults)
 
+    def download(fortimus: NagiosHost) -> str:
         # Try to download the running config from the fortimus
         logging.debug(
             f'Trying to download running config from {fortimus.hostname}')
-        try:
-            running_config = get_running_config(
-                fortimus=fortimus
-            )
-        except HTTPError as e:
-
-            # If for some reason the config cannot be downloaded, log the
-            # error and move on to the next fortimus
-            logging.warning(e)
-            checkresults.append(NagiosCheckResult(
-                hostname=fortimus.hostname,
-                servicename='Config Check',
-                state=NagiosOutputCode.critical.value,
-                output='Host unreachable when downloading running config'
-            ))
-            continue
+        return get_running_config(
+            fortimus=fortimus
+        )
 
-        try:
-            logging.debug(
-                f'Searching for {fortimus.hostname} in {goldenimg_dir}')
-            # Try loading the goldem image from file
-            golden_image = load_golden_image(
-                goldenimg_dir=goldenimg_dir,
-                host_name=fortimus.hostname,
-                device_type='fortimus'
-            )
-        except GoldenImageMissing:
-            logging.debug(
-                'Golden image mising, writing running config to file')
-            write_golden_image(
-                goldenimg_dir=goldenimg_dir,
-                host_name=fortimus.hostname,
-                config=running_config,
-                device_type='fortimus'
-            )
-            checkresults.append(NagiosCheckResult(
-                hostname=fortimus.hostname,
-                servicename='Config Check',
-                output='No Golden Image present. New golden image saved.'
-            ))
-            continue
-
-        # If a golden image was found, proceed with comparing it to the
-        # running config
-        logging.debug(f'Comparing config for {fortimus.hostname}')
-        checkresults.append(get_config_check_results(
-            hostname=fortimus.hostname,
-            golden_image=golden_image,
-            running_config=running_config
-        ))
-
-    submit(
-        nrdp=checkresults,
-        nagios=f'http://{nagios_ip}',
-        token=config['nagios']['nrdp_token'])
+    fetch: Callable[[NagiosHost], str] = download
+    recorder = None
+    if record_dir is not None:
+        recorder = SweepRecorder(record_dir=record_dir, device_type='fortimus')
+        fetch = recorder.record_fetch(fetch)
+
+    checked: List[str] = []
+
+    def sketch(fortimus: NagiosHost, running_config: str):
+        if sketches is not None:
+            sketches.add(fortimus.hostname, running_config)
+            checked.append(fortimus.hostname)
+
+    # Results are submitted in batches as the sweep goes
+    submitter = BatchSubmitter(
+        submit_results=submit_results,
+        batch_size=batch_size
+    )
+
+    emit: Callable[[NagiosCheckResult], None] = submitter.add
+    if history is not None:
+        emit = history.recording(emit)
+
+    run_sweep(
+        hosts=fortimus_list,
+        fetch=profiler.profile_fetch(fetch),
+        golden_images=golden_images,
+        scheduler=LinkScheduler(link_classes=load_link_classes(config)),
+        diff_pool=diff_pool,
+        emit=emit,
+        fetch_errors=(HTTPError,),
+        unreachable_output='Host unreachable.',
+        queue_size=queue_size,
+        on_config=sketch,
+        probe=tcp_probe,
+        thresholds=thresholds
+    )
+    if recorder is not None:
+        recorder.close()
+    if history is not None:
+        history.flush()
+
+    if sketches is not None:
+        sketches.save()
+        if outlier_service:
+            for score in find_outliers(sketches.sketches, hostnames=checked):
+                submitter.add(build_outlier_check_results(
+                    score=score,
+                    threshold=outlier_threshold
+                ))
+    submitter.flush()
+    if checkpoint is not None:
+        checkpoint.complete()
+    diff_pool.report()
+    diff_pool.shutdown()
+    backend.close()
+    profiler.stop()
+
+    if cache is not None:
+        cache.wait()
     return
 
 
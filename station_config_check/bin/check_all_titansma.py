@@ -1,20 +1,137 @@
+import atexit
 import logging
-import urllib
+import urllib.error
+from typing import Callable, Iterable, List, Optional
 import click
 import configparser
 from station_config_check.config import LogLevels
-from station_config_check.nagios.models import NagiosOutputCode
+from station_config_check.nagios.inventory_cache import InventoryCache
+from station_config_check.nagios.nagios_api import NagiosHost
 from station_config_check.nagios.nrdp import NagiosCheckResult, \
-    NagiosCheckResults, submit
+    NagiosCheckResults
+from station_config_check.nagios.submission import SUBMISSION_BACKENDS, \
+    InvalidBackend, open_backend
 from station_config_check.config_check.compare_config import \
-    get_config_check_results
+    DIFF_BACKENDS
+from station_config_check.config_check.diff_cache import DiffCache
+from station_config_check.config_check.diff_pool import DiffPool
+from station_config_check.config_check.history import SimilarityHistory
 from station_config_check.config_check.golden_image import \
-    GoldenImageMissing, load_golden_image, write_golden_image
+    GOLDEN_IMAGE_FORMATS, GoldenImageStore
+from station_config_check.config_check.thresholds import \
+    SimilarityThresholds, load_thresholds
+from station_config_check.config_check.similarity import SketchStore, \
+    build_outlier_check_results, find_outliers
+from station_config_check.runner.daemon import run_daemon
+from station_config_check.runner.archive import SweepRecorder, run_replay
+from station_config_check.runner.checkpoint import Checkpoint, RunLock, \
+    RunLocked
+from station_config_check.runner.pipeline import BatchSubmitter, run_sweep
+from station_config_check.runner.probe import TcpProbe
+from station_config_check.runner.profiling import RunProfiler
+from station_config_check.runner.scheduler import LinkScheduler, \
+    load_link_classes
+from station_config_check.runner.sharding import InvalidShard, Shard
+from station_config_check.runner.spool import SubmissionSpool
 
 from station_config_check.titansma.running_config import fetch_credentials, \
     get_running_config, get_titansma_list
 
 
+def check_titansmas(
+    titans: Iterable[NagiosHost],
+    config: configparser.ConfigParser,
+    golden_images: GoldenImageStore,
+    scheduler: LinkScheduler,
+    diff_pool: DiffPool,
+    emit: Callable[[NagiosCheckResult], None],
+    queue_size: int = 64,
+    on_config: Optional[Callable[[NagiosHost, str], None]] = None,
+    probe: Optional[TcpProbe] = None,
+    profiler: Optional[RunProfiler] = None,
+    recorder: Optional[SweepRecorder] = None,
+    thresholds: Optional[SimilarityThresholds] = None
+):
+    '''
+    Download the running config of TitanSMAs and compare them to their golden
+    images
+
+    Parameters
+    ----------
+    titans: Iterable
+        The TitanSMAs to check
+
+    config: ConfigParser
+        The parsed cred file
+
+    golden_images: GoldenImageStore
+        The golden images of TitanSMAs
+
+    scheduler: LinkScheduler
+        Scheduler pacing the downloads according to the link class of each
+        TitanSMA
+
+    diff_pool: DiffPool
+        Pool comparing the running configs to the golden images while
+        downloads carry on
+
+    emit: Callable
+        Function receiving the result of the config check for each TitanSMA
+
+    queue_size: int
+        The number of TitanSMAs allowed to wait in each stage of the check
+
+    on_config: Callable
+        Function receiving the running config of each TitanSMA that was
+        downloaded
+
+    probe: TcpProbe
+        Probe checking that TitanSMAs accept connections before logging into
+        them
+
+    profiler: RunProfiler
+        Profiler of the run, profiling the download of a sample of TitanSMAs
+
+    recorder: SweepRecorder
+        Recorder archiving the running configs downloaded
+
+    thresholds: SimilarityThresholds
+        The ranges of similarity config checks are warning or critical in,
+        by install type
+    '''
+    def download(titan: NagiosHost) -> str:
+        # Try to download the running config from the TitanSMA
+        logging.debug(
+            f'Trying to download running config from {titan.hostname}')
+        return get_running_config(
+            titan_sma=titan,
+            credentials=fetch_credentials(
+                install_type=titan.install_type,
+                config=config
+            )
+        )
+
+    fetch: Callable[[NagiosHost], str] = download
+    if recorder is not None:
+        fetch = recorder.record_fetch(fetch)
+    if profiler is not None:
+        fetch = profiler.profile_fetch(fetch)
+
+    run_sweep(
+        hosts=titans,
+        fetch=fetch,
+        golden_images=golden_images,
+        scheduler=scheduler,
+        diff_pool=diff_pool,
+        emit=emit,
+        fetch_errors=(urllib.error.URLError,),
+        queue_size=queue_size,
+        on_config=on_config,
+        probe=probe,
+        thresholds=thresholds
+    )
+
+
 @click.command()
 @click.option(
     '--nagios-ip',
@@ -34,103 +151,500 @@ from station_config_check.titansma.running_config import fetch_credentials, \
     help="Log more information about the program's execution",
     default=LogLevels.WARNING
 )
+@click.option(
+    '--window',
+    type=float,
+    help=('Time budget in seconds for the sweep. Downloads over link ' +
+          'classes marked as spread are distributed across it'),
+    default=0
+)
+@click.option(
+    '--daemon',
+    is_flag=True,
+    help=('Keep running and check each TitanSMA once per interval instead ' +
+          'of checking all of them once')
+)
+@click.option(
+    '--interval',
+    type=float,
+    help='Time in seconds between two checks of a TitanSMA in daemon mode',
+    default=3600
+)
+@click.option(
+    '--inventory-refresh',
+    type=float,
+    help='Time in seconds between two Nagios inventory refreshes in daemon ' +
+         'mode',
+    default=900
+)
+@click.option(
+    '--inventory-cache',
+    help=('Directory to cache the Nagios inventory in. Only the state of ' +
+          'hosts is queried from Nagios while the cache is fresh')
+)
+@click.option(
+    '--inventory-ttl',
+    type=float,
+    help='Time in seconds before a cached inventory is refreshed',
+    default=86400
+)
+@click.option(
+    '--diff-workers',
+    type=int,
+    help=('Number of processes comparing large configs. With 0, configs ' +
+          'are compared in the main process'),
+    default=0
+)
+@click.option(
+    '--diff-threshold',
+    type=int,
+    help='Size in characters from which configs are compared in a process',
+    default=65536
+)
+@click.option(
+    '--batch-size',
+    type=int,
+    help=('Number of results submitted to Nagios at once. With 0, all ' +
+          'results are submitted at the end of the sweep'),
+    default=500
+)
+@click.option(
+    '--queue-size',
+    type=int,
+    help='Number of TitanSMAs allowed to wait in each stage of the sweep',
+    default=64
+)
+@click.option(
+    '--diff-cache',
+    help=('File to cache comparisons in, so configs that were already ' +
+          'compared to the same golden image are not compared again')
+)
+@click.option(
+    '--diff-cache-size',
+    type=int,
+    help='Number of comparisons kept in the cache',
+    default=10000
+)
+@click.option(
+    '--diff-backend',
+    type=click.Choice(DIFF_BACKENDS),
+    help=('How configs are compared. interned compares lines as integers ' +
+          'and reports the similarity of lines rather than characters'),
+    default='string'
+)
+@click.option(
+    '--sketch-file',
+    help=('File to keep a sketch of the running config of each device in, ' +
+          'used to find devices whose config differs from the rest of the ' +
+          'fleet')
+)
+@click.option(
+    '--outlier-service',
+    is_flag=True,
+    help=('Also submit a Config Outlier service reporting how similar ' +
+          'the config of each device is to its nearest peers. Requires ' +
+          '--sketch-file')
+)
+@click.option(
+    '--outlier-threshold',
+    type=float,
+    help=('Similarity in percent to the nearest peer under which a ' +
+          'device is reported as an outlier'),
+    default=50
+)
+@click.option(
+    '--shard',
+    help=('Only check the devices of a shard of the fleet, given as i/N. ' +
+          'Devices are assigned to shards by hashing their hostname, so ' +
+          'N runners with shards 1/N to N/N check the fleet once')
+)
+@click.option(
+    '--lock-file',
+    help=('Lock file preventing overlapping runs. A run finding the lock ' +
+          'held by another run exits')
+)
+@click.option(
+    '--checkpoint-file',
+    help=('File recording the devices checked during the sweep, so an ' +
+          'interrupted sweep resumes with the remaining devices')
+)
+@click.option(
+    '--checkpoint-max-age',
+    type=float,
+    help=('Age in seconds after which an unfinished sweep is not resumed ' +
+          'anymore'),
+    default=86400
+)
+@click.option(
+    '--probe',
+    is_flag=True,
+    help=('Check that devices accept connections before logging into ' +
+          'them, so unreachable devices are reported within seconds')
+)
+@click.option(
+    '--probe-port',
+    type=int,
+    help='Port connected to when probing devices',
+    default=80
+)
+@click.option(
+    '--probe-timeout',
+    type=float,
+    help='Time in seconds before a probed device is considered unreachable',
+    default=2
+)
+@click.option(
+    '--probe-concurrency',
+    type=int,
+    help='Number of devices probed at the same time',
+    default=512
+)
+@click.option(
+    '--profile',
+    is_flag=True,
+    help=('Profile the run with cProfile, writing the profile and a ' +
+          'summary to --profile-dir')
+)
+@click.option(
+    '--profile-sample',
+    type=float,
+    help=('Share of devices whose download is profiled separately, from ' +
+          '0 to 1'),
+    default=0
+)
+@click.option(
+    '--trace-alloc',
+    is_flag=True,
+    help=('Trace memory allocations with tracemalloc, writing the top ' +
+          'allocation sites to --profile-dir at the end of the run')
+)
+@click.option(
+    '--profile-dir',
+    help='Directory profiles and allocation traces are written to',
+    default='.'
+)
+@click.option(
+    '--record',
+    'record_dir',
+    help=('Directory to record the running configs downloaded in, a ' +
+          'compressed archive per sweep, to replay the sweep later')
+)
+@click.option(
+    '--replay',
+    help=('Check the running configs of a recorded archive against the ' +
+          'golden images instead of polling the devices. Nothing is ' +
+          'submitted to Nagios')
+)
+@click.option(
+    '--replay-output',
+    help='File to write the NRDP XML of the replayed results to'
+)
+@click.option(
+    '--golden-format',
+    type=click.Choice(list(GOLDEN_IMAGE_FORMATS)),
+    help=('Format new golden images are written in. Existing images are ' +
+          'read whatever their format'),
+    default='text'
+)
+@click.option(
+    '--spool-file',
+    help=('File to spool the results Nagios could not be reached for. ' +
+          'Spooled results are retried by later submissions and runs')
+)
+@click.option(
+    '--submit-backend',
+    type=click.Choice(list(SUBMISSION_BACKENDS)),
+    help=('How results are handed to Nagios. command-file and checkresults ' +
+          'write them locally when running on the Nagios server, jsonl ' +
+          'appends them to a file'),
+    default='nrdp'
+)
+@click.option(
+    '--submit-path',
+    help=('The external command file, check result directory or JSON ' +
+          'lines file results are written to, for the backends other than ' +
+          'nrdp')
+)
+@click.option(
+    '--history-file',
+    help=('File to record the similarity of each config to its golden ' +
+          'image in, to query how configs drift over time')
+)
 def main(
     nagios_ip: str,
     goldenimg_dir: str,
     cred_file: str,
-    log_level: str
+    log_level: str,
+    window: float,
+    daemon: bool,
+    interval: float,
+    inventory_refresh: float,
+    inventory_cache: Optional[str],
+    inventory_ttl: float,
+    diff_workers: int,
+    diff_threshold: int,
+    batch_size: int,
+    queue_size: int,
+    diff_cache: Optional[str],
+    diff_cache_size: int,
+    diff_backend: str,
+    sketch_file: Optional[str],
+    outlier_service: bool,
+    outlier_threshold: float,
+    shard: Optional[str],
+    lock_file: Optional[str],
+    checkpoint_file: Optional[str],
+    checkpoint_max_age: float,
+    probe: bool,
+    probe_port: int,
+    probe_timeout: float,
+    probe_concurrency: int,
+    profile: bool,
+    profile_sample: float,
+    trace_alloc: bool,
+    profile_dir: str,
+    record_dir: Optional[str],
+    replay: Optional[str],
+    replay_output: Optional[str],
+    golden_format: str,
+    spool_file: Optional[str],
+    submit_backend: str,
+    submit_path: Optional[str],
+    history_file: Optional[str]
 ):
 
     logging.basicConfig(
         format='%(asctime)s:%(levelname)s:%(message)s',
         datefmt="%Y-%m-%d %H:%M:%S",
         level=log_level)
+
+    # Only a single run checks the devices at any time
+    if lock_file is not None:
+        lock = RunLock(path=lock_file)
+        try:
+            lock.acquire()
+        except RunLocked as e:
+            logging.warning(f'Another run is in progress, exiting: {e}')
+            return
+        atexit.register(lock.release)
+
+    profiler = RunProfiler(
+        output_dir=profile_dir,
+        profile=profile,
+        host_sample=profile_sample,
+        trace_alloc=trace_alloc
+    )
+    profiler.start()
+
     # Read the cred file
     config = configparser.ConfigParser()
     config.read(cred_file)
 
-    # Extract api_key from cred_file
-    api_key = config['nagios']['api_key']
+    golden_images = GoldenImageStore(
+        goldenimg_dir=goldenimg_dir,
+        device_type='titansma',
+        image_format=golden_format
+    )
+
+    try:
+        thresholds = load_thresholds(config=config, device_type='titansma')
+    except ValueError as e:
+        raise click.BadParameter(f'Invalid threshold in {cred_file}: {e}')
 
-    # Get a list of all members of the Titan-SMA hostgroup
-    titans = get_titansma_list(
-        nagios_ip=nagios_ip,
-        api_key=api_key
+    # Downloads are paced according to the link class of each TitanSMA
+    scheduler = LinkScheduler(
+        link_classes=load_link_classes(config),
+        window=window
     )
 
-    checkresults = NagiosCheckResults()
+    diff_pool = DiffPool(
+        workers=diff_workers,
+        threshold=diff_threshold,
+        diff_cache=None if diff_cache is None else DiffCache(
+            path=diff_cache,
+            max_entries=diff_cache_size
+        ),
+        backend=diff_backend
+    )
 
-    # If the host status is not "OK", skip trying to download config file
-    for titan in titans:
-        if titan.status != 0:
-            checkresults.append(NagiosCheckResult(
-                hostname=titan.hostname,
-                servicename='Config Check',
-                output='Host unreachable in Nagios'
-            ))
-            continue
+    if replay is not None:
+        run_replay(
+            path=replay,
+            golden_images=golden_images,
+            diff_pool=diff_pool,
+            output=replay_output,
+            queue_size=queue_size,
+            thresholds=thresholds
+        )
+        diff_pool.report()
+        diff_pool.shutdown()
+        profiler.stop()
+        return
 
-        # Try to download the running config from the TitanSMA
-        logging.debug(
-            f'Trying to download running config from {titan.hostname}')
-        try:
-            running_config = get_running_config(
-                titan_sma=titan,
-                credentials=fetch_credentials(
-                    install_type=titan.install_type,
-                    config=config
-                )
-            )
-        except urllib.error.URLError as e:
-            # If for some reason the config cannot be downloaded, log the
-            # error and move on to the next TitanSMA
-            logging.warning(e)
-            checkresults.append(NagiosCheckResult(
-                hostname=titan.hostname,
-                servicename='Config Check',
-                state=NagiosOutputCode.critical.value,
-                output='Host unreachable when downloading running config'
-            ))
-            continue
+    tcp_probe = None
+    if probe:
+        tcp_probe = TcpProbe(
+            port=probe_port,
+            timeout=probe_timeout,
+            concurrency=probe_concurrency
+        )
 
+    shard_filter = None
+    if shard is not None:
         try:
-            logging.debug(f'Searching for {titan.hostname} in {goldenimg_dir}')
-            # Try loading the goldem image from file
-            golden_image = load_golden_image(
-                goldenimg_dir=goldenimg_dir,
-                host_name=titan.hostname,
-                device_type='titansma'
-            )
-        # If there is no golden image for this Titan
-        except GoldenImageMissing:
-            logging.debug(
-                'Golden image mising, writing running config to file')
-            write_golden_image(
-                goldenimg_dir=goldenimg_dir,
-                host_name=titan.hostname,
-                config=running_config,
-                device_type='titansma'
-            )
-            checkresults.append(NagiosCheckResult(
-                hostname=titan.hostname,
-                servicename='Config Check',
-                output='No Golden Image present. New golden image saved.'
-            ))
-            continue
-
-        # If a golden image was found, proceed with comparing it to the
-        # running config
-        logging.debug(f'Comparing config for {titan.hostname}')
-        checkresults.append(get_config_check_results(
-            hostname=titan.hostname,
-            golden_image=golden_image,
-            running_config=running_config
-        ))
-
-    submit(
-        nrdp=checkresults,
-        nagios=f'http://{nagios_ip}',
-        token=config['nagios']['nrdp_token'])
+            shard_filter = Shard.parse(shard)
+        except InvalidShard as e:
+            raise click.BadParameter(str(e))
+
+    history = None
+    if history_file is not None:
+        history = SimilarityHistory(path=history_file)
+
+    sketches = None
+    if sketch_file is not None:
+        sketches = SketchStore(path=sketch_file)
+    elif outlier_service:
+        raise click.BadParameter(
+            '--outlier-service requires --sketch-file')
+
+    cache = None
+    if inventory_cache is not None:
+        cache = InventoryCache(cache_dir=inventory_cache, ttl=inventory_ttl)
+
+    def load_inventory() -> Iterable[NagiosHost]:
+        # Get a list of all members of the Titan-SMA hostgroup
+        titans = get_titansma_list(
+            nagios_ip=nagios_ip,
+            api_key=config['nagios']['api_key'],
+            inventory_cache=cache
+        )
+        if shard_filter is not None:
+            return shard_filter.filter(titans)
+        return titans
+
+    # In daemon mode every host is checked once per interval, so an archive
+    # is recorded per interval rather than per check
+    recorder = None
+    if record_dir is not None:
+        recorder = SweepRecorder(
+            record_dir=record_dir,
+            device_type='titansma',
+            rotate_after=interval if daemon else None
+        )
+
+    def check(
+        titans: Iterable[NagiosHost],
+        emit: Callable[[NagiosCheckResult], None]
+    ):
+        checked: List[str] = []
+
+        def sketch(titan: NagiosHost, running_config: str):
+            if sketches is not None:
+                sketches.add(titan.hostname, running_config)
+                checked.append(titan.hostname)
+
+        check_titansmas(
+            titans=titans,
+            config=config,
+            golden_images=golden_images,
+            scheduler=scheduler,
+            diff_pool=diff_pool,
+            emit=emit if history is None else history.recording(emit),
+            queue_size=queue_size,
+            on_config=sketch,
+            probe=tcp_probe,
+            profiler=profiler,
+            recorder=recorder,
+            thresholds=thresholds
+        )
+        if history is not None:
+            history.flush()
+
+        if sketches is None:
+            return
+        sketches.save()
+        if outlier_service:
+            # The TitanSMAs checked are compared to the whole fleet
+            for score in find_outliers(sketches.sketches, hostnames=checked):
+                emit(build_outlier_check_results(
+                    score=score,
+                    threshold=outlier_threshold
+                ))
+
+    try:
+        backend = open_backend(
+            name=submit_backend,
+            path=submit_path,
+            nagios=f'http://{nagios_ip}',
+            token=config['nagios'].get('nrdp_token')
+        )
+    except InvalidBackend as e:
+        raise click.BadParameter(str(e))
+
+    submit_results: Callable[[NagiosCheckResults], None] = backend.submit
+    if spool_file is not None:
+        # Results left over by previous runs are submitted first, so they
+        # are superseded by the results of this run
+        spool = SubmissionSpool(
+            path=spool_file,
+            retry_errors=backend.retry_errors
+        )
+        spool.retry(backend.submit)
+        submit_results = spool.submitting(backend.submit)
+
+    if daemon:
+        def check_due(titans: List[NagiosHost]) -> NagiosCheckResults:
+            checkresults = NagiosCheckResults()
+            check(titans, checkresults.append)
+            diff_pool.report()
+            return checkresults
+
+        run_daemon(
+            load_inventory=load_inventory,
+            check=check_due,
+            submit_results=submit_results,
+            interval=interval,
+            inventory_refresh=inventory_refresh
+        )
+        if recorder is not None:
+            recorder.close()
+        diff_pool.shutdown()
+        backend.close()
+        profiler.stop()
+        return
+
+    titans = load_inventory()
+    checkpoint = None
+    if checkpoint_file is not None:
+        checkpoint = Checkpoint(
+            path=checkpoint_file,
+            max_age=checkpoint_max_age
+        )
+        titans = checkpoint.filter(titans)
+
+    def submit_checkpointed(checkresults: NagiosCheckResults):
+        submit_results(checkresults)
+        if checkpoint is not None:
+            checkpoint.record(result.hostname for result in checkresults)
+
+    # Results are submitted in batches as the sweep goes
+    submitter = BatchSubmitter(
+        submit_results=submit_checkpointed,
+        batch_size=batch_size
+    )
+    check(titans, submitter.add)
+    submitter.flush()
+    if recorder is not None:
+        recorder.close()
+    if checkpoint is not None:
+        checkpoint.complete()
+    diff_pool.report()
+    diff_pool.shutdown()
+    backend.close()
+    profiler.stop()
+
+    if cache is not None:
+        cache.wait()
     return
 
 
@@ -0,0 +1,86 @@
+import logging
+import time
+from typing import Optional
+import click
+from station_config_check.config import LogLevels
+from station_config_check.config_check.history import SimilarityHistory
+
+
+@click.command()
+@click.option(
+    '--history-file',
+    required=True,
+    help='File the similarity of configs was recorded in by config checks'
+)
+@click.option(
+    '--days',
+    type=float,
+    help='Number of days back the similarity is compared to',
+    default=90
+)
+@click.option(
+    '--min-drop',
+    type=float,
+    help=('Drop of the similarity in percent over the period from which a ' +
+          'device is listed'),
+    default=0.01
+)
+@click.option(
+    '--below',
+    type=float,
+    help=('Also list the devices whose current similarity in percent is ' +
+          'under this value, whether it dropped or not')
+)
+@click.option(
+    '--host',
+    help='List every change of the similarity of a single device instead'
+)
+@click.option(
+    '--log-level',
+    type=click.Choice([v.value for v in LogLevels]),
+    help="Log more information about the program's execution",
+    default=LogLevels.WARNING
+)
+def main(
+    history_file: str,
+    days: float,
+    min_drop: float,
+    below: Optional[float],
+    host: Optional[str],
+    log_level: str
+):
+
+    logging.basicConfig(
+        format='%(asctime)s:%(levelname)s:%(message)s',
+        datefmt="%Y-%m-%d %H:%M:%S",
+        level=log_level)
+
+    history = SimilarityHistory(path=history_file)
+
+    if host is not None:
+        for timestamp, similarity in history.series(host):
+            click.echo(
+                f'{time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))}'
+                f'\t{similarity:.2f}%')
+        return
+
+    start = time.monotonic()
+    drifts = history.drift(since=time.time() - days * 86400)
+    logging.info(
+        f'Read the history of {len(drifts)} devices in ' +
+        f'{time.monotonic() - start:.3f}s')
+
+    # Devices that drifted the most first
+    for drift in sorted(drifts, key=lambda drift: drift.current - drift.start):
+        dropped = drift.start - drift.current >= min_drop
+        if not dropped and (below is None or drift.current >= below):
+            continue
+        changed = time.strftime(
+            '%Y-%m-%d %H:%M', time.localtime(drift.changed))
+        click.echo(
+            f'{drift.hostname}\t{drift.start:.2f}%\t{drift.current:.2f}%\t' +
+            f'{drift.lowest:.2f}%\t{changed}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+import logging
+import sys
+import urllib.error
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+import click
+import configparser
+from station_config_check.config import LogLevels
+from station_config_check.config_check.golden_image import \
+    GOLDEN_IMAGE_FORMATS, GoldenImageStore
+from station_config_check.nagios import nagios_api
+from station_config_check.nagios.nagios_api import NagiosHost
+from station_config_check.runner.checkpoint import RunLock, RunLocked
+from station_config_check.runner.rebaseline import HostSelector, \
+    apply_rebaseline, fetch_configs, plan_rebaseline, summarize_rebaseline
+from station_config_check.fortimus import running_config as fortimus
+from station_config_check.titansma import running_config as titansma
+
+
+def device_functions(
+    device_type: str,
+    nagios_ip: str,
+    config: configparser.ConfigParser
+) -> Tuple[Callable[[], Iterable[NagiosHost]], Callable[[NagiosHost], str]]:
+    '''
+    Get the functions listing the devices of a type and downloading their
+    running config
+
+    Returns
+    -------
+    Tuple: The function listing the devices, and the function downloading
+    the running config of a single device
+    '''
+    api_key = config['nagios']['api_key']
+
+    if device_type == 'titansma':
+        def download_titansma(titan: NagiosHost) -> str:
+            return titansma.get_running_config(
+                titan_sma=titan,
+                credentials=titansma.fetch_credentials(
+                    install_type=titan.install_type,
+                    config=config
+                )
+            )
+
+        return (lambda: titansma.get_titansma_list(
+            nagios_ip=nagios_ip,
+            api_key=api_key
+        ), download_titansma)
+
+    return (lambda: fortimus.get_fortimus_list(
+        nagios_ip=nagios_ip,
+        api_key=api_key
+    ), lambda host: fortimus.get_running_config(fortimus=host))
+
+
+@click.command()
+@click.option(
+    '--device-type',
+    type=click.Choice(['titansma', 'fortimus']),
+    required=True,
+    help='The type of devices to re-baseline'
+)
+@click.option(
+    '--nagios-ip',
+    help=('The IP address of the Nagios server to query')
+)
+@click.option(
+    '--goldenimg-dir',
+    help=('Parent directory of config golden images')
+)
+@click.option(
+    '--cred-file',
+    help=('File where credentials are stored')
+)
+@click.option(
+    '--network',
+    multiple=True,
+    help='Network of the devices to re-baseline. May be repeated'
+)
+@click.option(
+    '--station',
+    multiple=True,
+    help=('Shell style pattern of the stations of the devices to ' +
+          're-baseline, such as "ST*". May be repeated')
+)
+@click.option(
+    '--install-type',
+    multiple=True,
+    help='Install type of the devices to re-baseline. May be repeated'
+)
+@click.option(
+    '--hostgroup',
+    multiple=True,
+    help=('Nagios hostgroup the devices to re-baseline are members of. ' +
+          'May be repeated')
+)
+@click.option(
+    '--workers',
+    type=int,
+    help='Number of running configs downloaded at the same time',
+    default=16
+)
+@click.option(
+    '--golden-format',
+    type=click.Choice(list(GOLDEN_IMAGE_FORMATS)),
+    help='Format the golden images are written in',
+    default='text'
+)
+@click.option(
+    '--lock-file',
+    help=('Lock file of the config checks of the devices. It is held while ' +
+          'the golden images are written, so they are not written while a ' +
+          'check saves golden images of its own')
+)
+@click.option(
+    '--dry-run',
+    is_flag=True,
+    help='Only show the changes to the golden images, without writing them'
+)
+@click.option(
+    '--yes',
+    is_flag=True,
+    help='Write the golden images without asking for confirmation'
+)
+@click.option(
+    '--log-level',
+    type=click.Choice([v.value for v in LogLevels]),
+    help="Log more information about the program's execution",
+    default=LogLevels.WARNING
+)
+def main(
+    device_type: str,
+    nagios_ip: str,
+    goldenimg_dir: str,
+    cred_file: str,
+    network: Tuple[str, ...],
+    station: Tuple[str, ...],
+    install_type: Tuple[str, ...],
+    hostgroup: Tuple[str, ...],
+    workers: int,
+    golden_format: str,
+    lock_file: Optional[str],
+    dry_run: bool,
+    yes: bool,
+    log_level: str
+):
+
+    logging.basicConfig(
+        format='%(asctime)s:%(levelname)s:%(message)s',
+        datefmt="%Y-%m-%d %H:%M:%S",
+        level=log_level)
+
+    # Read the cred file
+    config = configparser.ConfigParser()
+    config.read(cred_file)
+
+    list_devices, download = device_functions(
+        device_type=device_type,
+        nagios_ip=nagios_ip,
+        config=config
+    )
+
+    hostnames: Optional[Set[str]] = None
+    if hostgroup:
+        hostnames = set()
+        for name in hostgroup:
+            hostnames.update(nagios_api.fetch_hostgroup_members(
+                hostgroup_name=name,
+                nagios_ip=nagios_ip,
+                api_key=config['nagios']['api_key']
+            ))
+
+    selector = HostSelector(
+        networks=network,
+        stations=station,
+        install_types=install_type,
+        hostnames=hostnames
+    )
+    hosts = selector.filter(list_devices())
+    if not hosts:
+        click.echo('No device selected')
+        return
+    logging.info(f'Downloading the running config of {len(hosts)} devices')
+
+    configs: Dict[str, str]
+    configs, failed = fetch_configs(
+        hosts=hosts,
+        fetch=download,
+        fetch_errors=(urllib.error.URLError,),
+        workers=workers
+    )
+
+    golden_images = GoldenImageStore(
+        goldenimg_dir=goldenimg_dir,
+        device_type=device_type,
+        image_format=golden_format
+    )
+    changes = plan_rebaseline(
+        hosts=hosts,
+        configs=configs,
+        golden_images=golden_images
+    )
+    click.echo(summarize_rebaseline(changes, failed))
+
+    pending = sum(change.status != 'unchanged' for change in changes)
+    if dry_run or not pending:
+        return
+    if not yes:
+        click.confirm(f'Write {pending} golden images?', abort=True)
+
+    lock = None
+    if lock_file is not None:
+        lock = RunLock(path=lock_file)
+        try:
+            lock.acquire()
+        except RunLocked as e:
+            click.echo(
+                f'A config check is in progress, retry once it is done: {e}',
+                err=True)
+            sys.exit(1)
+
+    try:
+        apply_rebaseline(
+            changes=changes,
+            configs=configs,
+            golden_images=golden_images
+        )
+    finally:
+        if lock is not None:
+            lock.release()
+
+
+if __name__ == '__main__':
+    main()
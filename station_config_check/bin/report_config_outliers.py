@@ -0,0 +1,61 @@
+import logging
+import click
+from station_config_check.config import LogLevels
+from station_config_check.config_check.similarity import SketchStore, \
+    find_outliers
+
+
+@click.command()
+@click.option(
+    '--sketch-file',
+    required=True,
+    help=('File the sketches of running configs were kept in by a config ' +
+          'check')
+)
+@click.option(
+    '--threshold',
+    type=float,
+    help=('Similarity in percent to the nearest peer under which a device ' +
+          'is reported. With 100, every device whose config differs from ' +
+          'all of its peers is reported'),
+    default=50
+)
+@click.option(
+    '--neighbours',
+    type=int,
+    help='Number of nearest peers listed for each device',
+    default=3
+)
+@click.option(
+    '--log-level',
+    type=click.Choice([v.value for v in LogLevels]),
+    help="Log more information about the program's execution",
+    default=LogLevels.WARNING
+)
+def main(
+    sketch_file: str,
+    threshold: float,
+    neighbours: int,
+    log_level: str
+):
+
+    logging.basicConfig(
+        format='%(asctime)s:%(levelname)s:%(message)s',
+        datefmt="%Y-%m-%d %H:%M:%S",
+        level=log_level)
+
+    sketches = SketchStore(path=sketch_file)
+    logging.info(f'Comparing the configs of {len(sketches.sketches)} devices')
+
+    # Devices least similar to their nearest peer are listed first
+    for score in find_outliers(sketches.sketches, count=neighbours):
+        if score.similarity >= threshold:
+            break
+        nearest = ', '.join(
+            f'{hostname} ({similarity * 100:.0f}%)'
+            for hostname, similarity in score.neighbours) or '-'
+        click.echo(f'{score.hostname}\t{score.similarity:.0f}%\t{nearest}')
+
+
+if __name__ == '__main__':
+    main()
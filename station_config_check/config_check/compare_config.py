@@ -1,9 +1,22 @@
-import difflib
-from typing import List
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from station_config_check.lazy_import import lazy_import
+from station_config_check.config_check.interning import LineTable, \
+    compare_interned
+from station_config_check.config_check.thresholds import DEFAULT_THRESHOLD
 from station_config_check.nagios.models import NagiosOutputCode, \
-    NagiosPerformance, NagiosResult, NagiosVerbose
+    NagiosPerformance, NagiosResult, NagiosThreshold, NagiosVerbose
 from station_config_check.nagios.nrdp import NagiosCheckResult
 
+# Only loaded once configs are compared
+if TYPE_CHECKING:
+    import difflib
+else:
+    difflib = lazy_import('difflib')
+
+
+# Ways configs can be compared, see compare_configs
+DIFF_BACKENDS = ('string', 'interned')
+
 
 def diff_percentage(
     golden_image: str,
@@ -65,11 +78,81 @@ def diff_list(
     return differences
 
 
-def get_config_check_results(
-    hostname: str,
+class ConfigCheckOutput:
+    '''
+    Outcome of a config comparison, rendered to the Nagios plugin output only
+    when it is converted to a string
+    '''
+    __slots__ = ('percentage', 'state', 'differences', 'threshold')
+
+    def __init__(
+        self,
+        percentage: float,
+        state: NagiosOutputCode,
+        differences: List[str],
+        threshold: NagiosThreshold = DEFAULT_THRESHOLD
+    ):
+        self.percentage = percentage
+        self.state = state
+        self.differences = differences
+        self.threshold = threshold
+
+    def __str__(self) -> str:
+        performance = NagiosPerformance(
+            label='Config',
+            value=self.percentage,
+            uom='%',
+            warning=self.threshold.warning,
+            critical=self.threshold.critical
+        )
+
+        result = NagiosResult(
+            summary=f'Similarity between config files: {self.percentage}%',
+            verbose=NagiosVerbose.multiline,
+            status=self.state,
+            performances=[performance],
+            details='Changes:\n' + '\n'.join(self.differences)
+        )
+        return str(result)
+
+
+def compare_configs(
     golden_image: str,
+    running_config: str,
+    backend: str = 'string',
+    line_table: Optional[LineTable] = None
+) -> Tuple[float, List[str]]:
+    '''
+    Compare the running config to the golden image
+
+    Parameters
+    ----------
+    golden_image: str
+        Contents of the golden image config file as a single string
+
     running_config: str
-) -> NagiosCheckResult:
+        Contents of the current running config file as a single string
+
+    backend: str
+        How configs are compared. With string, the similarity is computed on
+        characters. With interned, lines are converted to integers and the
+        similarity is computed on lines, which is much quicker.
+
+    line_table: LineTable
+        Table lines are interned in with the interned backend
+
+    Returns
+    -------
+    Tuple: The percentage of similarities between the two configurations and
+    the list of lines that have changed
+    '''
+    if backend == 'interned':
+        return compare_interned(
+            golden_image=golden_image,
+            running_config=running_config,
+            line_table=line_table
+        )
+
     percentage = diff_percentage(
         golden_image=golden_image,
         running_config=running_config
@@ -78,28 +161,66 @@ def get_config_check_results(
         golden_image=golden_image,
         running_config=running_config
     )
+    return percentage, differences
 
-    performance = NagiosPerformance(
-        label='Config',
-        value=percentage,
-        uom='%'
-    )
 
-    if percentage < 100:
-        state = NagiosOutputCode.critical
-    else:
-        state = NagiosOutputCode.ok
-
-    result = NagiosResult(
-        summary=f'Similarity between config files: {percentage}%',
-        verbose=NagiosVerbose.multiline,
-        status=state,
-        performances=[performance],
-        details='Changes:\n' + '\n'.join(differences)
-    )
+def build_config_check_results(
+    hostname: str,
+    percentage: float,
+    differences: List[str],
+    threshold: Optional[NagiosThreshold] = None
+) -> NagiosCheckResult:
+    '''
+    Build the check result of a config comparison
+
+    Parameters
+    ----------
+    hostname: str
+        The Nagios hostname of the device
+
+    percentage: float
+        The percentage of similarities between the two configurations
+
+    differences: List
+        The lines that have changed
 
+    threshold: NagiosThreshold
+        The ranges of the percentage the check is warning or critical in.
+        By default, the check is critical if the configurations differ.
+
+    Returns
+    -------
+    NagiosCheckResult: The result to submit to Nagios
+    '''
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLD
+    state = threshold.evaluate(percentage)
+
+    # The output is kept structured until the results are submitted
     return NagiosCheckResult(
         hostname=hostname,
         servicename='Config Check',
         state=state.value,
-        output=str(result))
+        output=ConfigCheckOutput(
+            percentage=percentage,
+            state=state,
+            differences=differences,
+            threshold=threshold
+        ))
+
+
+def get_config_check_results(
+    hostname: str,
+    golden_image: str,
+    running_config: str
+) -> NagiosCheckResult:
+    percentage, differences = compare_configs(
+        golden_image=golden_image,
+        running_config=running_config
+    )
+
+    return build_config_check_results(
+        hostname=hostname,
+        percentage=percentage,
+        differences=differences
+    )
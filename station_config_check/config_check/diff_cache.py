@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from station_config_check.lazy_import import lazy_import
+
+# Only loaded when a cache is used
+if TYPE_CHECKING:
+    import sqlite3
+else:
+    sqlite3 = lazy_import('sqlite3')
+
+
+def config_digest(
+    config: str
+) -> str:
+    '''
+    Get a digest identifying the contents of a config
+
+    Parameters
+    ----------
+    config: str
+        The config as a single string
+
+    Returns
+    -------
+    str: The sha256 digest of the config
+    '''
+    return hashlib.sha256(config.encode()).hexdigest()
+
+
+class DiffCache:
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 10000
+    ):
+        '''
+        Keep the outcome of config comparisons on disk, keyed by the digests
+        of the golden image and running config, so a comparison that was
+        already made does not have to be made again
+
+        Parameters
+        ----------
+        path: str
+            The file the cache is stored in
+
+        max_entries: int
+            The number of comparisons kept. The least recently used ones are
+            evicted beyond it.
+        '''
+        self.max_entries = max_entries
+        # The cache is also updated from the thread collecting comparisons
+        # made in worker processes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS diffs (' +
+                'golden TEXT, running TEXT, backend TEXT, ' +
+                'percentage REAL, differences TEXT, last_used REAL, ' +
+                'PRIMARY KEY (golden, running, backend))')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS diffs_last_used ' +
+                'ON diffs (last_used)')
+
+    def get(
+        self,
+        golden_digest: str,
+        running_digest: str,
+        backend: str = 'string'
+    ) -> Optional[Tuple[float, List[str]]]:
+        '''
+        Get the outcome of a comparison
+
+        Parameters
+        ----------
+        golden_digest: str
+            The digest of the golden image
+
+        running_digest: str
+            The digest of the running config
+
+        backend: str
+            The backend the configs were compared with
+
+        Returns
+        -------
+        Tuple: The percentage of similarities and the list of lines that have
+        changed, or None if the comparison was not cached
+        '''
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                'SELECT percentage, differences FROM diffs ' +
+                'WHERE golden = ? AND running = ? AND backend = ?',
+                (golden_digest, running_digest, backend)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                'UPDATE diffs SET last_used = ? ' +
+                'WHERE golden = ? AND running = ? AND backend = ?',
+                (time.time(), golden_digest, running_digest, backend))
+        return row[0], json.loads(row[1])
+
+    def put(
+        self,
+        golden_digest: str,
+        running_digest: str,
+        percentage: float,
+        differences: List[str],
+        backend: str = 'string'
+    ):
+        '''
+        Store the outcome of a comparison, evicting the least recently used
+        comparisons if the cache is full
+
+        Parameters
+        ----------
+        golden_digest: str
+            The digest of the golden image
+
+        running_digest: str
+            The digest of the running config
+
+        percentage: float
+            The percentage of similarities between the two configurations
+
+        differences: List
+            The lines that have changed
+
+        backend: str
+            The backend the configs were compared with
+        '''
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO diffs VALUES (?, ?, ?, ?, ?, ?)',
+                (golden_digest, running_digest, backend, percentage,
+                 json.dumps(differences), time.time()))
+            count = self._connection.execute(
+                'SELECT COUNT(*) FROM diffs').fetchone()[0]
+            if count > self.max_entries:
+                logging.debug(
+                    f'Evicting {count - self.max_entries} cached comparisons')
+                self._connection.execute(
+                    'DELETE FROM diffs WHERE rowid IN (' +
+                    'SELECT rowid FROM diffs ORDER BY last_used LIMIT ?)',
+                    (count - self.max_entries,))
+
+    def close(self):
+        self._connection.close()
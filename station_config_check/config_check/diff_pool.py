@@ -0,0 +1,249 @@
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from station_config_check.config_check.compare_config import \
+    build_config_check_results, compare_configs
+from station_config_check.config_check.diff_cache import DiffCache, \
+    config_digest
+from station_config_check.config_check.interning import LineTable
+from station_config_check.nagios.models import NagiosThreshold
+from station_config_check.nagios.nrdp import NagiosCheckResult
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+
+def _compare(
+    golden_image: bytes,
+    running_config: bytes,
+    backend: str
+) -> Tuple[float, List[str]]:
+    '''
+    Compare configs in a worker process. The configs are passed encoded since
+    bytes are copied to the worker as a single buffer.
+    '''
+    return compare_configs(
+        golden_image=golden_image.decode(),
+        running_config=running_config.decode(),
+        backend=backend
+    )
+
+
+class DiffPool:
+    def __init__(
+        self,
+        workers: int = 0,
+        threshold: int = 65536,
+        diff_cache: Optional[DiffCache] = None,
+        backend: str = 'string',
+        max_shared: int = 1024,
+        max_lines: int = 200000
+    ):
+        '''
+        Compare large configs in worker processes so downloads from the
+        devices carry on while the comparisons use every core
+
+        Parameters
+        ----------
+        workers: int
+            The number of worker processes. With 0 every comparison is done
+            in the calling process.
+
+        threshold: int
+            Size in characters from which a config is compared in a worker
+            process. Smaller configs are compared in the calling process since
+            it is quicker than sending them to a worker.
+
+        diff_cache: DiffCache
+            Cache of previous comparisons, looked up before comparing configs
+
+        backend: str
+            How configs are compared, see compare_configs. With the interned
+            backend, lines are interned in a table shared by the comparisons
+            made in the calling process until the next report.
+
+        max_shared: int
+            The number of distinct comparisons kept to be shared with hosts
+            submitted later, the least recently used being dropped first, so
+            the memory held does not grow with the fleet
+
+        max_lines: int
+            The number of distinct lines from which the table of interned
+            lines is emptied before a comparison
+        '''
+        self.threshold = threshold
+        self.diff_cache = diff_cache
+        self.backend = backend
+        self.line_table = LineTable()
+        self.max_shared = max_shared
+        self.max_lines = max_lines
+        # Latest comparisons, keyed by the digests of the golden image and
+        # running config
+        self._comparisons: \
+            'OrderedDict[Tuple[str, str], Future[Tuple[float, List[str]]]]' \
+            = OrderedDict()
+        self.submitted = 0
+        self.distinct = 0
+        self.compared = 0
+        self.cache_hits = 0
+        self._executor: Optional['ProcessPoolExecutor'] = None
+        if workers > 0:
+            # Multiprocessing is only loaded when worker processes are used
+            import concurrent.futures
+            import multiprocessing
+
+            # Workers are spawned rather than forked since downloads run in
+            # threads of the calling process
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'))
+
+    def submit(
+        self,
+        hostname: str,
+        golden_image: str,
+        running_config: str,
+        threshold: Optional[NagiosThreshold] = None
+    ) -> 'Future[NagiosCheckResult]':
+        '''
+        Compare the running config of a host to its golden image. Hosts with
+        the same running config and golden image as a host already submitted
+        share its comparison.
+
+        Parameters
+        ----------
+        hostname: str
+            The Nagios hostname of the device
+
+        golden_image: str
+            Contents of the golden image config file as a single string
+
+        running_config: str
+            Contents of the current running config file as a single string
+
+        threshold: NagiosThreshold
+            The ranges of similarity the check is warning or critical in,
+            see build_config_check_results
+
+        Returns
+        -------
+        Future: Resolves to the result of the config check
+        '''
+        digests = (config_digest(golden_image), config_digest(running_config))
+        self.submitted += 1
+
+        comparison = self._comparisons.get(digests)
+        if comparison is None:
+            self.distinct += 1
+            comparison = self._compare(digests, golden_image, running_config)
+            self._comparisons[digests] = comparison
+            if len(self._comparisons) > self.max_shared:
+                self._comparisons.popitem(last=False)
+        else:
+            self._comparisons.move_to_end(digests)
+
+        future: 'Future[NagiosCheckResult]' = Future()
+
+        def complete(comparison: 'Future[Tuple[float, List[str]]]'):
+            try:
+                percentage, differences = comparison.result()
+            except Exception as e:
+                future.set_exception(e)
+                return
+            future.set_result(build_config_check_results(
+                hostname=hostname,
+                percentage=percentage,
+                differences=differences,
+                threshold=threshold
+            ))
+
+        comparison.add_done_callback(complete)
+        return future
+
+    def _compare(
+        self,
+        digests: Tuple[str, str],
+        golden_image: str,
+        running_config: str
+    ) -> 'Future[Tuple[float, List[str]]]':
+        '''
+        Get the outcome of a comparison from the cache, or compare the configs
+        in the calling process or a worker process depending on their size
+        '''
+        comparison: 'Future[Tuple[float, List[str]]]' = Future()
+
+        if self.diff_cache is not None:
+            cached = self.diff_cache.get(*digests, backend=self.backend)
+            if cached is not None:
+                self.cache_hits += 1
+                comparison.set_result(cached)
+                return comparison
+
+        self.compared += 1
+
+        def store(comparison: 'Future[Tuple[float, List[str]]]'):
+            if self.diff_cache is not None and \
+                    comparison.exception() is None:
+                self.diff_cache.put(
+                    *digests, *comparison.result(), backend=self.backend)
+
+        size = max(len(golden_image), len(running_config))
+        if self._executor is not None and size >= self.threshold:
+            comparison = self._executor.submit(
+                _compare,
+                golden_image.encode(),
+                running_config.encode(),
+                self.backend)
+            comparison.add_done_callback(store)
+            return comparison
+
+        # Lines only need the same ids within a comparison
+        if len(self.line_table) > self.max_lines:
+            self.line_table.clear()
+        try:
+            comparison.set_result(compare_configs(
+                golden_image=golden_image,
+                running_config=running_config,
+                backend=self.backend,
+                line_table=self.line_table
+            ))
+        except Exception as e:
+            comparison.set_exception(e)
+        store(comparison)
+        return comparison
+
+    def report(self):
+        '''
+        Log how many comparisons were avoided by sharing them between hosts
+        with identical configs and by the cache, and start counting anew
+
+        The counts are logged as a warning so they show at the default log
+        level of the command line tools, once per sweep.
+        '''
+        if self.submitted:
+            logging.warning(
+                f'{self.submitted} configs checked, {self.distinct} ' +
+                'distinct (dedup ratio ' +
+                f'{self.submitted / self.distinct:.2f}), ' +
+                f'{self.cache_hits} taken from cache, ' +
+                f'{self.compared} compared')
+        self._comparisons.clear()
+        self.line_table.clear()
+        self.submitted = 0
+        self.distinct = 0
+        self.compared = 0
+        self.cache_hits = 0
+
+    def shutdown(self):
+        '''
+        Wait for pending comparisons and stop the worker processes
+        '''
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def __enter__(self) -> 'DiffPool':
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
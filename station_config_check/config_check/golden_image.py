@@ -1,12 +1,255 @@
+import collections
+import gzip
 import logging
+import os
 import pathlib
+import re
+import zlib
 from os import makedirs
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+# File name of the golden image of a host in each on-disk format
+GOLDEN_IMAGE_FORMATS = {
+    'text': 'latest.txt',
+    'gzip': 'latest.txt.gz',
+    # zlib stream compressed with a dictionary shared by the device type
+    'zdict': 'latest.txt.zz'
+}
+
+# Largest dictionary zlib makes use of
+DICTIONARY_SIZE = 32768
+
+# Size of the chunks compressed images are decompressed by
+CHUNK_SIZE = 65536
+
+# Placeholder of a template, only in its braced form so that any other $ of
+# a config, such as in a hashed password, is left as is
+TEMPLATE_PLACEHOLDER = re.compile(r'\$\{([A-Za-z_][A-Za-z0-9_]*)\}')
 
 
 class GoldenImageMissing(Exception):
     pass
 
 
+class GoldenImageUnreadable(Exception):
+    pass
+
+
+class GoldenDictionaryMissing(GoldenImageUnreadable):
+    pass
+
+
+def find_golden_image(
+    host_dir: pathlib.Path
+) -> Optional[pathlib.Path]:
+    '''
+    Find the golden image file in the directory of a host, whatever its
+    format. If images were left in several formats, the newest is used.
+
+    Returns
+    -------
+    Path: The golden image file, or None if the host has none
+    '''
+    found: List[Tuple[float, pathlib.Path]] = []
+    for name in GOLDEN_IMAGE_FORMATS.values():
+        path = host_dir / name
+        try:
+            found.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            continue
+    if not found:
+        return None
+    return max(found)[1]
+
+
+def _dictionary_dir(
+    goldenimg_dir: str,
+    device_type: str
+) -> pathlib.Path:
+    return pathlib.Path(f"{goldenimg_dir}/dictionaries/{device_type}")
+
+
+def load_golden_dictionary(
+    goldenimg_dir: str,
+    device_type: str,
+    dictionary_id: int
+) -> bytes:
+    '''
+    Load a compression dictionary of a device type
+
+    Dictionaries are stored under dictionaries/{device_type}/, named by their
+    adler32 checksum, which zlib records in the header of the images
+    compressed with them. A dictionary is never overwritten, so images
+    compressed before a new dictionary was trained remain readable.
+
+    Parameters
+    ----------
+    goldenimg_dir: str
+        The parent directory where golden images are stored
+
+    device_type: str
+        The type of device the dictionary is for
+
+    dictionary_id: int
+        The checksum of the dictionary
+
+    Returns
+    -------
+    bytes: The dictionary
+
+    Raises
+    ------
+    GoldenDictionaryMissing: If there is no dictionary with the checksum
+    '''
+    path = _dictionary_dir(goldenimg_dir, device_type) / \
+        f'{dictionary_id:08x}.dict'
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        raise GoldenDictionaryMissing(
+            f'Dictionary {dictionary_id:08x} of {device_type} is missing')
+
+
+def current_golden_dictionary(
+    goldenimg_dir: str,
+    device_type: str
+) -> Optional[bytes]:
+    '''
+    Load the most recently trained compression dictionary of a device type,
+    which new images are compressed with
+
+    Returns
+    -------
+    bytes: The dictionary, or None if none was trained
+    '''
+    dictionaries = sorted(
+        _dictionary_dir(goldenimg_dir, device_type).glob('*.dict'),
+        key=lambda path: path.stat().st_mtime)
+    if not dictionaries:
+        return None
+    return dictionaries[-1].read_bytes()
+
+
+def train_golden_dictionary(
+    goldenimg_dir: str,
+    device_type: str,
+    size: int = DICTIONARY_SIZE
+) -> Optional[bytes]:
+    '''
+    Build a compression dictionary from the lines the golden images of a
+    device type have in common, and store it as the dictionary new images
+    are compressed with
+
+    Parameters
+    ----------
+    goldenimg_dir: str
+        The parent directory where golden images are stored
+
+    device_type: str
+        The type of device to train the dictionary for
+
+    size: int
+        The maximum size of the dictionary in bytes
+
+    Returns
+    -------
+    bytes: The dictionary, or None if the golden images have no line in
+    common
+    '''
+    # Number of golden images each line appears in
+    counts: collections.Counter = collections.Counter()
+    for host_dir in pathlib.Path(goldenimg_dir).glob(f'*/*/{device_type}'):
+        path = find_golden_image(host_dir)
+        if path is not None:
+            counts.update(set(_read_golden_image(
+                path, goldenimg_dir, device_type).splitlines(keepends=True)))
+
+    # zlib finds matches closer to the end of the dictionary more cheaply,
+    # so the most common lines go last
+    lines: List[bytes] = []
+    total = 0
+    for line, count in counts.most_common():
+        if count < 2:
+            break
+        encoded = line.encode()
+        if total + len(encoded) > size:
+            continue
+        lines.append(encoded)
+        total += len(encoded)
+    if not lines:
+        return None
+    dictionary = b''.join(reversed(lines))
+
+    dictionary_dir = _dictionary_dir(goldenimg_dir, device_type)
+    if not dictionary_dir.exists():
+        makedirs(str(dictionary_dir))
+    path = dictionary_dir / f'{zlib.adler32(dictionary):08x}.dict'
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_bytes(dictionary)
+    os.replace(tmp_path, path)
+    logging.info(
+        f'Trained a {len(dictionary)} bytes dictionary for {device_type} ' +
+        f'from {sum(counts.values())} lines')
+    return dictionary
+
+
+def _read_golden_image(
+    path: pathlib.Path,
+    goldenimg_dir: str,
+    device_type: str
+) -> str:
+    '''
+    Read a golden image file in any of its formats, decompressing it by
+    chunks
+
+    Raises
+    ------
+    GoldenImageUnreadable: If the golden image is corrupt, or was compressed
+    with a dictionary that is missing
+    '''
+    try:
+        return _decompress_golden_image(path, goldenimg_dir, device_type)
+    except (zlib.error, gzip.BadGzipFile, EOFError, UnicodeDecodeError) as e:
+        raise GoldenImageUnreadable(f'Golden image {path} is corrupt: {e}')
+
+
+def _decompress_golden_image(
+    path: pathlib.Path,
+    goldenimg_dir: str,
+    device_type: str
+) -> str:
+    if path.name == GOLDEN_IMAGE_FORMATS['gzip']:
+        with gzip.open(path, mode='rt', encoding='utf-8') as f:
+            return f.read()
+
+    if path.name == GOLDEN_IMAGE_FORMATS['zdict']:
+        with open(path, mode='rb') as f:
+            header = f.read(6)
+            # The FDICT flag of the header is followed by the checksum of
+            # the dictionary
+            if len(header) == 6 and header[1] & 0x20:
+                dictionary = load_golden_dictionary(
+                    goldenimg_dir=goldenimg_dir,
+                    device_type=device_type,
+                    dictionary_id=int.from_bytes(header[2:6], 'big'))
+                decompressor = zlib.decompressobj(zdict=dictionary)
+            else:
+                decompressor = zlib.decompressobj()
+            chunks = [decompressor.decompress(header)]
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                chunks.append(decompressor.decompress(chunk))
+            chunks.append(decompressor.flush())
+            # A stream cut short decompresses without error up to the cut
+            if not decompressor.eof:
+                raise GoldenImageUnreadable(
+                    f'Golden image {path} is truncated')
+        return b''.join(chunks).decode('utf-8')
+
+    with open(path, mode='r') as f:
+        return f.read()
+
+
 def load_golden_image(
     goldenimg_dir: str,
     host_name: str,
@@ -15,6 +258,9 @@ def load_golden_image(
     '''
     Load the golden image of a digitizer
 
+    The golden image may be stored as plain text or compressed in any of the
+    GOLDEN_IMAGE_FORMATS, which is told by its file extension.
+
     Parameters
     ----------
     goldenimg_dir: str
@@ -28,26 +274,32 @@ def load_golden_image(
     -------
     str:
         The contents of the golden image config file as a single string
+
+    Raises
+    ------
+    GoldenImageMissing: If the host has no golden image
+
+    GoldenImageUnreadable: If the golden image is corrupt, or was compressed
+    with a dictionary that is missing
     '''
     network, station = host_name.split('-')[:2]
 
-    goldenimg_path = pathlib.Path(
-        f"{goldenimg_dir}/{network}/{station}/{device_type}/latest.txt")
+    goldenimg_path = find_golden_image(pathlib.Path(
+        f"{goldenimg_dir}/{network}/{station}/{device_type}"))
 
-    if not goldenimg_path.exists():
+    if goldenimg_path is None:
         raise GoldenImageMissing()
 
-    with open(goldenimg_path, mode='r') as f:
-        golden_img = f.read()
-
-    return golden_img
+    return _read_golden_image(goldenimg_path, goldenimg_dir, device_type)
 
 
 def write_golden_image(
     goldenimg_dir: str,
     host_name: str,
     config: str,
-    device_type: str
+    device_type: str,
+    image_format: str = 'text',
+    dictionary: Optional[bytes] = None
 ):
     '''
     Write or overwrite the golden image config for a TitanSMA
@@ -62,6 +314,97 @@ def write_golden_image(
 
     config: str
         The configuration as a single string
+
+    image_format: str
+        The on-disk format of the golden image, one of GOLDEN_IMAGE_FORMATS.
+        The image of the host in any other format is removed.
+
+    dictionary: bytes
+        The dictionary the zdict format is compressed with. The most
+        recently trained dictionary of the device type is used if None.
+    '''
+    if image_format == 'zdict' and dictionary is None:
+        dictionary = current_golden_dictionary(goldenimg_dir, device_type)
+
+    _commit_golden_image(*_stage_golden_image(
+        goldenimg_dir=goldenimg_dir,
+        host_name=host_name,
+        config=config,
+        device_type=device_type,
+        image_format=image_format,
+        dictionary=dictionary
+    ))
+
+
+def write_golden_images(
+    goldenimg_dir: str,
+    configs: Dict[str, str],
+    device_type: str,
+    image_format: str = 'text',
+    dictionary: Optional[bytes] = None
+):
+    '''
+    Write or overwrite the golden images of many hosts at once
+
+    Every image is written to a temporary file before any of them replaces
+    the current image of its host, so the golden images are left untouched
+    if any of them cannot be written.
+
+    Parameters
+    ----------
+    goldenimg_dir: str
+        The parent directory where golden images are stored
+
+    configs: Dict
+        The configurations as single strings, keyed by Nagios hostname
+
+    device_type: str
+        The type of the devices
+
+    image_format: str
+        The on-disk format of the golden images, one of GOLDEN_IMAGE_FORMATS
+
+    dictionary: bytes
+        The dictionary the zdict format is compressed with. The most
+        recently trained dictionary of the device type is used if None.
+    '''
+    if image_format == 'zdict' and dictionary is None:
+        dictionary = current_golden_dictionary(goldenimg_dir, device_type)
+
+    staged: List[Tuple[pathlib.Path, pathlib.Path]] = []
+    try:
+        for host_name, config in configs.items():
+            staged.append(_stage_golden_image(
+                goldenimg_dir=goldenimg_dir,
+                host_name=host_name,
+                config=config,
+                device_type=device_type,
+                image_format=image_format,
+                dictionary=dictionary
+            ))
+    except BaseException:
+        for tmp_path, _ in staged:
+            tmp_path.unlink()
+        raise
+
+    for tmp_path, goldenimg_path in staged:
+        _commit_golden_image(tmp_path, goldenimg_path)
+
+
+def _stage_golden_image(
+    goldenimg_dir: str,
+    host_name: str,
+    config: str,
+    device_type: str,
+    image_format: str,
+    dictionary: Optional[bytes]
+) -> Tuple[pathlib.Path, pathlib.Path]:
+    '''
+    Write a golden image to a temporary file next to where it belongs
+
+    Returns
+    -------
+    Tuple: The temporary file and the golden image file it replaces
     '''
     network, station = host_name.split('-')[:2]
 
@@ -72,8 +415,371 @@ def write_golden_image(
         logging.debug(f'Creating directory {subdir}')
         makedirs(str(subdir))
 
-    goldenimg_path = pathlib.Path(
-        f"{goldenimg_dir}/{network}/{station}/{device_type}/latest.txt")
+    goldenimg_path = subdir / GOLDEN_IMAGE_FORMATS[image_format]
+    tmp_path = subdir / (goldenimg_path.name + '.tmp')
+
+    try:
+        if image_format == 'gzip':
+            with gzip.open(tmp_path, mode='wt', encoding='utf-8') as f:
+                f.write(config)
+        elif image_format == 'zdict':
+            if dictionary is None:
+                compressor = zlib.compressobj(level=9)
+            else:
+                compressor = zlib.compressobj(level=9, zdict=dictionary)
+            with open(tmp_path, mode='wb') as f:
+                f.write(compressor.compress(config.encode('utf-8')))
+                f.write(compressor.flush())
+        else:
+            with open(tmp_path, mode='w') as f:
+                f.writelines(config)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+    return tmp_path, goldenimg_path
+
+
+def _commit_golden_image(
+    tmp_path: pathlib.Path,
+    goldenimg_path: pathlib.Path
+):
+    '''
+    Replace the golden image of a host by the image staged in a temporary
+    file
+    '''
+    os.replace(tmp_path, goldenimg_path)
+
+    # Only a single image of the host is kept
+    for name in GOLDEN_IMAGE_FORMATS.values():
+        if name != goldenimg_path.name:
+            try:
+                (goldenimg_path.parent / name).unlink()
+            except FileNotFoundError:
+                pass
+
+
+def load_golden_template(
+    goldenimg_dir: str,
+    device_type: str,
+    install_type: str
+) -> str:
+    '''
+    Load the golden image template shared by the devices of an install type
+
+    Templates are stored under templates/{device_type}/{install_type}.txt and
+    may contain ${NAME} placeholders for the fields that differ between
+    hosts. Any other $ is part of the config.
+
+    Parameters
+    ----------
+    goldenimg_dir: str
+        The parent directory where golden images are stored
+
+    device_type: str
+        The type of device the template is for
+
+    install_type: str
+        The install type the template is for
+
+    Returns
+    -------
+    str:
+        The contents of the template as a single string
+
+    Raises
+    ------
+    GoldenImageMissing: If there is no template for the install type
+    '''
+    template_path = pathlib.Path(
+        f"{goldenimg_dir}/templates/{device_type}/{install_type}.txt")
+
+    if not template_path.exists():
+        raise GoldenImageMissing()
+
+    with open(template_path, mode='r') as f:
+        template = f.read()
+
+    return template
+
+
+def load_golden_overrides(
+    goldenimg_dir: str,
+    host_name: str,
+    device_type: str
+) -> Dict[str, str]:
+    '''
+    Load the values a host substitutes in the template of its install type
+
+    Overrides are stored next to where the golden image of the host would be,
+    in override.txt, as one NAME=value pair per line. Lines starting with #
+    are ignored.
+
+    Parameters
+    ----------
+    goldenimg_dir: str
+        The parent directory where golden images are stored
+
+    host_name: str
+        The Nagios hostname of the device
+
+    device_type: str
+        The type of device
+
+    Returns
+    -------
+    Dict: The values keyed by placeholder name. Empty if the host has no
+    override file.
+    '''
+    network, station = host_name.split('-')[:2]
+
+    override_path = pathlib.Path(
+        f"{goldenimg_dir}/{network}/{station}/{device_type}/override.txt")
+
+    overrides: Dict[str, str] = {}
+    if not override_path.exists():
+        return overrides
+
+    with open(override_path, mode='r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            name, value = line.split('=', 1)
+            overrides[name.strip()] = value.strip()
+
+    return overrides
+
+
+class GoldenImageStore:
+    def __init__(
+        self,
+        goldenimg_dir: str,
+        device_type: str,
+        image_format: str = 'text',
+        max_cached: int = 256
+    ):
+        '''
+        Keep the golden images of a device type in memory so they only need
+        to be read from disk again once they have been modified
+
+        A host uses its own golden image when it has one. Otherwise the
+        template of its install type is used, with its placeholders replaced
+        by the NETWORK, STATION and HOSTNAME of the host, the variables given
+        when loading and the values of the override file of the host.
+
+        Parameters
+        ----------
+        goldenimg_dir: str
+            The parent directory where golden images are stored
+
+        device_type: str
+            The type of device the golden images are for
+
+        image_format: str
+            The format golden images are written in, one of
+            GOLDEN_IMAGE_FORMATS. Images are read whatever their format.
+            With the zdict format, a dictionary is trained from the existing
+            images of the device type when it has none.
+
+        max_cached: int
+            The number of golden images of hosts kept in memory, the least
+            recently used being dropped first. Templates are kept by install
+            type, and the golden images resolved from them are not kept.
+        '''
+        self.goldenimg_dir = goldenimg_dir
+        self.device_type = device_type
+        self.image_format = image_format
+        self._dictionary: Optional[bytes] = None
+        self._dictionary_loaded = False
+        self.max_cached = max_cached
+        # Golden images by host, along with the file they were read from
+        self._cache: 'collections.OrderedDict[str, Tuple[Hashable, str]]' = \
+            collections.OrderedDict()
+        # Parsed templates by install type, as the text between placeholders
+        # alternating with the names of the placeholders
+        self._templates: Dict[str, Tuple[float, List[str]]] = {}
+
+    def _host_dir(
+        self,
+        host_name: str
+    ) -> pathlib.Path:
+        network, station = host_name.split('-')[:2]
+        return pathlib.Path(
+            f"{self.goldenimg_dir}/{network}/{station}/{self.device_type}")
+
+    def _template(
+        self,
+        install_type: str
+    ) -> Tuple[float, List[str]]:
+        '''
+        Get the parsed template of an install type, reading it only if it
+        changed since it was last read
+
+        Raises
+        ------
+        GoldenImageMissing: If there is no template for the install type
+        '''
+        template_path = pathlib.Path(
+            f"{self.goldenimg_dir}/templates/{self.device_type}/" +
+            f"{install_type}.txt")
+        try:
+            mtime = template_path.stat().st_mtime
+        except FileNotFoundError:
+            self._templates.pop(install_type, None)
+            raise GoldenImageMissing()
+
+        if install_type not in self._templates or \
+                self._templates[install_type][0] != mtime:
+            self._templates[install_type] = (mtime, TEMPLATE_PLACEHOLDER.split(
+                load_golden_template(
+                    goldenimg_dir=self.goldenimg_dir,
+                    device_type=self.device_type,
+                    install_type=install_type
+                )))
+        return self._templates[install_type]
+
+    def load(
+        self,
+        host_name: str,
+        install_type: str = 'default',
+        variables: Optional[Dict[str, str]] = None
+    ) -> str:
+        '''
+        Load the golden image of a host, reading its golden image or
+        template only if it changed since it was last loaded
+
+        Parameters
+        ----------
+        host_name: str
+            The Nagios hostname of the device
+
+        install_type: str
+            The install type of the device, used to find its template
+
+        variables: Dict
+            Values to substitute in the template, such as the IP address of
+            the host. Values from the override file take precedence.
+
+        Returns
+        -------
+        str:
+            The contents of the golden image config file as a single string
+
+        Raises
+        ------
+        GoldenImageMissing: If there is no golden image for the host nor a
+        template for its install type
+
+        GoldenImageUnreadable: If the golden image of the host is corrupt, or
+        was compressed with a dictionary that is missing
+        '''
+        host_dir = self._host_dir(host_name)
+
+        goldenimg_path = find_golden_image(host_dir)
+        if goldenimg_path is not None:
+            try:
+                signature: Hashable = \
+                    (goldenimg_path.name, goldenimg_path.stat().st_mtime)
+            except FileNotFoundError:
+                # Replaced in another format in the meantime
+                return self.load(host_name, install_type, variables)
+            if host_name in self._cache and \
+                    self._cache[host_name][0] == signature:
+                self._cache.move_to_end(host_name)
+                return self._cache[host_name][1]
+
+            golden_img = _read_golden_image(
+                goldenimg_path, self.goldenimg_dir, self.device_type)
+            self._cache[host_name] = (signature, golden_img)
+            self._cache.move_to_end(host_name)
+            if len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+            return golden_img
+
+        self._cache.pop(host_name, None)
+        _, template = self._template(install_type)
+
+        variables = variables or {}
+        network, station = host_name.split('-')[:2]
+        values = {
+            'NETWORK': network,
+            'STATION': station,
+            'HOSTNAME': host_name
+        }
+        values.update(variables)
+        values.update(load_golden_overrides(
+            goldenimg_dir=self.goldenimg_dir,
+            host_name=host_name,
+            device_type=self.device_type
+        ))
+
+        # Placeholders without a value are left as is
+        golden_img = ''.join(
+            part if index % 2 == 0 else values.get(part, f'${{{part}}}')
+            for index, part in enumerate(template))
+        return golden_img
+
+    def _load_dictionary(self):
+        '''
+        Load the dictionary images are compressed with in the zdict format,
+        training one from the existing images if the device type has none
+        '''
+        if self.image_format == 'zdict' and not self._dictionary_loaded:
+            self._dictionary = current_golden_dictionary(
+                self.goldenimg_dir, self.device_type) or \
+                train_golden_dictionary(self.goldenimg_dir, self.device_type)
+            self._dictionary_loaded = True
+
+    def write(
+        self,
+        host_name: str,
+        config: str
+    ):
+        '''
+        Write or overwrite the golden image of a host
+
+        Parameters
+        ----------
+        host_name: str
+            The Nagios hostname of the device
+
+        config: str
+            The configuration as a single string
+        '''
+        self._load_dictionary()
+        write_golden_image(
+            goldenimg_dir=self.goldenimg_dir,
+            host_name=host_name,
+            config=config,
+            device_type=self.device_type,
+            image_format=self.image_format,
+            dictionary=self._dictionary
+        )
+        # The cached entry is reloaded on the next access
+        self._cache.pop(host_name, None)
+
+    def write_many(
+        self,
+        configs: Dict[str, str]
+    ):
+        '''
+        Write or overwrite the golden images of many hosts at once, leaving
+        them untouched if any of them cannot be written
 
-    with open(goldenimg_path, mode='w') as f:
-        f.writelines(config)
+        Parameters
+        ----------
+        configs: Dict
+            The configurations as single strings, keyed by Nagios hostname
+        '''
+        self._load_dictionary()
+        write_golden_images(
+            goldenimg_dir=self.goldenimg_dir,
+            configs=configs,
+            device_type=self.device_type,
+            image_format=self.image_format,
+            dictionary=self._dictionary
+        )
+        for host_name in configs:
+            self._cache.pop(host_name, None)
@@ -0,0 +1,241 @@
+import fcntl
+import logging
+import os
+import struct
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from station_config_check.config_check.compare_config import \
+    ConfigCheckOutput
+from station_config_check.nagios.nrdp import NagiosCheckResult
+
+
+# Time in seconds, host index and similarity in percent, in the byte order
+# of the machine
+RECORD = struct.Struct('=IIf')
+
+
+@dataclass
+class SimilarityDrift():
+    hostname: str
+    # Similarity at the start of the period
+    start: float
+    # Latest similarity
+    current: float
+    lowest: float
+    # Time the similarity last changed
+    changed: float
+
+
+class SimilarityHistory:
+    def __init__(
+        self,
+        path: str
+    ):
+        '''
+        History of the similarity of the running config of each host to its
+        golden image, kept in a single append-only file
+
+        A point is only stored when the similarity of a host changes, so the
+        history of a host is a step function and months of sweeps of a fleet
+        whose configs rarely change take little space. Points are fixed-size
+        records of the time, the index of the host and the similarity, and
+        the hostnames are listed by index in a file next to the history.
+
+        Parameters
+        ----------
+        path: str
+            The history file
+        '''
+        self.path = path
+        self.hosts_path = f'{path}.hosts'
+        self.hostnames: List[str] = []
+        # Latest similarity of each host, by hostname
+        self._latest: Dict[str, float] = {}
+        self._pending: List[Tuple[int, str, float]] = []
+
+        self._read_hostnames()
+        times, indexes, values = self.read_columns()
+        for index, value in zip(indexes, values):
+            if index < len(self.hostnames):
+                self._latest[self.hostnames[index]] = value
+
+    def _read_hostnames(self):
+        try:
+            with open(self.hosts_path, mode='r') as f:
+                self.hostnames = f.read().split('\n')[:-1]
+        except FileNotFoundError:
+            self.hostnames = []
+
+    def read_columns(
+        self
+    ) -> Tuple[List[int], List[int], List[float]]:
+        '''
+        Read the points of every host at once
+
+        Returns
+        -------
+        Tuple: The times, host indexes and similarities of the points, in the
+        order they were stored
+        '''
+        try:
+            with open(self.path, mode='rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return [], [], []
+
+        # A record cut short by a crash is ignored
+        data = data[:len(data) - len(data) % RECORD.size]
+        integers = memoryview(data).cast('I')
+        # Columns are taken by striding over the records without unpacking
+        # them one at a time
+        values: List[float] = \
+            memoryview(data).cast('f')[2::3].tolist()  # type: ignore
+        return integers[0::3].tolist(), integers[1::3].tolist(), values
+
+    def record(
+        self,
+        hostname: str,
+        similarity: float,
+        timestamp: Optional[float] = None
+    ):
+        '''
+        Record the similarity of a host, if it changed since it was last
+        recorded. Points are written by flush.
+        '''
+        # Stored as a float32, compared once rounded the same way
+        similarity = struct.unpack('f', struct.pack('f', similarity))[0]
+        if self._latest.get(hostname) == similarity:
+            return
+        self._latest[hostname] = similarity
+        if timestamp is None:
+            timestamp = time.time()
+        self._pending.append((int(timestamp), hostname, similarity))
+
+    def recording(
+        self,
+        emit: Callable[[NagiosCheckResult], None]
+    ) -> Callable[[NagiosCheckResult], None]:
+        '''
+        Wrap a function receiving check results so the similarity of config
+        checks is recorded on the way
+        '''
+        def recorded(result: NagiosCheckResult):
+            output = result.raw_output
+            if isinstance(output, ConfigCheckOutput):
+                self.record(result.hostname, output.percentage)
+            emit(result)
+
+        return recorded
+
+    def flush(self):
+        '''
+        Append the pending points to the history. Runs sharing the history
+        append one at a time.
+        '''
+        if not self._pending:
+            return
+
+        with open(self.path, mode='ab') as history:
+            fcntl.flock(history, fcntl.LOCK_EX)
+            try:
+                # Hosts may have been added by another run
+                self._read_hostnames()
+                indexes = dict(
+                    (hostname, index)
+                    for index, hostname in enumerate(self.hostnames))
+                new = []
+                for _, hostname, _ in self._pending:
+                    if hostname not in indexes:
+                        indexes[hostname] = len(self.hostnames)
+                        self.hostnames.append(hostname)
+                        new.append(hostname)
+                # Hostnames are written first so every point refers to a
+                # known host
+                if new:
+                    with open(self.hosts_path, mode='a') as f:
+                        f.write(''.join(f'{hostname}\n' for hostname in new))
+                        f.flush()
+                        os.fsync(f.fileno())
+
+                history.write(b''.join(
+                    RECORD.pack(timestamp, indexes[hostname], similarity)
+                    for timestamp, hostname, similarity in self._pending))
+                history.flush()
+            finally:
+                fcntl.flock(history, fcntl.LOCK_UN)
+
+        logging.debug(f'{len(self._pending)} similarity changes recorded')
+        self._pending = []
+
+    def series(
+        self,
+        hostname: str
+    ) -> List[Tuple[int, float]]:
+        '''
+        Get the points of a host
+
+        Returns
+        -------
+        List: Tuples of the time each similarity was first seen and the
+        similarity
+        '''
+        if hostname not in self.hostnames:
+            return []
+        host = self.hostnames.index(hostname)
+        times, indexes, values = self.read_columns()
+        return [
+            (timestamp, value)
+            for timestamp, index, value in zip(times, indexes, values)
+            if index == host]
+
+    def drift(
+        self,
+        since: float,
+        hostnames: Optional[Iterable[str]] = None
+    ) -> List[SimilarityDrift]:
+        '''
+        Get how the similarity of each host evolved since a time
+
+        Parameters
+        ----------
+        since: float
+            The start of the period
+
+        hostnames: Iterable
+            The hosts to get. All hosts by default.
+
+        Returns
+        -------
+        List: The drift of each host with points in or before the period
+        '''
+        times, indexes, values = self.read_columns()
+        selected = None
+        if hostnames is not None:
+            selected = set(hostnames)
+
+        # Hosts indexed by their position in the hostnames file
+        drifts: Dict[int, SimilarityDrift] = {}
+        for timestamp, index, value in zip(times, indexes, values):
+            drift = drifts.get(index)
+            if drift is None:
+                drifts[index] = SimilarityDrift(
+                    hostname='', start=value, current=value, lowest=value,
+                    changed=timestamp)
+                continue
+            if timestamp <= since:
+                # The value in effect when the period starts
+                drift.start = drift.lowest = value
+            elif value < drift.lowest:
+                drift.lowest = value
+            drift.current = value
+            drift.changed = timestamp
+
+        results = []
+        for index, drift in drifts.items():
+            if index >= len(self.hostnames):
+                continue
+            drift.hostname = self.hostnames[index]
+            if selected is None or drift.hostname in selected:
+                results.append(drift)
+        return results
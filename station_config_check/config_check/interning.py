@@ -0,0 +1,106 @@
+from array import array
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from station_config_check.lazy_import import lazy_import
+
+# Only loaded once configs are compared
+if TYPE_CHECKING:
+    import difflib
+else:
+    difflib = lazy_import('difflib')
+
+
+class LineTable:
+    '''
+    Table mapping each distinct config line to an integer, shared by all the
+    configs compared during a sweep so that a line seen on many devices is
+    only hashed and stored once
+    '''
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def intern(
+        self,
+        lines: List[str]
+    ) -> 'array[int]':
+        '''
+        Convert lines to the array of their integer ids
+
+        Parameters
+        ----------
+        lines: List
+            The lines of a config
+
+        Returns
+        -------
+        array: The id of each line
+        '''
+        ids = self._ids
+        return array('l', [ids.setdefault(line, len(ids)) for line in lines])
+
+    def clear(self):
+        self._ids.clear()
+
+
+def compare_interned(
+    golden_image: str,
+    running_config: str,
+    line_table: Optional[LineTable] = None
+) -> Tuple[float, List[str]]:
+    '''
+    Compare the running config to the golden image line by line, matching
+    the integer ids of lines rather than the lines themselves
+
+    The changed lines are the same as those reported by diff_list. The
+    similarity is the percentage of lines that match, rather than of
+    characters as reported by diff_percentage.
+
+    Parameters
+    ----------
+    golden_image: str
+        Contents of the golden image config file as a single string
+
+    running_config: str
+        Contents of the current running config file as a single string
+
+    line_table: LineTable
+        Table to intern the lines in. A table is created for the comparison
+        if none is given.
+
+    Returns
+    -------
+    Tuple: The percentage of lines that are similar between the two
+    configurations and the list of lines that have changed
+    '''
+    if line_table is None:
+        line_table = LineTable()
+
+    golden = golden_image.split('\n')
+    running = running_config.split('\n')
+    golden_ids = line_table.intern(golden)
+    running_ids = line_table.intern(running)
+
+    # Arrays are compared element by element in C
+    if golden_ids == running_ids:
+        return 100.0, []
+
+    # Matching runs on lists since indexing them does not create new ints
+    matcher = difflib.SequenceMatcher(
+        None, golden_ids.tolist(), running_ids.tolist())
+
+    differences: List[str] = []
+    differ = difflib.Differ()
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'insert':
+            differences.extend(' ' + line for line in running[j1:j2])
+        elif tag == 'replace':
+            # Lines within a replaced block are paired up by Differ using
+            # their characters, and may turn out to be unchanged
+            differences.extend(
+                line[1:] for line in differ.compare(
+                    golden[i1:i2], running[j1:j2])
+                if line[0] == '+')
+
+    return matcher.ratio() * 100, differences
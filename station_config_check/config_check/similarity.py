@@ -0,0 +1,411 @@
+import fcntl
+import hashlib
+import heapq
+import json
+import logging
+import os
+import pathlib
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from station_config_check.nagios.models import NagiosOutputCode, \
+    NagiosPerformance, NagiosRange, NagiosResult, NagiosVerbose
+from station_config_check.nagios.nrdp import NagiosCheckResult
+
+
+# Prime modulus of the hash functions used to build MinHash signatures
+_MERSENNE_PRIME = (1 << 61) - 1
+
+# Seed of the hash functions, fixed so signatures computed by different runs
+# can be compared
+_SEED = 1
+
+
+def _permutations(
+    num_perm: int
+) -> List[Tuple[int, int]]:
+    generator = random.Random(_SEED)
+    return [
+        (generator.randrange(1, _MERSENNE_PRIME),
+         generator.randrange(0, _MERSENNE_PRIME))
+        for _ in range(num_perm)
+    ]
+
+
+def minhash_signature(
+    config: str,
+    num_perm: int = 128
+) -> Tuple[int, ...]:
+    '''
+    Compute the MinHash signature of a config, a short sketch of its set of
+    distinct lines. The share of equal values between two signatures
+    estimates the Jaccard similarity of the lines of the two configs.
+
+    Parameters
+    ----------
+    config: str
+        The config as a single string
+
+    num_perm: int
+        The number of values in the signature
+
+    Returns
+    -------
+    Tuple: The signature
+    '''
+    lines = {
+        int.from_bytes(
+            hashlib.blake2b(line.encode(), digest_size=8).digest(), 'big')
+        for line in config.split('\n') if line.strip()
+    }
+    if not lines:
+        return (_MERSENNE_PRIME,) * num_perm
+
+    return tuple(
+        min((a * line + b) % _MERSENNE_PRIME for line in lines)
+        for a, b in _permutations(num_perm)
+    )
+
+
+def estimate_similarity(
+    signature_a: Tuple[int, ...],
+    signature_b: Tuple[int, ...]
+) -> float:
+    '''
+    Estimate the Jaccard similarity of two configs from their signatures
+    '''
+    equal = sum(a == b for a, b in zip(signature_a, signature_b))
+    return equal / len(signature_a)
+
+
+class SketchStore:
+    def __init__(
+        self,
+        path: str,
+        max_age: float = 30 * 86400
+    ):
+        '''
+        Keep the signature of the running config of each host on disk, so
+        hosts can be compared to the whole fleet even when only part of it is
+        checked in a run
+
+        Runs checking different shards of the fleet may share the file. Each
+        run merges its signatures into the file when saving, and the
+        signatures of hosts no run has seen for max_age are dropped, so
+        decommissioned hosts leave the fleet.
+
+        Parameters
+        ----------
+        path: str
+            The file the signatures are stored in
+
+        max_age: float
+            Time in seconds after which the signature of a host that was not
+            checked again is dropped
+        '''
+        self.path = pathlib.Path(path)
+        self.max_age = max_age
+        self.sketches: Dict[str, Tuple[int, ...]] = {}
+        # Time each host was last checked
+        self.seen: Dict[str, float] = {}
+        # Hosts added by this run
+        self._added: Set[str] = set()
+        self._read()
+
+    def _read(self):
+        '''
+        Read the signatures on disk, replacing those in memory but the ones
+        added by this run
+        '''
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, mode='r') as f:
+                stored = json.load(f)
+            now = time.time()
+            for hostname, sketch in stored.items():
+                if hostname in self._added:
+                    continue
+                # Files written before hosts were timestamped hold the
+                # signature alone
+                if isinstance(sketch, list):
+                    sketch = {'seen': now, 'signature': sketch}
+                self.sketches[hostname] = tuple(sketch['signature'])
+                self.seen[hostname] = float(sketch['seen'])
+        except (ValueError, TypeError, AttributeError, KeyError) as e:
+            logging.warning(
+                f'Ignoring corrupt sketch file {self.path}: {e}')
+
+    def add(
+        self,
+        hostname: str,
+        running_config: str
+    ):
+        '''
+        Compute and store the signature of the running config of a host
+        '''
+        self.sketches[hostname] = minhash_signature(running_config)
+        self.seen[hostname] = time.time()
+        self._added.add(hostname)
+
+    def save(self):
+        '''
+        Merge the signatures with those written by other runs since the file
+        was read, drop the hosts not seen for too long, and write them to
+        disk, replacing the previous file atomically
+        '''
+        if not self.path.parent.exists():
+            os.makedirs(str(self.path.parent))
+
+        with open(f'{self.path}.lock', mode='w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._read()
+                expired = [
+                    hostname for hostname, seen in self.seen.items()
+                    if time.time() - seen > self.max_age]
+                for hostname in expired:
+                    del self.sketches[hostname]
+                    del self.seen[hostname]
+                if expired:
+                    logging.info(
+                        f'Dropped the sketches of {len(expired)} hosts not ' +
+                        'checked recently')
+
+                tmp_path = self.path.with_suffix(f'.{os.getpid()}.tmp')
+                with open(tmp_path, mode='w') as f:
+                    json.dump({
+                        hostname: {
+                            'seen': self.seen[hostname],
+                            'signature': signature
+                        }
+                        for hostname, signature in self.sketches.items()
+                    }, f)
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+@dataclass
+class OutlierScore():
+    hostname: str
+    similarity: float
+    neighbours: List[Tuple[str, float]]
+
+
+class LSHIndex:
+    def __init__(
+        self,
+        bands: int = 32,
+        rows: int = 4
+    ):
+        '''
+        Locality sensitive hashing index over MinHash signatures. Signatures
+        are cut in bands, and hosts sharing at least one band are candidate
+        neighbours, so hosts are only compared to the few hosts that are
+        likely similar rather than to the whole fleet. Hosts with the same
+        signature are indexed once, so a fleet of identical configs is not
+        compared host by host.
+
+        Parameters
+        ----------
+        bands: int
+            The number of bands signatures are cut in
+
+        rows: int
+            The number of signature values in each band. Hosts whose
+            similarity is above about (1 / bands) ** (1 / rows) are likely to
+            be candidates.
+        '''
+        self.bands = bands
+        self.rows = rows
+        self.signatures: Dict[str, Tuple[int, ...]] = {}
+        # Hosts by signature
+        self._groups: Dict[Tuple[int, ...], List[str]] = {}
+        self._buckets: List[Dict[Tuple[int, ...], List[Tuple[int, ...]]]] = \
+            [{} for _ in range(bands)]
+
+    def add(
+        self,
+        hostname: str,
+        signature: Tuple[int, ...]
+    ):
+        '''
+        Add the signature of a host to the index
+        '''
+        if len(signature) < self.bands * self.rows:
+            raise ValueError(
+                f'Signature of {hostname} has {len(signature)} values, ' +
+                f'{self.bands * self.rows} needed')
+        self.signatures[hostname] = signature
+        if signature in self._groups:
+            self._groups[signature].append(hostname)
+            return
+        self._groups[signature] = [hostname]
+        for band, buckets in enumerate(self._buckets):
+            key = signature[band * self.rows:(band + 1) * self.rows]
+            buckets.setdefault(key, []).append(signature)
+
+    def nearest(
+        self,
+        signature: Tuple[int, ...],
+        count: int = 3
+    ) -> List[Tuple[str, float]]:
+        '''
+        Find the hosts whose config is most similar to a signature, hosts
+        with the signature itself included
+
+        Returns
+        -------
+        List: Tuples of the hostname of the hosts and their estimated
+        similarity, most similar first
+        '''
+        candidates: Set[Tuple[int, ...]] = set()
+        for band, buckets in enumerate(self._buckets):
+            key = signature[band * self.rows:(band + 1) * self.rows]
+            candidates.update(buckets.get(key, ()))
+
+        scored: List[Tuple[str, float]] = []
+        for candidate in candidates:
+            similarity = estimate_similarity(signature, candidate)
+            # Hosts sharing a signature are as similar, so only the first
+            # ones by name can be among the nearest
+            hostnames = heapq.nsmallest(count, self._groups[candidate])
+            scored.extend((hostname, similarity) for hostname in hostnames)
+        scored.sort(key=lambda neighbour: (-neighbour[1], neighbour[0]))
+        return scored[:count]
+
+    def neighbours(
+        self,
+        hostname: str,
+        count: int = 3
+    ) -> List[Tuple[str, float]]:
+        '''
+        Find the hosts whose config is most similar to the config of a host
+
+        Parameters
+        ----------
+        hostname: str
+            The host to find the neighbours of
+
+        count: int
+            The number of neighbours returned
+
+        Returns
+        -------
+        List: Tuples of the hostname of the neighbours and their estimated
+        similarity, most similar first
+        '''
+        return [
+            neighbour
+            for neighbour in self.nearest(self.signatures[hostname], count + 1)
+            if neighbour[0] != hostname][:count]
+
+
+def find_outliers(
+    sketches: Dict[str, Tuple[int, ...]],
+    hostnames: Optional[Iterable[str]] = None,
+    count: int = 3
+) -> List[OutlierScore]:
+    '''
+    Score how much the config of each host differs from the rest of the
+    fleet
+
+    Parameters
+    ----------
+    sketches: Dict
+        The signature of each host of the fleet
+
+    hostnames: Iterable
+        The hosts to score. All hosts are scored if none are given.
+
+    count: int
+        The number of neighbours of each host that are reported
+
+    Returns
+    -------
+    List: The score of each host, the least similar to its nearest neighbour
+    first. Hosts without any candidate neighbour have a similarity of 0.
+    '''
+    index = LSHIndex()
+    for hostname, signature in sketches.items():
+        index.add(hostname, signature)
+
+    # Hosts with the same signature have the same nearest hosts, which are
+    # only looked up once
+    nearest: Dict[Tuple[int, ...], List[Tuple[str, float]]] = {}
+    scores = []
+    for hostname in (sketches if hostnames is None else hostnames):
+        if hostname not in sketches:
+            continue
+        signature = sketches[hostname]
+        if signature not in nearest:
+            nearest[signature] = index.nearest(signature, count + 1)
+        neighbours = [
+            neighbour for neighbour in nearest[signature]
+            if neighbour[0] != hostname][:count]
+        scores.append(OutlierScore(
+            hostname=hostname,
+            similarity=neighbours[0][1] * 100 if neighbours else 0.0,
+            neighbours=neighbours
+        ))
+
+    scores.sort(key=lambda score: (score.similarity, score.hostname))
+    return scores
+
+
+def build_outlier_check_results(
+    score: OutlierScore,
+    threshold: float = 50
+) -> NagiosCheckResult:
+    '''
+    Build the check result reporting whether the config of a host is an
+    outlier in the fleet
+
+    Parameters
+    ----------
+    score: OutlierScore
+        The score of the host, as returned by find_outliers
+
+    threshold: float
+        The similarity to the nearest neighbour in percent under which the
+        host is reported as an outlier
+
+    Returns
+    -------
+    NagiosCheckResult: The result to submit to Nagios
+    '''
+    # Hosts alert below the threshold
+    warning = NagiosRange(f'{threshold:g}:')
+    if warning.in_range(score.similarity):
+        state = NagiosOutputCode.warning
+    else:
+        state = NagiosOutputCode.ok
+
+    if score.neighbours:
+        nearest = ', '.join(
+            f'{hostname} ({similarity * 100:.0f}%)'
+            for hostname, similarity in score.neighbours)
+        text = f'Nearest configs: {nearest}'
+    else:
+        text = 'No similar config in the fleet'
+
+    return NagiosCheckResult(
+        hostname=score.hostname,
+        servicename='Config Outlier',
+        state=state.value,
+        output=str(NagiosResult(
+            summary=text,
+            verbose=NagiosVerbose.singleline,
+            status=state,
+            performances=[
+                NagiosPerformance(
+                    label='Nearest',
+                    value=score.similarity,
+                    uom='%',
+                    warning=warning
+                )
+            ]
+        ))
+    )
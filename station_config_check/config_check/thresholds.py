@@ -0,0 +1,102 @@
+import configparser
+from typing import Dict, Optional
+from station_config_check.nagios.models import NagiosRange, NagiosThreshold
+
+
+# Prefix of the sections of the cred file holding similarity thresholds
+THRESHOLD_SECTION_PREFIX = 'threshold:'
+
+# A config check is critical as soon as the config differs from its golden
+# image unless configured otherwise
+DEFAULT_CRITICAL = '100:'
+DEFAULT_THRESHOLD = NagiosThreshold(critical=NagiosRange(DEFAULT_CRITICAL))
+
+
+def _parse_range(
+    threshold: Optional[str]
+) -> Optional[NagiosRange]:
+    if threshold is None or not threshold.strip():
+        return None
+    return NagiosRange(threshold.strip())
+
+
+class SimilarityThresholds:
+    def __init__(
+        self,
+        default: NagiosThreshold,
+        install_types: Optional[Dict[str, NagiosThreshold]] = None
+    ):
+        '''
+        Warning and critical ranges of the similarity of configs to their
+        golden image, for the install types of a device type. The ranges are
+        parsed once, when loaded.
+
+        Parameters
+        ----------
+        default: NagiosThreshold
+            The thresholds of install types without thresholds of their own
+
+        install_types: Dict
+            Thresholds keyed by install type
+        '''
+        self.default = default
+        self.install_types = install_types or {}
+
+    def get(
+        self,
+        install_type: str
+    ) -> NagiosThreshold:
+        return self.install_types.get(install_type, self.default)
+
+
+def load_thresholds(
+    config: configparser.ConfigParser,
+    device_type: str
+) -> SimilarityThresholds:
+    '''
+    Read the similarity thresholds of a device type defined in the cred file
+
+    Thresholds are Nagios ranges in percent, given by the keys warning and
+    critical of a section named threshold:<device_type>, and overridden per
+    install type by sections named threshold:<device_type>:<install_type>.
+    An empty value disables the threshold. Without configuration, config
+    checks are critical below 100%.
+
+    Parameters
+    ----------
+    config: ConfigParser
+        The parsed cred file
+
+    device_type: str
+        The type of device the thresholds are for
+
+    Returns
+    -------
+    SimilarityThresholds: The compiled thresholds
+
+    Raises
+    ------
+    ValueError: If a range is not valid
+    '''
+    section = f'{THRESHOLD_SECTION_PREFIX}{device_type}'
+    defaults = {'warning': None, 'critical': DEFAULT_CRITICAL}
+    if config.has_section(section):
+        defaults.update(config[section])
+    default = NagiosThreshold(
+        warning=_parse_range(defaults['warning']),
+        critical=_parse_range(defaults['critical'])
+    )
+
+    install_types = {}
+    prefix = f'{section}:'
+    for name in config.sections():
+        if not name.startswith(prefix):
+            continue
+        values = dict(defaults)
+        values.update(config[name])
+        install_types[name[len(prefix):]] = NagiosThreshold(
+            warning=_parse_range(values['warning']),
+            critical=_parse_range(values['critical'])
+        )
+
+    return SimilarityThresholds(default=default, install_types=install_types)
@@ -2,9 +2,12 @@ import http
 import logging
 import os
 import hashlib
+import http.client
 import http.cookiejar
+from typing import Dict, Optional
 from urllib import parse
-import urllib
+import urllib.error
+import urllib.request
 
 
 class GlobalCookieJar:
@@ -59,6 +62,28 @@ class GlobalCookieJar:
                 urllib.request.HTTPCookieProcessor(self.cookiejar)))
         return self
 
+    def getOpener(
+        self,
+        *handlers: urllib.request.BaseHandler
+    ) -> urllib.request.OpenerDirector:
+        '''
+        Build an opener adding cookies from the jar to its requests without
+        installing it globally, so several jars can be in use at once from
+        different threads
+
+        Parameters
+        ----------
+        handlers: BaseHandler
+            Additional handlers of the opener, replacing the default handlers
+            they derive from
+
+        Returns
+        -------
+        OpenerDirector: The opener to send requests with
+        '''
+        return urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookiejar), *handlers)
+
     def addCookieToRequest(
         self,
         request: urllib.request.Request
@@ -67,6 +92,107 @@ class GlobalCookieJar:
         return self
 
 
+class KeepAliveHandler(urllib.request.HTTPHandler):
+    '''
+    HTTP handler sending the requests to a host over a single persistent
+    HTTP/1.1 connection, instead of opening a connection per request. This
+    saves the round trips of setting up a TCP connection for every request,
+    which are costly over slow links.
+
+    A request is sent again over a new connection if the host closed the
+    persistent one. Responses must be read completely before sending the
+    next request, otherwise a new connection is opened.
+    '''
+    def __init__(
+        self,
+        timeout: Optional[float] = None
+    ):
+        super().__init__()
+        self.timeout = timeout
+        self._connections: Dict[str, http.client.HTTPConnection] = {}
+        self._responses: Dict[str, http.client.HTTPResponse] = {}
+        self.connections_opened = 0
+
+    def _connection(
+        self,
+        host: str
+    ) -> http.client.HTTPConnection:
+        '''
+        Get the persistent connection to a host, opening a new one if the
+        previous response was not consumed
+        '''
+        previous = self._responses.pop(host, None)
+        if previous is not None and (
+                not previous.isclosed() or previous.will_close):
+            self._close(host)
+
+        if host not in self._connections:
+            self._connections[host] = http.client.HTTPConnection(
+                host, timeout=self.timeout)
+            self.connections_opened += 1
+        return self._connections[host]
+
+    def _close(
+        self,
+        host: str
+    ):
+        connection = self._connections.pop(host, None)
+        if connection is not None:
+            connection.close()
+
+    def http_open(
+        self,
+        req: urllib.request.Request
+    ) -> http.client.HTTPResponse:
+        host = req.host
+        if not host:
+            raise urllib.error.URLError('no host given')
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update(
+            (k, v) for k, v in req.headers.items() if k not in headers)
+        headers['Connection'] = 'keep-alive'
+        headers = {name.title(): value for name, value in headers.items()}
+
+        try:
+            try:
+                opened = self.connections_opened
+                connection = self._connection(host)
+                reused = self.connections_opened == opened
+                connection.request(
+                    req.get_method(), req.selector, req.data, headers)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError):
+                # The host closed the persistent connection, fall back to a
+                # new one
+                self._close(host)
+                if not reused:
+                    raise
+                logging.debug(f'Connection to {host} closed, reconnecting')
+                connection = self._connection(host)
+                connection.request(
+                    req.get_method(), req.selector, req.data, headers)
+                response = connection.getresponse()
+        except OSError as e:
+            self._close(host)
+            raise urllib.error.URLError(e)
+
+        self._responses[host] = response
+        # Attributes expected of responses by urllib
+        response.url = req.get_full_url()
+        response.msg = response.reason  # type: ignore
+        return response
+
+    def close(self):
+        '''
+        Close the persistent connections
+        '''
+        for host in list(self._connections):
+            self._close(host)
+        self._responses.clear()
+
+
 def getHash(
     string: str
 ) -> str:
@@ -124,7 +250,8 @@ class DigitizerInterface:
         self,
         address: str,
         username: str,
-        password: str
+        password: str,
+        opener: Optional[urllib.request.OpenerDirector] = None
     ):
         '''
         Initialize the digitizer interface
@@ -139,10 +266,16 @@ class DigitizerInterface:
 
         password: str
             The password for the user
+
+        opener: OpenerDirector
+            Opener used to send requests. Defaults to the globally installed
+            opener.
         '''
         self.address = address
         self.username = username
         self.password = password
+        self.urlopen = urllib.request.urlopen if opener is None \
+            else opener.open
 
     def getUrl(
         self,
@@ -174,7 +307,7 @@ class DigitizerInterface:
         key_url = self.getUrl('key')
         logging.debug(f'Sending request to {key_url}')
         request = urllib.request.Request(key_url)
-        response = urllib.request.urlopen(request)
+        response = self.urlopen(request)
         cookiejar.addCookieToJar(response, request)
         key = response.read().decode('ascii')
         return key
@@ -203,7 +336,7 @@ class DigitizerInterface:
             login_url, method='POST')
         login_request.add_header('X-NMX-USERNAME', self.username)
         login_request.add_header('X-NMX-PASSWORD', encodedPassword)
-        login_response = urllib.request.urlopen(login_request)
+        login_response = self.urlopen(login_request)
         cookiejar.addCookieToJar(login_response, login_request)
         logging.debug(
             f'Response to login request: {login_response.read().decode()}')
@@ -222,7 +355,7 @@ class DigitizerInterface:
         logging.debug(f'Sending request to {config_url}')
         request = urllib.request.Request(config_url)
         try:
-            response = urllib.request.urlopen(request)
+            response = self.urlopen(request)
         except urllib.error.HTTPError as e:
             logging.error(e)
 
@@ -1,16 +1,19 @@
 import logging
-from typing import List
-import urllib
+from typing import Iterable, Iterator, Optional
+import urllib.request
+import urllib.error
 from station_config_check.nagios import nagios_api
+from station_config_check.nagios.inventory_cache import InventoryCache
 from station_config_check.nagios.nagios_api import NagiosHost
 
 
 def get_fortimus_list(
     nagios_ip: str,
-    api_key: str
-) -> List[nagios_api.NagiosHost]:
+    api_key: str,
+    inventory_cache: Optional[InventoryCache] = None
+) -> Iterable[nagios_api.NagiosHost]:
     '''
-    Get a list of all members of the Fortimus hostgroup from nagios
+    Get all members of the Fortimus hostgroup from nagios
 
     Parameters
     ----------
@@ -20,26 +23,31 @@ def get_fortimus_list(
     api_key: str
         The api key used to retrieve the information from Nagios
 
+    inventory_cache: InventoryCache
+        Cache to take the hostgroup members from instead of querying each of
+        them from Nagios. Only their current state is refreshed.
+
     Returns
     -------
-    List: A list of NagiosHost objects containing hostnames, ip addresses, etc
+    Iterable: NagiosHost objects containing hostnames, ip addresses, etc.
+    Without a cache, hosts are queried from Nagios as they are iterated over.
     '''
-    fortimus_list = nagios_api.fetch_hostgroup_members(
-        hostgroup_name='digitizer-fortimus',
-        nagios_ip=nagios_ip,
-        api_key=api_key
-    )
-
-    host_list: List[nagios_api.NagiosHost] = []
-
-    for fortimus in fortimus_list:
-        nagioshost = nagios_api.fetch_host_information(
-            host_name=fortimus,
+    def fetch() -> Iterator[nagios_api.NagiosHost]:
+        return nagios_api.iter_hostgroup_hosts(
+            hostgroup_name='digitizer-fortimus',
             nagios_ip=nagios_ip,
             api_key=api_key
         )
-        host_list.append(nagioshost)
-    return host_list
+
+    if inventory_cache is None:
+        return fetch()
+
+    return inventory_cache.get_hosts(
+        hostgroup_name='digitizer-fortimus',
+        nagios_ip=nagios_ip,
+        api_key=api_key,
+        fetch=fetch
+    )
 
 
 def get_running_config(
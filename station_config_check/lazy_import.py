@@ -0,0 +1,48 @@
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+
+
+class _LazyModule(ModuleType):
+    '''
+    Stand-in for a module, importing it when one of its attributes is first
+    used
+
+    The import system locks a module while it loads, so threads first using
+    the module at the same time all wait for the one import rather than
+    seeing a module still being loaded, as with importlib's LazyLoader
+    before Python 3.12.
+    '''
+    def __getattr__(self, attr: str):
+        module = self.__dict__.get('_module')
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_module'] = module
+        return getattr(module, attr)
+
+
+def lazy_import(
+    name: str
+) -> ModuleType:
+    '''
+    Import a module only once one of its attributes is used, so modules
+    needed by a single stage of a run do not slow down the start of every
+    run. The module may first be used by several threads at once.
+
+    Parameters
+    ----------
+    name: str
+        The full name of the module
+
+    Returns
+    -------
+    ModuleType: The module, loaded on first use
+    '''
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+    return _LazyModule(name)
@@ -2,9 +2,17 @@
 ..  codeauthor:: Charles Blais <charles.blais@canada.ca>
 """
 import copy
-from typing import Optional, Union, Dict
+import functools
+from typing import TYPE_CHECKING, Optional, Union, Dict
 
-import requests
+from station_config_check.lazy_import import lazy_import
+from station_config_check.nagios.models import NagiosRange
+
+# Only loaded when the API is used
+if TYPE_CHECKING:
+    import requests
+else:
+    requests = lazy_import('requests')
 
 # Constants
 STATE_OK = 0
@@ -13,50 +21,16 @@ STATE_CRITICAL = 2
 STATE_UNKNOWN = 3
 
 
-def _range_check(
-    dataval: float,
-    threshold: Union[float, str]
-) -> bool:
+@functools.lru_cache(maxsize=256)
+def _compile_range(
+    threshold: str
+) -> NagiosRange:
     """
-    Compare average to critical/warning based on a given warning/critical
-    integer value or string value (typically includes a colon to
-    represent >= and <=)
+    Parse a threshold once, however many values it is checked against
 
-    Threshold can be:
-    - float
-    - float:float (min to max)
-    - float: (min)
-    - :float (max)
-
-    :raises ValueError: Invalid NRDP range check
+    :raises ValueError: Invalid range
     """
-    # Check if the threshold is numeric then use threshold comparison
-    if isinstance(threshold, float):
-        return dataval > float(threshold)
-
-    try:
-        # its a string so lets try to convert it
-        return dataval > float(threshold)
-    except ValueError:
-        values = threshold.strip().split(':')
-        # Check that the split resulted in 2 values
-        if len(values) != 2:
-            raise ValueError(f'Invalid threshold {threshold}')
-        # Values[0] doesn't exist so compare if > critical threshold
-        if len(values[0]) and not len(values[1]):
-            if dataval > float(values[0]):
-                return True
-        # Values[1] doesn't exist so compare if < critical threshold
-        elif len(values[1]) and not len(values[0]):
-            if dataval < float(values[1]):
-                return True
-        # Otherwise is a range so check between min and max critical thresholds
-        else:
-            minthreshold = float(values[0])
-            maxthreshold = float(values[1])
-            if dataval >= minthreshold and dataval < maxthreshold:
-                return True
-    return False
+    return NagiosRange(threshold)
 
 
 def range_check(
@@ -68,20 +42,19 @@ def range_check(
 
     http://nagios-plugins.org/doc/guidelines.html#THRESHOLDFORMAT
 
-    We check if values fall within/outside a range.
+    We check if values fall within/outside a range. A threshold starting
+    with @ alerts when the value is inside the range instead.
 
-    The following is a wrapper funciton for _nrpe_range_check but
-    handles the option of @ by reverting the response returned.
+    Threshold can be:
+    - float (alert if < 0 or > float)
+    - float: (alert if < float)
+    - ~:float (alert if > float)
+    - float:float (alert if outside min to max)
 
-    :return: True
+    :return: True if the value alerts
+    :raises ValueError: Invalid range
     """
-    reverse_logic = False
-    if isinstance(threshold, str):
-        if threshold.startswith('@'):
-            reverse_logic = True
-            threshold = threshold[1:]
-    status = _range_check(dataval, threshold)
-    return not status if reverse_logic else status
+    return _compile_range(str(threshold)).in_range(dataval)
 
 
 class NagiosError(Exception):
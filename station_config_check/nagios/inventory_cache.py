@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+from dataclasses import asdict, replace
+from typing import Callable, Dict, Iterable, List, Optional
+from station_config_check.nagios import nagios_api
+from station_config_check.nagios.nagios_api import NagiosHost
+
+
+class InventoryCache:
+    def __init__(
+        self,
+        cache_dir: str,
+        ttl: float = 86400
+    ):
+        '''
+        Keep the members of Nagios hostgroups on disk so they do not have to
+        be fetched from Nagios XI on every run
+
+        Parameters
+        ----------
+        cache_dir: str
+            The directory the inventory of each hostgroup is stored in
+
+        ttl: float
+            Age in seconds after which a cached inventory is refreshed from
+            Nagios. A stale inventory is still used for the current run while
+            it is being refreshed.
+        '''
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._refreshes: Dict[str, threading.Thread] = {}
+
+    def _path(
+        self,
+        hostgroup_name: str
+    ) -> pathlib.Path:
+        return pathlib.Path(f'{self.cache_dir}/{hostgroup_name}.json')
+
+    def read(
+        self,
+        hostgroup_name: str
+    ) -> Optional[dict]:
+        '''
+        Read the cached inventory of a hostgroup
+
+        Returns
+        -------
+        dict: The time the inventory was fetched at and its hosts, or None if
+        there is no usable cached inventory
+        '''
+        path = self._path(hostgroup_name)
+        if not path.exists():
+            return None
+        try:
+            with open(path, mode='r') as f:
+                cached = json.load(f)
+            hosts = [NagiosHost(**host) for host in cached['hosts']]
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning(f'Ignoring corrupt inventory cache {path}: {e}')
+            return None
+        try:
+            fetched_at = float(cached['fetched_at'])
+        except (ValueError, KeyError, TypeError) as e:
+            # The hosts remain usable while the inventory is refreshed
+            logging.warning(
+                f'Unknown age of inventory cache {path}, treating it as ' +
+                f'stale: {e}')
+            fetched_at = 0
+        return {'fetched_at': fetched_at, 'hosts': hosts}
+
+    def write(
+        self,
+        hostgroup_name: str,
+        hosts: List[NagiosHost]
+    ):
+        '''
+        Store the inventory of a hostgroup, replacing the previous one
+        atomically so concurrent runs never read a partial file
+        '''
+        path = self._path(hostgroup_name)
+        if not path.parent.exists():
+            os.makedirs(str(path.parent))
+
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, mode='w') as f:
+            json.dump({
+                'fetched_at': time.time(),
+                'hosts': [asdict(host) for host in hosts]
+            }, f)
+        os.replace(tmp_path, path)
+
+    def get_hosts(
+        self,
+        hostgroup_name: str,
+        nagios_ip: str,
+        api_key: str,
+        fetch: Callable[[], Iterable[NagiosHost]]
+    ) -> List[NagiosHost]:
+        '''
+        Get the members of a hostgroup, using the cached inventory when there
+        is one and only refreshing the current state of the hosts
+
+        Parameters
+        ----------
+        hostgroup_name: str
+            The hostgroup to get the members of
+
+        nagios_ip: str
+            The IP address or hostname of the Nagios XI server
+
+        api_key: str
+            The api_key to be used to access the nagios API
+
+        fetch: Callable
+            Function fetching the full inventory of the hostgroup from Nagios
+
+        Returns
+        -------
+        List: A list of NagiosHost objects containing hostnames, ip addresses,
+        etc
+        '''
+        cached = self.read(hostgroup_name)
+
+        if cached is None:
+            logging.debug(f'No cached inventory for {hostgroup_name}')
+            hosts = list(fetch())
+            self.write(hostgroup_name, hosts)
+            return hosts
+
+        refreshing = hostgroup_name in self._refreshes and \
+            self._refreshes[hostgroup_name].is_alive()
+        if time.time() - cached['fetched_at'] >= self.ttl and not refreshing:
+            logging.debug(f'Refreshing stale inventory for {hostgroup_name}')
+            refresh = threading.Thread(
+                target=self._refresh, args=(hostgroup_name, fetch))
+            refresh.start()
+            self._refreshes[hostgroup_name] = refresh
+
+        hosts = cached['hosts']
+        try:
+            states = nagios_api.fetch_host_states(
+                host_names=[host.hostname for host in hosts],
+                nagios_ip=nagios_ip,
+                api_key=api_key
+            )
+        except Exception as e:
+            # Poll devices using the last known states rather than not at all
+            logging.warning(
+                f'Could not refresh host states for {hostgroup_name}: {e}')
+            return hosts
+
+        return [
+            replace(host, status=states.get(host.hostname, host.status))
+            for host in hosts]
+
+    def _refresh(
+        self,
+        hostgroup_name: str,
+        fetch: Callable[[], Iterable[NagiosHost]]
+    ):
+        '''
+        Fetch the inventory of a hostgroup and store it, keeping the previous
+        inventory if Nagios cannot be reached
+        '''
+        try:
+            hosts = list(fetch())
+        except Exception as e:
+            logging.warning(
+                f'Could not refresh inventory for {hostgroup_name}: {e}')
+            return
+        self.write(hostgroup_name, hosts)
+
+    def wait(self):
+        '''
+        Wait for inventories being refreshed in the background to be stored
+        '''
+        for refresh in self._refreshes.values():
+            refresh.join()
+        self._refreshes.clear()
@@ -7,7 +7,7 @@ https://nagios-plugins.org/doc/guidelines.html
 '''
 from dataclasses import dataclass, field
 
-from typing import Optional, List
+from typing import Optional, List, Union
 
 from enum import IntEnum
 
@@ -29,13 +29,14 @@ class NagiosOutputCode(IntEnum):
 @dataclass
 class NagiosRange:
     range: str
+    # Bounds outside of which a value alerts, parsed once from the range
+    start: float = field(init=False, repr=False, compare=False)
+    end: float = field(init=False, repr=False, compare=False)
+    inside: bool = field(init=False, repr=False, compare=False)
 
-    def in_range(self, value: float) -> bool:
+    def __post_init__(self):
         '''
-        Determine if the value is in range.
-
-        :param float value: value to check
-        :rtype: bool
+        Parse the range
 
         :raises ValueError: range format invalid
         '''
@@ -43,24 +44,63 @@ class NagiosRange:
         if len(parts) > 2:
             raise ValueError(f'range format invalid: {self.range}')
 
-        reverse = False
+        self.inside = False
         if parts[0].startswith('@'):
-            reverse = True
+            self.inside = True
             parts[0] = parts[0][1:]
 
-        cond = False
         if len(parts) == 1:
             if parts[0] == '~':
                 raise ValueError(f'range format invalid: {self.range}')
-            cond = value < 0 or value > float(parts[0])
+            self.start, self.end = 0, float(parts[0])
         else:
-            if parts[0] == '~':
-                cond = value > float(parts[1])
-            elif len(parts[1]) == 0:
-                cond = value < float(parts[0])
-            else:
-                cond = value < float(parts[0]) or value > float(parts[1])
-        return not cond if reverse else cond
+            self.start = float('-inf') if parts[0] == '~' \
+                else float(parts[0])
+            self.end = float('inf') if len(parts[1]) == 0 \
+                else float(parts[1])
+
+    def in_range(self, value: float) -> bool:
+        '''
+        Determine if the value is in range.
+
+        :param float value: value to check
+        :rtype: bool
+        '''
+        cond = value < self.start or value > self.end
+        return not cond if self.inside else cond
+
+
+@dataclass
+class NagiosThreshold:
+    '''
+    Warning and critical ranges of a value, compiled once and evaluated for
+    as many values as needed
+    '''
+    warning: Optional[NagiosRange] = None
+    critical: Optional[NagiosRange] = None
+
+    def evaluate(self, value: float) -> NagiosOutputCode:
+        '''
+        Determine the state of a value, critical taking precedence
+
+        :param float value: value to check
+        :rtype: NagiosOutputCode
+        '''
+        if self.critical is not None and self.critical.in_range(value):
+            return NagiosOutputCode.critical
+        if self.warning is not None and self.warning.in_range(value):
+            return NagiosOutputCode.warning
+        return NagiosOutputCode.ok
+
+
+def _format_threshold(
+    threshold: Optional[Union[float, NagiosRange]]
+) -> str:
+    if threshold is None:
+        return ''
+    if isinstance(threshold, NagiosRange):
+        return threshold.range
+    return "%.5f" % threshold
 
 
 @dataclass
@@ -68,8 +108,8 @@ class NagiosPerformance:
     label: str
     value: float
     uom: str = ''
-    warning: Optional[float] = None
-    critical: Optional[float] = None
+    warning: Optional[Union[float, NagiosRange]] = None
+    critical: Optional[Union[float, NagiosRange]] = None
     minimum: Optional[float] = None
     maximum: Optional[float] = None
 
@@ -83,8 +123,8 @@ class NagiosPerformance:
 
         :rtype: str
         '''
-        warning = '' if self.warning is None else "%.5f" % self.warning
-        critical = '' if self.critical is None else "%.5f" % self.critical
+        warning = _format_threshold(self.warning)
+        critical = _format_threshold(self.critical)
         minimum = '' if self.minimum is None else "%.5f" % self.minimum
         maximum = '' if self.maximum is None else "%.5f" % self.maximum
 
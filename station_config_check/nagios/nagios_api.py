@@ -1,7 +1,14 @@
-from typing import List
-import requests
-from requests import HTTPError
+import logging
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
 from dataclasses import dataclass
+from station_config_check.lazy_import import lazy_import
+from station_config_check.nagios import NagiosQuery
+
+# Only loaded once Nagios is queried
+if TYPE_CHECKING:
+    import requests
+else:
+    requests = lazy_import('requests')
 
 
 @dataclass
@@ -10,13 +17,15 @@ class NagiosHost():
     ip_address: str
     install_type: str
     status: int
+    link_class: str = 'default'
 
 
 def get_object_query(
     nagios_ip: str,
     object_query: str,
-    api_key: str
-) -> requests.Response:
+    api_key: str,
+    timeout: Optional[float] = None
+) -> 'requests.Response':
     '''
     Query Nagios XI to get information about an object or many objects
 
@@ -36,6 +45,10 @@ def get_object_query(
         The api_key to be used to access the nagios API. Can be found in a
         Nagios User's profile
 
+    timeout: float
+        Time in seconds to wait for Nagios XI to answer. Waits indefinitely by
+        default.
+
     Returns
     -------
     Response: The http GET response resulting from the query
@@ -45,8 +58,8 @@ def get_object_query(
     HTTPError: If the GET request fails in any way
     '''
     query = (f"http://{nagios_ip}/nagiosxi/api/v1/objects/{object_query}" +
-             f"&apikey={api_key}&pretty=1")
-    query_response = requests.get(query)
+             f"&apikey={api_key}")
+    query_response = requests.get(query, timeout=timeout)
     query_response.raise_for_status()
 
     return query_response
@@ -91,7 +104,7 @@ def fetch_hostgroup_members(
             nagios_ip=nagios_ip,
             api_key=api_key,
             object_query=f"hostgroupmembers?hostgroup_name={hostgroup_name}")
-    except HTTPError as e:
+    except requests.HTTPError as e:
         raise e
 
     try:
@@ -138,7 +151,7 @@ def fetch_host_information(
     Returns
     -------
     NagiosHost: Contains nagios hostname, IP address, current state, and
-    install_type property for the requested host
+    install_type and link_class properties for the requested host
 
     Raises
     ------
@@ -150,7 +163,9 @@ def fetch_host_information(
     keys
     '''
 
-    # A seperate query is needed to get the INSTALL_TYPE custom variable
+    link_class = 'default'
+    # A seperate query is needed to get the INSTALL_TYPE and LINK_CLASS custom
+    # variables
     if get_type is True:
         try:
             query_response = get_object_query(
@@ -158,7 +173,7 @@ def fetch_host_information(
                 api_key=api_key,
                 # Customvars=1 allows this query to return the custom variable
                 object_query=f"host?host_name={host_name}&customvars=1")
-        except HTTPError as e:
+        except requests.HTTPError as e:
             raise e
 
         try:
@@ -170,6 +185,8 @@ def fetch_host_information(
                 response_json['host'][0]['customvars']['INSTALL_TYPE']
         else:
             install_type = 'default'
+        if 'LINK_CLASS' in response_json['host'][0]['customvars']:
+            link_class = response_json['host'][0]['customvars']['LINK_CLASS']
     else:
         install_type = 'default'
     try:
@@ -177,7 +194,7 @@ def fetch_host_information(
             nagios_ip=nagios_ip,
             api_key=api_key,
             object_query=f"hoststatus?host_name={host_name}")
-    except HTTPError as e:
+    except requests.HTTPError as e:
         raise e
     response_json = query_response.json()
     host_ip = response_json['hoststatus'][0]['address']
@@ -186,4 +203,217 @@ def fetch_host_information(
         hostname=host_name,
         ip_address=host_ip,
         install_type=install_type,
-        status=status)
+        status=status,
+        link_class=link_class)
+
+
+def iter_object_query(
+    nagios_ip: str,
+    object_type: str,
+    api_key: str,
+    query: Optional[NagiosQuery] = None,
+    page_size: int = 500,
+    timeout: Optional[float] = 30
+) -> Iterator[dict]:
+    '''
+    Query objects from Nagios XI one page of records at a time, so the
+    first objects can be used while the next pages are still being queried
+    and only a page is held in memory
+
+    Parameters
+    ----------
+    nagios_ip: str
+        The IP address or hostname of the Nagios XI server
+
+    object_type: str
+        The type of objects to query, for example host or hoststatus
+
+    api_key: str
+        The api_key to be used to access the nagios API. Can be found in a
+        Nagios User's profile
+
+    query: NagiosQuery
+        Columns and ordering of the query. Its records are set for each page.
+
+    page_size: int
+        The number of records queried per request
+
+    timeout: float
+        Time in seconds to wait for Nagios XI to answer each request
+
+    Returns
+    -------
+    Iterator: The records of the objects, as returned by Nagios XI
+
+    Raises
+    ------
+    HTTPError: If a GET request fails for any reason
+
+    ValueError: If a response isn't a valid json format
+    '''
+    query = NagiosQuery() if query is None else NagiosQuery(query)
+    url = f"http://{nagios_ip}/nagiosxi/api/v1/objects/{object_type}"
+
+    offset = 0
+    while True:
+        query.set_records(page_size, offset)
+        params = query.to_query_dict()
+        params['apikey'] = api_key
+        query_response = requests.get(url, params=params, timeout=timeout)
+        query_response.raise_for_status()
+
+        records = query_response.json().get(object_type, [])
+        yield from records
+
+        if len(records) < page_size:
+            return
+        offset += page_size
+
+
+def iter_hostgroup_hosts(
+    hostgroup_name: str,
+    nagios_ip: str,
+    api_key: str,
+    get_type: bool = False,
+    page_size: int = 100
+) -> Iterator[NagiosHost]:
+    '''
+    Get information about the members of a hostgroup a page at a time, so
+    the first hosts can be used while the others are still being queried
+
+    The names of the members are fetched in a single unpaged request, as
+    the hostgroupmembers query only pages hostgroups, not their members.
+    Only the status and custom variables of the hosts are queried by page.
+
+    Parameters
+    ----------
+    hostgroup_name: str
+        The hostgroup to get the members of
+
+    nagios_ip: str
+        The IP address or hostname of the Nagios XI server
+
+    api_key: str
+        The api_key to be used to access the nagios API. Can be found in a
+        Nagios User's profile
+
+    get_type: bool
+        Whether to also query the custom variables of each host
+
+    page_size: int
+        The number of hosts queried at once
+
+    Returns
+    -------
+    Iterator: NagiosHost objects for the members of the hostgroup, in the
+    order of the hostgroup. Members unknown to Nagios are left out.
+
+    Raises
+    ------
+    HTTPError: If a GET request fails for any reason
+    '''
+    host_names = fetch_hostgroup_members(
+        hostgroup_name=hostgroup_name,
+        nagios_ip=nagios_ip,
+        api_key=api_key
+    )
+
+    for index in range(0, len(host_names), page_size):
+        page = host_names[index:index + page_size]
+        query = NagiosQuery()
+        query.columns = {'host_name': f"in:{','.join(page)}"}
+        # Asking for more records than hosts returns the whole page in a
+        # single request
+        records = len(page) + 1
+
+        statuses = {
+            hoststatus['host_name']: hoststatus
+            for hoststatus in iter_object_query(
+                nagios_ip=nagios_ip,
+                object_type='hoststatus',
+                api_key=api_key,
+                query=query,
+                page_size=records)
+        }
+
+        customvars: Dict[str, dict] = {}
+        if get_type is True:
+            # Customvars=1 allows this query to return the custom variables
+            query['customvars'] = 1
+            customvars = {
+                host['host_name']: host.get('customvars', {})
+                for host in iter_object_query(
+                    nagios_ip=nagios_ip,
+                    object_type='host',
+                    api_key=api_key,
+                    query=query,
+                    page_size=records)
+            }
+
+        for host_name in page:
+            if host_name not in statuses:
+                logging.warning(f'No status for {host_name} in Nagios')
+                continue
+            variables = customvars.get(host_name, {})
+            yield NagiosHost(
+                hostname=host_name,
+                ip_address=statuses[host_name]['address'],
+                install_type=variables.get('INSTALL_TYPE', 'default'),
+                status=int(statuses[host_name]['current_state']),
+                link_class=variables.get('LINK_CLASS', 'default'))
+
+
+def fetch_host_states(
+    host_names: List[str],
+    nagios_ip: str,
+    api_key: str,
+    chunk_size: int = 100,
+    timeout: Optional[float] = 30
+) -> Dict[str, int]:
+    '''
+    Get the current state of many hosts from Nagios XI, querying them in
+    chunks rather than one at a time
+
+    Parameters
+    ----------
+    host_names: List
+        The names associated with the hosts in Nagios
+
+    nagios_ip: str
+        The IP address or hostname of the Nagios XI server
+
+    api_key: str
+        The api_key to be used to access the nagios API. Can be found in a
+        Nagios User's profile
+
+    chunk_size: int
+        The number of hosts to query per request
+
+    timeout: float
+        Time in seconds to wait for Nagios XI to answer each request
+
+    Returns
+    -------
+    Dict: Current state of each host keyed by host name. Hosts unknown to
+    Nagios are left out.
+
+    Raises
+    ------
+    HTTPError: If the GET request fails for any reason
+
+    ValueError: If the response from the get request isn't a valid json format
+    '''
+    states: Dict[str, int] = {}
+
+    for index in range(0, len(host_names), chunk_size):
+        chunk = host_names[index:index + chunk_size]
+        query_response = get_object_query(
+            nagios_ip=nagios_ip,
+            api_key=api_key,
+            object_query=f"hoststatus?host_name=in:{','.join(chunk)}",
+            timeout=timeout)
+        response_json = query_response.json()
+        for hoststatus in response_json.get('hoststatus', []):
+            states[hoststatus['host_name']] = int(hoststatus['current_state'])
+
+    return states
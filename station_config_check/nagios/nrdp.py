@@ -13,23 +13,99 @@ Use nrdp to query fdsn and get trace data into Nagios
 Author: Gloria Son 2017-11-24
 """
 
-import xml.etree.ElementTree as ET
-import requests
+from typing import TYPE_CHECKING, Any, Iterator, Tuple
 import logging
+from station_config_check.lazy_import import lazy_import
 
+# Only loaded once the results are submitted
+if TYPE_CHECKING:
+    import xml.etree.ElementTree as ET
+    import requests
+else:
+    ET = lazy_import('xml.etree.ElementTree')
+    requests = lazy_import('requests')
 
-class NagiosCheckResult(dict):
+
+class NRDPUnavailable(Exception):
+    """
+    NRDP could not be reached or failed to process the results, which may
+    succeed when tried again later
+    """
+    pass
+
+
+class NagiosCheckResult:
     """
-    Dictionary with keys hostname, servicename, state, output
+    Check result with keys hostname, servicename, state, output
 
     If the servicename is not set, it is assume to be a host check
+
+    The output may be any object, for example a NagiosResult, and is only
+    converted to text when it is read, so the structured data is kept until
+    the results are serialised. Keys can be read and set like a dictionary.
     """
-    def __init__(self, *args, **kwargs):
-        super(NagiosCheckResult, self).__init__(*args, **kwargs)
-        self.setdefault('hostname', '')
-        self.setdefault('servicename', '')
-        self.setdefault('state', 3)  # unknown
-        self.setdefault('output', '')
+    __slots__ = ('hostname', 'servicename', 'state', '_output')
+
+    _keys = ('hostname', 'servicename', 'state', 'output')
+
+    def __init__(
+        self,
+        hostname: str = '',
+        servicename: str = '',
+        state: int = 3,  # unknown
+        output: Any = ''
+    ):
+        self.hostname = hostname
+        self.servicename = servicename
+        self.state = state
+        self._output = output
+
+    @property
+    def output(self) -> str:
+        if isinstance(self._output, str):
+            return self._output
+        return str(self._output)
+
+    @output.setter
+    def output(self, value: Any):
+        self._output = value
+
+    @property
+    def raw_output(self) -> Any:
+        """
+        The output as it was given, before being converted to text
+        """
+        return self._output
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in self._keys:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._keys
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self._keys else default
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (NagiosCheckResult, dict)):
+            return all(self[key] == other.get(key) for key in self._keys)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
 
 
 class NagiosCheckResults(list):
@@ -44,7 +120,8 @@ class NagiosCheckResults(list):
         """
         xml = ET.Element('checkresults')
         for result in self:
-            logging.debug(f"Trying: {result}")
+            # Formatting the result is left to logging as it renders output
+            logging.debug("Trying: %s", result)
             # define if the type of check result is host or service
             new = ET.SubElement(
                 xml,
@@ -70,16 +147,28 @@ def submit(
     :type nrdp: :class:`NagiosCheckResults`
     :param str nagios: nagios URL
     :param str token: nagios access token
+
+    :raises NRDPUnavailable: nagios could not be reached or answered with a
+        server error
+    :raises HTTPError: nagios rejected the results
     """
     data = {
         'token': token,
         'cmd': 'submitcheck',
         'XMLDATA': nrdp.to_xml()
     }
+    # An unresponsive server must not hang the run
+    kwargs.setdefault('timeout', 60)
 
-    request = requests.post(
-        f"{nagios}/nrdp/",
-        data=data, **kwargs)
+    try:
+        request = requests.post(
+            f"{nagios}/nrdp/",
+            data=data, **kwargs)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        raise NRDPUnavailable(f'Could not reach {nagios}: {e}') from e
 
     logging.debug(request.status_code)
+    if request.status_code >= 500:
+        raise NRDPUnavailable(
+            f'{nagios} answered with status {request.status_code}')
     request.raise_for_status()
@@ -0,0 +1,300 @@
+import json
+import logging
+import os
+import random
+import string
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional, Tuple, Type
+from station_config_check.nagios.nrdp import NagiosCheckResult, \
+    NagiosCheckResults, NRDPUnavailable, submit
+
+
+class InvalidBackend(Exception):
+    pass
+
+
+def _escape_output(
+    output: str
+) -> str:
+    '''
+    Escape the newlines of a plugin output, which Nagios reads back from
+    passive check results
+    '''
+    return output.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+class SubmissionBackend(ABC):
+    '''
+    Way of handing check results over to Nagios
+
+    retry_errors are the exceptions raised by submit when the results may be
+    accepted if submitted again later.
+    '''
+    retry_errors: Tuple[Type[Exception], ...] = (OSError,)
+
+    @abstractmethod
+    def submit(
+        self,
+        checkresults: NagiosCheckResults
+    ):
+        pass
+
+    def close(self):
+        pass
+
+
+class NRDPBackend(SubmissionBackend):
+    retry_errors = (NRDPUnavailable,)
+
+    def __init__(
+        self,
+        nagios: str,
+        token: str
+    ):
+        '''
+        Submit results to the NRDP API of a Nagios server over HTTP
+
+        Parameters
+        ----------
+        nagios: str
+            The URL of the Nagios server
+
+        token: str
+            The NRDP access token
+        '''
+        self.nagios = nagios
+        self.token = token
+
+    def submit(
+        self,
+        checkresults: NagiosCheckResults
+    ):
+        submit(nrdp=checkresults, nagios=self.nagios, token=self.token)
+
+
+class CommandFileBackend(SubmissionBackend):
+    def __init__(
+        self,
+        path: str
+    ):
+        '''
+        Write results as passive check commands to the external command file
+        of a Nagios server running on the same machine
+
+        Each command is written in a single write. Writes to a pipe are
+        only atomic up to PIPE_BUF bytes (4096 on Linux), so a longer
+        command may be interleaved with the commands of other writers.
+
+        Parameters
+        ----------
+        path: str
+            The external command file, usually a named pipe such as
+            /usr/local/nagios/var/rw/nagios.cmd
+        '''
+        self.path = path
+
+    def submit(
+        self,
+        checkresults: NagiosCheckResults
+    ):
+        '''
+        Raises
+        ------
+        OSError: If Nagios is not reading the command file
+        '''
+        now = int(time.time())
+        # Opening a pipe without a reader fails instead of blocking
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_NONBLOCK)
+        try:
+            os.set_blocking(fd, True)
+            for result in checkresults:
+                if result.servicename:
+                    command = (
+                        f'[{now}] PROCESS_SERVICE_CHECK_RESULT;' +
+                        f'{result.hostname};{result.servicename};')
+                else:
+                    command = (
+                        f'[{now}] PROCESS_HOST_CHECK_RESULT;' +
+                        f'{result.hostname};')
+                command += \
+                    f'{result.state};{_escape_output(result.output)}\n'
+                os.write(fd, command.encode())
+        finally:
+            os.close(fd)
+
+
+class CheckResultsDirBackend(SubmissionBackend):
+    def __init__(
+        self,
+        path: str
+    ):
+        '''
+        Write results to the check result directory Nagios reaps, as a file
+        per batch, with none of the HTTP and XML processing of NRDP
+
+        Parameters
+        ----------
+        path: str
+            The check_result_path of the Nagios server, such as
+            /usr/local/nagios/var/spool/checkresults
+        '''
+        self.path = path
+
+    def _create(self) -> Tuple[str, int]:
+        '''
+        Create a new check result file. Nagios only reaps files named by a c
+        followed by 6 characters.
+        '''
+        while True:
+            name = 'c' + ''.join(random.choices(
+                string.ascii_letters + string.digits, k=6))
+            path = os.path.join(self.path, name)
+            try:
+                return path, os.open(
+                    path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                continue
+
+    def submit(
+        self,
+        checkresults: NagiosCheckResults
+    ):
+        now = time.time()
+        lines = [
+            '### Passive Check Result File ###',
+            f'file_time={int(now)}',
+            ''
+        ]
+        for result in checkresults:
+            lines.append(f'host_name={result.hostname}')
+            if result.servicename:
+                lines.append(f'service_description={result.servicename}')
+            lines.extend([
+                'check_type=1',
+                'check_options=0',
+                'scheduled_check=0',
+                'reschedule_check=0',
+                'latency=0',
+                f'start_time={now:.6f}',
+                f'finish_time={now:.6f}',
+                'early_timeout=0',
+                'exited_ok=1',
+                f'return_code={result.state}',
+                f'output={_escape_output(result.output)}',
+                ''
+            ])
+
+        path, fd = self._create()
+        try:
+            with os.fdopen(fd, mode='w') as f:
+                f.write('\n'.join(lines))
+        except BaseException:
+            os.remove(path)
+            raise
+        # Nagios only reads the file once the ok file exists
+        with open(f'{path}.ok', mode='w'):
+            pass
+        logging.debug(f'{len(checkresults)} results written to {path}')
+
+
+class JSONLinesBackend(SubmissionBackend):
+    def __init__(
+        self,
+        path: str
+    ):
+        '''
+        Append results to a file, a JSON object per line, to check what a run
+        would submit without a Nagios server
+
+        Parameters
+        ----------
+        path: str
+            The file results are appended to
+        '''
+        self.path = path
+        self._file = open(path, mode='a')
+
+    def submit(
+        self,
+        checkresults: NagiosCheckResults
+    ):
+        now = time.time()
+        for result in checkresults:
+            record = dict(result)
+            record['time'] = now
+            self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# Backends writing results to a file or directory, by the name of their
+# target
+PATH_BACKENDS: Dict[str, Callable[[str], SubmissionBackend]] = {
+    'command-file': CommandFileBackend,
+    'checkresults': CheckResultsDirBackend,
+    'jsonl': JSONLinesBackend,
+}
+
+# Names of the backends results can be submitted with
+SUBMISSION_BACKENDS = ['nrdp'] + list(PATH_BACKENDS)
+
+
+def open_backend(
+    name: str,
+    path: Optional[str] = None,
+    nagios: Optional[str] = None,
+    token: Optional[str] = None
+) -> SubmissionBackend:
+    '''
+    Create a submission backend from its name
+
+    Parameters
+    ----------
+    name: str
+        The name of the backend, one of SUBMISSION_BACKENDS
+
+    path: str
+        The file or directory results are written to, for every backend but
+        nrdp
+
+    nagios: str
+        The URL of the Nagios server, for the nrdp backend
+
+    token: str
+        The NRDP access token, for the nrdp backend
+
+    Raises
+    ------
+    InvalidBackend: If the backend is unknown or missing a parameter
+    '''
+    if name not in SUBMISSION_BACKENDS:
+        raise InvalidBackend(f'Unknown submission backend {name}')
+    if name == 'nrdp':
+        if nagios is None or token is None:
+            raise InvalidBackend('The nrdp backend needs a server and token')
+        return NRDPBackend(nagios=nagios, token=token)
+    if path is None:
+        raise InvalidBackend(f'The {name} backend needs a path')
+    return PATH_BACKENDS[name](path)
+
+
+def read_results(
+    path: str
+) -> NagiosCheckResults:
+    '''
+    Read the results written by JSONLinesBackend
+    '''
+    checkresults = NagiosCheckResults()
+    with open(path, mode='r') as f:
+        for line in f:
+            record = json.loads(line)
+            checkresults.append(NagiosCheckResult(
+                hostname=record['hostname'],
+                servicename=record['servicename'],
+                state=record['state'],
+                output=record['output']
+            ))
+    return checkresults
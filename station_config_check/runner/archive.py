@@ -0,0 +1,281 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterator, Optional, Tuple, cast
+from station_config_check.config_check.diff_pool import DiffPool
+from station_config_check.config_check.golden_image import GoldenImageStore
+from station_config_check.config_check.thresholds import \
+    SimilarityThresholds
+from station_config_check.nagios.models import NagiosOutputCode
+from station_config_check.nagios.nagios_api import NagiosHost
+from station_config_check.nagios.nrdp import NagiosCheckResult, \
+    NagiosCheckResults
+from station_config_check.runner.pipeline import run_sweep
+from station_config_check.runner.scheduler import DEFAULT_LINK_CLASS, \
+    LinkClass, LinkScheduler
+
+
+class SweepRecorder:
+    def __init__(
+        self,
+        record_dir: str,
+        device_type: str,
+        rotate_after: Optional[float] = None
+    ):
+        '''
+        Record the running configs downloaded during a sweep, along with the
+        hosts they were downloaded from, so the sweep can be replayed without
+        polling the devices again
+
+        The archive of each sweep is a gzip compressed file holding a JSON
+        record per line. Records are appended as configs are downloaded, so
+        the archive of an interrupted sweep is usable up to its last record.
+
+        Parameters
+        ----------
+        record_dir: str
+            The directory archives are written to
+
+        device_type: str
+            The type of devices swept, which prefixes the archive name
+
+        rotate_after: float
+            Time in seconds after which records go to a new archive, for
+            checks that run continuously rather than in a single sweep. By
+            default a single archive is written.
+        '''
+        if not os.path.exists(record_dir):
+            os.makedirs(record_dir)
+        self.record_dir = record_dir
+        self.device_type = device_type
+        self.rotate_after = rotate_after
+        # Configs are downloaded from several threads
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        '''
+        Start a new archive
+        '''
+        self.path = os.path.join(
+            self.record_dir,
+            f'{self.device_type}-{time.strftime("%Y%m%d-%H%M%S")}.jsonl.gz')
+        self._archive = gzip.open(self.path, mode='at')
+        self._opened = time.monotonic()
+        self.recorded = 0
+
+    def record(
+        self,
+        host: NagiosHost,
+        running_config: str
+    ):
+        '''
+        Append the running config of a host to the archive
+        '''
+        line = json.dumps({'host': asdict(host), 'config': running_config})
+        with self._lock:
+            if self.rotate_after is not None and \
+                    time.monotonic() - self._opened >= self.rotate_after:
+                self.close()
+                self._open()
+            self._archive.write(line + '\n')
+            self.recorded += 1
+
+    def record_fetch(
+        self,
+        fetch: Callable[[NagiosHost], str]
+    ) -> Callable[[NagiosHost], str]:
+        '''
+        Wrap a function downloading configs so every config it downloads is
+        recorded
+
+        Parameters
+        ----------
+        fetch: Callable
+            Function downloading the running config of a single host
+
+        Returns
+        -------
+        Callable: The wrapped function
+        '''
+        def recorded(host: NagiosHost) -> str:
+            running_config = fetch(host)
+            self.record(host, running_config)
+            return running_config
+
+        return recorded
+
+    def close(self):
+        self._archive.close()
+        logging.info(f'{self.recorded} configs recorded to {self.path}')
+
+
+@dataclass
+class _RecordedHost(NagiosHost):
+    '''
+    Host read from an archive, along with its recorded running config
+    '''
+    running_config: str = ''
+
+
+def read_archive(
+    path: str
+) -> Iterator[Tuple[NagiosHost, str]]:
+    '''
+    Read the records of a sweep archive
+
+    Parameters
+    ----------
+    path: str
+        The archive written by SweepRecorder
+
+    Returns
+    -------
+    Iterator: Tuples of each host and its running config, in the order they
+    were recorded
+    '''
+    with gzip.open(path, mode='rt') as archive:
+        try:
+            for line in archive:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last record of an interrupted sweep may be cut
+                    logging.warning(f'Ignoring truncated record in {path}')
+                    return
+                yield NagiosHost(**record['host']), record['config']
+        except EOFError:
+            logging.warning(f'Archive {path} ends abruptly')
+
+
+def replay_sweep(
+    path: str,
+    golden_images: GoldenImageStore,
+    diff_pool: DiffPool,
+    emit: Callable[[NagiosCheckResult], None],
+    queue_size: int = 64,
+    thresholds: Optional[SimilarityThresholds] = None
+):
+    '''
+    Check recorded running configs against their golden images as a sweep
+    would, without any network access. The golden images are only read:
+    hosts without golden image are reported rather than given one.
+
+    Parameters
+    ----------
+    path: str
+        The archive written by SweepRecorder
+
+    golden_images: GoldenImageStore
+        The golden images of the hosts
+
+    diff_pool: DiffPool
+        Pool comparing the running configs to the golden images
+
+    emit: Callable
+        Function receiving each check result
+
+    queue_size: int
+        The number of hosts allowed to wait in each stage
+
+    thresholds: SimilarityThresholds
+        The ranges of similarity config checks are warning or critical in,
+        by install type
+    '''
+    # Each host carries its recorded config, so configs are read from the
+    # archive only as the hosts are taken
+    def hosts() -> Iterator[NagiosHost]:
+        for host, running_config in read_archive(path):
+            yield _RecordedHost(**asdict(host), running_config=running_config)
+
+    def fetch(host: NagiosHost) -> str:
+        return cast(_RecordedHost, host).running_config
+
+    # Configs are taken from the archive as fast as they are compared,
+    # regardless of the link classes of the hosts
+    scheduler = LinkScheduler(link_classes={
+        DEFAULT_LINK_CLASS: LinkClass(name=DEFAULT_LINK_CLASS)})
+
+    run_sweep(
+        hosts=hosts(),
+        fetch=fetch,
+        golden_images=golden_images,
+        scheduler=scheduler,
+        diff_pool=diff_pool,
+        emit=emit,
+        fetch_errors=(),
+        queue_size=queue_size,
+        thresholds=thresholds,
+        save_missing=False
+    )
+
+
+def run_replay(
+    path: str,
+    golden_images: GoldenImageStore,
+    diff_pool: DiffPool,
+    output: Optional[str] = None,
+    queue_size: int = 64,
+    thresholds: Optional[SimilarityThresholds] = None
+) -> NagiosCheckResults:
+    '''
+    Replay a sweep archive and render the results as they would be
+    submitted to NRDP
+
+    Parameters
+    ----------
+    path: str
+        The archive written by SweepRecorder
+
+    golden_images: GoldenImageStore
+        The golden images of the hosts
+
+    diff_pool: DiffPool
+        Pool comparing the running configs to the golden images
+
+    output: str
+        File the NRDP XML of the results is written to. The XML is rendered
+        but not written if no file is given.
+
+    queue_size: int
+        The number of hosts allowed to wait in each stage
+
+    thresholds: SimilarityThresholds
+        The ranges of similarity config checks are warning or critical in,
+        by install type
+
+    Returns
+    -------
+    NagiosCheckResults: The results of the replayed sweep
+    '''
+    checkresults = NagiosCheckResults()
+    start = time.monotonic()
+    replay_sweep(
+        path=path,
+        golden_images=golden_images,
+        diff_pool=diff_pool,
+        emit=checkresults.append,
+        queue_size=queue_size,
+        thresholds=thresholds
+    )
+    xml = checkresults.to_xml()
+    elapsed = time.monotonic() - start
+
+    if output is not None:
+        with open(output, mode='wb') as f:
+            f.write(xml)
+
+    states: Dict[int, int] = {}
+    for result in checkresults:
+        states[result.state] = states.get(result.state, 0) + 1
+    logging.info(
+        f'{len(checkresults)} results replayed from {path} in ' +
+        f'{elapsed:.2f}s, ' + ', '.join(
+            f'{NagiosOutputCode(state).name}: {count}'
+            for state, count in sorted(states.items())))
+
+    return checkresults
@@ -0,0 +1,155 @@
+import fcntl
+import logging
+import os
+import socket
+import time
+from typing import Iterable, Iterator, Optional, Set
+from station_config_check.nagios.nagios_api import NagiosHost
+
+
+class RunLocked(Exception):
+    pass
+
+
+class RunLock:
+    def __init__(
+        self,
+        path: str
+    ):
+        '''
+        Lock file preventing two runs from checking the same devices at the
+        same time
+
+        The lock is an flock on a file that is never removed, so the system
+        releases it when the run holding it exits, however it exits, and
+        there is no stale lock to take over. The file holds the hostname and
+        pid of the last run that took the lock, for information.
+
+        Parameters
+        ----------
+        path: str
+            The lock file
+        '''
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def acquire(self):
+        '''
+        Take the lock
+
+        Raises
+        ------
+        RunLocked: If another run holds the lock
+        '''
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            owner = os.read(fd, 256).decode(errors='replace').strip()
+            os.close(fd)
+            raise RunLocked(f'{self.path} is held by {owner}')
+
+        os.ftruncate(fd, 0)
+        os.write(fd, f'{socket.gethostname()}:{os.getpid()}'.encode())
+        self._fd = fd
+
+    def release(self):
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def __enter__(self) -> 'RunLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class Checkpoint:
+    def __init__(
+        self,
+        path: str,
+        max_age: float = 86400
+    ):
+        '''
+        Journal of the hosts whose results were submitted during a sweep, so
+        a sweep that was interrupted resumes with the hosts that are left
+
+        Parameters
+        ----------
+        path: str
+            The journal file. It starts with the time the sweep started,
+            followed by a hostname per line.
+
+        max_age: float
+            Age in seconds after which the journal of an unfinished sweep is
+            discarded and a new sweep is started
+        '''
+        self.path = path
+        self.done: Set[str] = set()
+        started = self._read(max_age)
+        if started is None:
+            with open(self.path, mode='w') as f:
+                f.write(f'{time.time()}\n')
+        else:
+            logging.info(
+                f'Resuming sweep started at {time.ctime(started)}, ' +
+                f'{len(self.done)} hosts already checked')
+        self._journal = open(self.path, mode='a')
+
+    def _read(
+        self,
+        max_age: float
+    ) -> Optional[float]:
+        '''
+        Read the hosts of an unfinished sweep
+
+        Returns
+        -------
+        float: The time the sweep started, or None if there is no sweep to
+        resume
+        '''
+        try:
+            with open(self.path, mode='r') as f:
+                lines = f.read().split('\n')
+            started = float(lines[0])
+        except (FileNotFoundError, ValueError):
+            return None
+        if time.time() - started > max_age:
+            logging.warning(f'Discarding checkpoint {self.path}, too old')
+            return None
+        # The last line may have been cut short when the run was killed
+        self.done = set(line for line in lines[1:-1] if line)
+        return started
+
+    def filter(
+        self,
+        hosts: Iterable[NagiosHost]
+    ) -> Iterator[NagiosHost]:
+        '''
+        Keep the hosts not checked yet, as they are iterated over
+        '''
+        return (host for host in hosts if host.hostname not in self.done)
+
+    def record(
+        self,
+        hostnames: Iterable[str]
+    ):
+        '''
+        Record hosts whose results were submitted
+        '''
+        for hostname in hostnames:
+            if hostname not in self.done:
+                self.done.add(hostname)
+                self._journal.write(f'{hostname}\n')
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def complete(self):
+        '''
+        Remove the journal once the sweep is finished
+        '''
+        self._journal.close()
+        os.remove(self.path)
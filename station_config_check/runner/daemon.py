@@ -0,0 +1,215 @@
+import heapq
+import logging
+import random
+import signal
+import threading
+import time
+from types import FrameType
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from station_config_check.nagios.nagios_api import NagiosHost
+from station_config_check.nagios.nrdp import NagiosCheckResult, \
+    NagiosCheckResults
+
+
+class RollingSchedule:
+    def __init__(
+        self,
+        interval: float,
+        jitter: float = 0.1
+    ):
+        '''
+        Keep track of when each host is next due to be checked
+
+        Parameters
+        ----------
+        interval: float
+            Time in seconds between two checks of the same host
+
+        jitter: float
+            Fraction of the interval by which each check is randomly moved
+            forward or back, so hosts do not end up checked in lockstep
+        '''
+        self.interval = interval
+        self.jitter = jitter
+        self.hosts: Dict[str, NagiosHost] = {}
+        self._due: List[Tuple[float, str]] = []
+        self._scheduled: Set[str] = set()
+
+    def update_inventory(
+        self,
+        hosts: Iterable[NagiosHost]
+    ):
+        '''
+        Replace the set of hosts being checked. New hosts are given a random
+        first check within the next interval so they are spread out, hosts
+        that are no longer in the inventory stop being checked.
+        '''
+        now = time.monotonic()
+        self.hosts = dict((host.hostname, host) for host in hosts)
+
+        for hostname in self.hosts:
+            if hostname not in self._scheduled:
+                self._scheduled.add(hostname)
+                heapq.heappush(
+                    self._due,
+                    (now + random.uniform(0, self.interval), hostname))
+
+        # Entries of removed hosts are dropped when they come due
+        logging.debug(
+            f'Inventory updated, {len(self.hosts)} hosts being checked')
+
+    def next_due(self) -> Optional[float]:
+        '''
+        Get the time at which the next host is due to be checked
+        '''
+        while self._due and self._due[0][1] not in self.hosts:
+            _, hostname = heapq.heappop(self._due)
+            self._scheduled.discard(hostname)
+        return self._due[0][0] if self._due else None
+
+    def pop_due(
+        self,
+        now: float
+    ) -> List[NagiosHost]:
+        '''
+        Get the hosts that are due to be checked and schedule their next check
+        '''
+        due = []
+        while self._due and self._due[0][0] <= now:
+            _, hostname = heapq.heappop(self._due)
+            if hostname not in self.hosts:
+                self._scheduled.discard(hostname)
+                continue
+            due.append(self.hosts[hostname])
+
+        # Next checks are only scheduled once all due hosts were collected,
+        # so a host is returned at most once even with a very short interval
+        for host in due:
+            offset = random.uniform(-self.jitter, self.jitter) * self.interval
+            heapq.heappush(
+                self._due, (now + self.interval + offset, host.hostname))
+        return due
+
+
+def run_daemon(
+    load_inventory: Callable[[], Iterable[NagiosHost]],
+    check: Callable[[List[NagiosHost]], List[NagiosCheckResult]],
+    submit_results: Callable[[NagiosCheckResults], None],
+    interval: float,
+    inventory_refresh: float,
+    jitter: float = 0.1,
+    flush_interval: float = 60,
+    max_pending: int = 10000,
+    stop: Optional[threading.Event] = None
+):
+    '''
+    Check hosts continuously, each host once per interval, instead of
+    checking the whole inventory in one sweep
+
+    The inventory, golden images and submission backend passed in stay
+    loaded between checks. Logins to the devices are not kept: each
+    download logs in again, as a device session would expire long before
+    the host is next due.
+
+    Parameters
+    ----------
+    load_inventory: Callable
+        Function returning the hosts to check
+
+    check: Callable
+        Function checking a list of hosts and returning their results
+
+    submit_results: Callable
+        Function submitting check results to Nagios
+
+    interval: float
+        Time in seconds between two checks of the same host
+
+    inventory_refresh: float
+        Time in seconds between two refreshes of the inventory
+
+    jitter: float
+        Fraction of the interval by which checks are randomly moved
+
+    flush_interval: float
+        Maximum time in seconds results are held before being submitted
+
+    max_pending: int
+        Maximum number of results held while submissions fail. The oldest
+        results are dropped past it.
+
+    stop: Event
+        Event stopping the daemon once set. By default the daemon stops on
+        SIGTERM or SIGINT.
+    '''
+    if stop is None:
+        stop = threading.Event()
+        stopping = stop
+
+        def handle_signal(signum: int, frame: Optional[FrameType]):
+            logging.info(f'Received signal {signum}, stopping')
+            stopping.set()
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, handle_signal)
+
+    schedule = RollingSchedule(interval=interval, jitter=jitter)
+    pending = NagiosCheckResults()
+    next_refresh = time.monotonic()
+    next_flush = time.monotonic() + flush_interval
+
+    while not stop.is_set():
+        now = time.monotonic()
+
+        if now >= next_refresh:
+            try:
+                schedule.update_inventory(load_inventory())
+            except Exception as e:
+                # Keep checking the last known inventory until Nagios answers
+                logging.warning(f'Could not refresh inventory: {e}')
+            next_refresh = now + inventory_refresh
+
+        due = schedule.pop_due(now)
+        if due:
+            try:
+                pending.extend(check(due))
+            except Exception as e:
+                # The hosts are checked again once they are next due
+                logging.exception(f'Could not check {len(due)} hosts: {e}')
+
+        now = time.monotonic()
+        if pending and now >= next_flush:
+            _flush(pending, submit_results, max_pending)
+        if now >= next_flush:
+            next_flush = now + flush_interval
+
+        wake = min(next_refresh, next_flush)
+        next_due = schedule.next_due()
+        if next_due is not None:
+            wake = min(wake, next_due)
+        stop.wait(max(0, wake - time.monotonic()))
+
+    if pending:
+        _flush(pending, submit_results, max_pending)
+
+
+def _flush(
+    pending: NagiosCheckResults,
+    submit_results: Callable[[NagiosCheckResults], None],
+    max_pending: int
+):
+    '''
+    Submit the pending results, keeping up to max_pending of the most recent
+    ones for the next flush on failure
+    '''
+    try:
+        submit_results(NagiosCheckResults(pending))
+    except Exception as e:
+        logging.warning(f'Could not submit results: {e}')
+        if len(pending) > max_pending:
+            logging.warning(
+                f'Dropping the {len(pending) - max_pending} oldest results ' +
+                'waiting to be submitted')
+            del pending[:len(pending) - max_pending]
+        return
+    pending.clear()
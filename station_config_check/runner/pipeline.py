@@ -0,0 +1,251 @@
+import logging
+import queue
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Iterable, Iterator, Optional, Tuple, \
+    Type
+from station_config_check.config_check.diff_pool import DiffPool
+from station_config_check.config_check.golden_image import \
+    GoldenImageMissing, GoldenImageStore, GoldenImageUnreadable
+from station_config_check.config_check.thresholds import \
+    SimilarityThresholds
+from station_config_check.nagios.models import NagiosOutputCode
+from station_config_check.nagios.nagios_api import NagiosHost
+from station_config_check.nagios.nrdp import NagiosCheckResult, \
+    NagiosCheckResults
+from station_config_check.runner.probe import TcpProbe
+from station_config_check.runner.scheduler import LinkScheduler
+
+
+class BatchSubmitter:
+    def __init__(
+        self,
+        submit_results: Callable[[NagiosCheckResults], None],
+        batch_size: int = 500
+    ):
+        '''
+        Submit check results in batches as they are produced rather than
+        holding all of them until the end of the sweep
+
+        Parameters
+        ----------
+        submit_results: Callable
+            Function submitting check results to Nagios
+
+        batch_size: int
+            The number of results submitted at once. With 0, all results are
+            submitted when flushed.
+        '''
+        self.submit_results = submit_results
+        self.batch_size = batch_size
+        self.pending = NagiosCheckResults()
+
+    def add(
+        self,
+        result: NagiosCheckResult
+    ):
+        '''
+        Add a result, submitting the pending batch once it is full
+        '''
+        self.pending.append(result)
+        if self.batch_size and len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        Submit the pending results
+        '''
+        if not self.pending:
+            return
+        logging.debug(f'Submitting {len(self.pending)} results')
+        self.submit_results(self.pending)
+        self.pending = NagiosCheckResults()
+
+
+def run_sweep(
+    hosts: Iterable[NagiosHost],
+    fetch: Callable[[NagiosHost], str],
+    golden_images: GoldenImageStore,
+    scheduler: LinkScheduler,
+    diff_pool: DiffPool,
+    emit: Callable[[NagiosCheckResult], None],
+    fetch_errors: Tuple[Type[Exception], ...],
+    unreachable_output: str = 'Host unreachable in Nagios',
+    queue_size: int = 64,
+    on_config: Optional[Callable[[NagiosHost, str], None]] = None,
+    probe: Optional[TcpProbe] = None,
+    thresholds: Optional[SimilarityThresholds] = None,
+    save_missing: bool = True
+):
+    '''
+    Check the config of hosts as a pipeline: hosts are taken from the
+    inventory, their config downloaded, compared to their golden image and
+    the result emitted, with a bounded number of hosts in each stage
+
+    Parameters
+    ----------
+    hosts: Iterable
+        The hosts to check. It may be a generator querying Nagios as it goes.
+
+    fetch: Callable
+        Function downloading the running config of a single host
+
+    golden_images: GoldenImageStore
+        The golden images of the hosts
+
+    scheduler: LinkScheduler
+        Scheduler pacing the downloads according to the link class of each
+        host
+
+    diff_pool: DiffPool
+        Pool comparing the running configs to the golden images
+
+    emit: Callable
+        Function receiving each check result as soon as it is available
+
+    fetch_errors: Tuple
+        Exceptions raised by fetch when the device cannot be reached. Any
+        other exception stops the sweep.
+
+    unreachable_output: str
+        Output of the result for hosts that are not up in Nagios
+
+    queue_size: int
+        The number of hosts allowed to wait in each stage
+
+    on_config: Callable
+        Function receiving each running config that was downloaded
+
+    probe: TcpProbe
+        Probe checking that hosts accept connections before downloading
+        their config. Hosts that do not are reported without trying to
+        download their config.
+
+    thresholds: SimilarityThresholds
+        The ranges of similarity config checks are warning or critical in,
+        by install type. By default, checks are critical if the configs
+        differ.
+
+    save_missing: bool
+        Whether the running config of a host without golden image is saved
+        as its golden image. Otherwise the missing golden image is only
+        reported.
+    '''
+    # Results for hosts that are down in Nagios are produced while the
+    # scheduler iterates over the hosts, and handed back to this thread
+    skipped: 'queue.SimpleQueue[NagiosCheckResult]' = queue.SimpleQueue()
+
+    def up() -> Iterator[NagiosHost]:
+        for host in hosts:
+            # If the host status is not "OK", skip trying to download config
+            if host.status != 0:
+                skipped.put(NagiosCheckResult(
+                    hostname=host.hostname,
+                    servicename='Config Check',
+                    output=unreachable_output
+                ))
+                continue
+            yield host
+
+    def reachable() -> Iterator[NagiosHost]:
+        if probe is None:
+            yield from up()
+            return
+        for host, accepted in probe.probe(up()):
+            if not accepted:
+                logging.warning(
+                    f'{host.hostname} does not accept connections on ' +
+                    f'port {probe.port}')
+                skipped.put(NagiosCheckResult(
+                    hostname=host.hostname,
+                    servicename='Config Check',
+                    state=NagiosOutputCode.critical.value,
+                    output='Host unreachable when downloading running config'
+                ))
+                continue
+            yield host
+
+    def emit_skipped():
+        while not skipped.empty():
+            emit(skipped.get())
+
+    comparisons: Deque['Future[NagiosCheckResult]'] = deque()
+
+    for host, running_config in scheduler.fetch_all(
+            reachable(), fetch, queue_size=queue_size):
+        emit_skipped()
+
+        if isinstance(running_config, fetch_errors):
+            # If for some reason the config cannot be downloaded, log the
+            # error and move on to the next host
+            logging.warning(running_config)
+            emit(NagiosCheckResult(
+                hostname=host.hostname,
+                servicename='Config Check',
+                state=NagiosOutputCode.critical.value,
+                output='Host unreachable when downloading running config'
+            ))
+            continue
+        if isinstance(running_config, Exception):
+            raise running_config
+
+        if on_config is not None:
+            on_config(host, running_config)
+
+        try:
+            logging.debug(
+                f'Searching for {host.hostname} in ' +
+                f'{golden_images.goldenimg_dir}')
+            # Try loading the golden image from file
+            golden_image = golden_images.load(
+                host_name=host.hostname,
+                install_type=host.install_type,
+                variables={'IP_ADDRESS': host.ip_address}
+            )
+        # The golden image is left as is for someone to look at, rather
+        # than replaced by the running config
+        except GoldenImageUnreadable as e:
+            logging.error(e)
+            emit(NagiosCheckResult(
+                hostname=host.hostname,
+                servicename='Config Check',
+                output=f'Golden image unreadable: {e}'
+            ))
+            continue
+        # If there is no golden image for this host
+        except GoldenImageMissing:
+            if not save_missing:
+                emit(NagiosCheckResult(
+                    hostname=host.hostname,
+                    servicename='Config Check',
+                    output='No Golden Image present.'
+                ))
+                continue
+            logging.debug(
+                'Golden image mising, writing running config to file')
+            golden_images.write(host.hostname, running_config)
+            emit(NagiosCheckResult(
+                hostname=host.hostname,
+                servicename='Config Check',
+                output='No Golden Image present. New golden image saved.'
+            ))
+            continue
+
+        # If a golden image was found, proceed with comparing it to the
+        # running config
+        logging.debug(f'Comparing config for {host.hostname}')
+        comparisons.append(diff_pool.submit(
+            hostname=host.hostname,
+            golden_image=golden_image,
+            running_config=running_config,
+            threshold=None if thresholds is None else
+            thresholds.get(host.install_type)
+        ))
+        # Wait on the oldest comparisons once too many are in flight, which
+        # in turn holds back the downloads
+        while len(comparisons) > queue_size:
+            emit(comparisons.popleft().result())
+
+    emit_skipped()
+    while comparisons:
+        emit(comparisons.popleft().result())
@@ -0,0 +1,143 @@
+import errno
+import selectors
+import socket
+import time
+from typing import Iterable, Iterator, Tuple
+from station_config_check.nagios.nagios_api import NagiosHost
+
+
+class TcpProbe:
+    def __init__(
+        self,
+        port: int = 80,
+        timeout: float = 2,
+        concurrency: int = 512
+    ):
+        '''
+        Check that hosts accept TCP connections before trying to download
+        their config, connecting to many hosts at once without blocking so
+        the whole fleet is probed in a few seconds
+
+        Parameters
+        ----------
+        port: int
+            The port connected to
+
+        timeout: float
+            Time in seconds after which a host that did not accept the
+            connection is considered unreachable
+
+        concurrency: int
+            The number of connections attempted at the same time
+        '''
+        self.port = port
+        self.timeout = timeout
+        self.concurrency = concurrency
+
+    def _connect(
+        self,
+        host: NagiosHost
+    ) -> Tuple[socket.socket, bool]:
+        '''
+        Start connecting to a host
+
+        Returns
+        -------
+        Tuple: The socket and whether the connection is still in progress
+
+        Raises
+        ------
+        socket.gaierror: If the address of the host is not an IP address
+
+        OSError: If the connection failed right away
+        '''
+        family, kind, proto, _, address = socket.getaddrinfo(
+            host.ip_address, self.port, type=socket.SOCK_STREAM,
+            flags=socket.AI_NUMERICHOST)[0]
+        sock = socket.socket(family, kind, proto)
+        sock.setblocking(False)
+        error = sock.connect_ex(address)
+        if error in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+            return sock, True
+        sock.close()
+        if error != 0:
+            raise OSError(error, errno.errorcode.get(error, str(error)))
+        return sock, False
+
+    def probe(
+        self,
+        hosts: Iterable[NagiosHost]
+    ) -> Iterator[Tuple[NagiosHost, bool]]:
+        '''
+        Probe hosts, taking them from the iterable as connections complete
+
+        Parameters
+        ----------
+        hosts: Iterable
+            The hosts to probe
+
+        Returns
+        -------
+        Iterator: Tuples of each host and whether it accepted the connection,
+        in order of completion. Hosts whose address is a name rather than an
+        IP address are given as accepting connections without being probed.
+        '''
+        selector = selectors.DefaultSelector()
+        remaining = iter(hosts)
+        exhausted = False
+
+        try:
+            while True:
+                # Start connecting to hosts until enough are in progress
+                while not exhausted and \
+                        len(selector.get_map()) < self.concurrency:
+                    host = next(remaining, None)
+                    if host is None:
+                        exhausted = True
+                        break
+                    try:
+                        sock, pending = self._connect(host)
+                    except socket.gaierror:
+                        # Hosts addressed by name are not probed, since
+                        # resolving them would block the other probes. Their
+                        # download reports whether they can be reached.
+                        yield host, True
+                        continue
+                    except OSError:
+                        yield host, False
+                        continue
+                    if not pending:
+                        yield host, True
+                        continue
+                    selector.register(
+                        sock, selectors.EVENT_WRITE,
+                        (host, time.monotonic() + self.timeout))
+
+                if not selector.get_map():
+                    return
+
+                deadline = min(
+                    key.data[1] for key in selector.get_map().values())
+                events = selector.select(
+                    max(0, deadline - time.monotonic()))
+
+                # A socket becomes writable once the connection succeeded
+                # or failed
+                for key, _ in events:
+                    sock = key.fileobj  # type: ignore
+                    error = sock.getsockopt(
+                        socket.SOL_SOCKET, socket.SO_ERROR)
+                    selector.unregister(sock)
+                    sock.close()
+                    yield key.data[0], error == 0
+
+                now = time.monotonic()
+                for key in list(selector.get_map().values()):
+                    if key.data[1] <= now:
+                        selector.unregister(key.fileobj)
+                        key.fileobj.close()  # type: ignore
+                        yield key.data[0], False
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()  # type: ignore
+            selector.close()
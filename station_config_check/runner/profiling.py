@@ -0,0 +1,162 @@
+import io
+import logging
+import os
+import random
+import time
+from typing import TYPE_CHECKING, Callable, Optional
+from station_config_check.lazy_import import lazy_import
+from station_config_check.nagios.nagios_api import NagiosHost
+
+# Only loaded when a run is profiled
+if TYPE_CHECKING:
+    import cProfile
+    import pstats
+    import tracemalloc
+else:
+    cProfile = lazy_import('cProfile')
+    pstats = lazy_import('pstats')
+    tracemalloc = lazy_import('tracemalloc')
+
+
+# Number of entries written to the summaries of profiles and allocations
+SUMMARY_ENTRIES = 40
+
+
+class RunProfiler:
+    def __init__(
+        self,
+        output_dir: str,
+        profile: bool = False,
+        host_sample: float = 0,
+        trace_alloc: bool = False
+    ):
+        '''
+        Profile the time and memory used by a run, to diagnose a slow sweep
+        on live data
+
+        Parameters
+        ----------
+        output_dir: str
+            The directory profiles are written to
+
+        profile: bool
+            Whether to profile the calling thread for the whole run, where
+            the configs are compared and the results submitted. The profile
+            is dumped in the pstats format along with a text summary.
+
+        host_sample: float
+            Share of hosts whose download is profiled separately, since
+            downloads run in other threads. From Python 3.12, the downloads
+            are only timed while the run is profiled.
+
+        trace_alloc: bool
+            Whether to trace memory allocations and write the top allocation
+            sites at the end of the run
+        '''
+        self.output_dir = output_dir
+        self.host_sample = host_sample
+        self.trace_alloc = trace_alloc
+        self.prefix = time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}'
+        self._profile: Optional['cProfile.Profile'] = None
+        if profile:
+            self._profile = cProfile.Profile()
+
+        if (profile or host_sample or trace_alloc) and \
+                not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+    def _path(
+        self,
+        name: str
+    ) -> str:
+        return os.path.join(self.output_dir, f'{self.prefix}-{name}')
+
+    def _dump(
+        self,
+        profile: 'cProfile.Profile',
+        name: str
+    ):
+        '''
+        Write a profile in the pstats format, along with the functions
+        taking the most time
+        '''
+        profile.dump_stats(self._path(f'{name}.pstats'))
+        summary = io.StringIO()
+        pstats.Stats(profile, stream=summary) \
+            .sort_stats(pstats.SortKey.CUMULATIVE) \
+            .print_stats(SUMMARY_ENTRIES)
+        with open(self._path(f'{name}.txt'), mode='w') as f:
+            f.write(summary.getvalue())
+
+    def start(self):
+        if self.trace_alloc:
+            tracemalloc.start()
+        if self._profile is not None:
+            self._profile.enable()
+
+    def stop(self):
+        '''
+        Stop profiling and write the profiles of the run
+        '''
+        if self._profile is not None:
+            self._profile.disable()
+            self._dump(self._profile, 'run')
+            logging.info(f'Profile written to {self._path("run.pstats")}')
+
+        if self.trace_alloc and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(self._path('alloc.txt'), mode='w') as f:
+                f.write(
+                    f'Current {current / 1024:.0f} KiB, ' +
+                    f'peak {peak / 1024:.0f} KiB\n')
+                for stat in snapshot.statistics('lineno')[:SUMMARY_ENTRIES]:
+                    f.write(f'{stat}\n')
+            logging.info(
+                f'Allocations written to {self._path("alloc.txt")}')
+
+    def profile_fetch(
+        self,
+        fetch: Callable[[NagiosHost], str]
+    ) -> Callable[[NagiosHost], str]:
+        '''
+        Wrap a function downloading configs so the downloads of a sample of
+        hosts are profiled, each in its own profile
+
+        Parameters
+        ----------
+        fetch: Callable
+            Function downloading the running config of a single host
+
+        Returns
+        -------
+        Callable: The wrapped function, or fetch itself if no host is sampled
+        '''
+        if not self.host_sample:
+            return fetch
+
+        def profiled(host: NagiosHost) -> str:
+            if random.random() >= self.host_sample:
+                return fetch(host)
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # From Python 3.12, a single profiler may be active at a
+                # time, which may be the profiler of the run. The download
+                # is only timed then.
+                start = time.monotonic()
+                try:
+                    return fetch(host)
+                finally:
+                    logging.info(
+                        f'Config of {host.hostname} downloaded in ' +
+                        f'{time.monotonic() - start:.3f}s')
+            try:
+                return fetch(host)
+            finally:
+                profile.disable()
+                self._dump(profile, f'host-{host.hostname}')
+
+        return profiled
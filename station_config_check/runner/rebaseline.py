@@ -0,0 +1,257 @@
+import concurrent.futures
+import fnmatch
+import logging
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, \
+    Sequence, Set, Tuple, Type
+from station_config_check.config_check.golden_image import \
+    GoldenImageMissing, GoldenImageStore, GoldenImageUnreadable
+from station_config_check.lazy_import import lazy_import
+from station_config_check.nagios.nagios_api import NagiosHost
+
+# Only loaded once configs are compared
+if TYPE_CHECKING:
+    import difflib
+else:
+    difflib = lazy_import('difflib')
+
+
+# A host is selected when it matches every criterion given, and an empty
+# criterion matches any host. Stations are matched with shell style patterns.
+@dataclass
+class HostSelector():
+    networks: Sequence[str] = ()
+    stations: Sequence[str] = ()
+    install_types: Sequence[str] = ()
+    # Such as the members of a hostgroup
+    hostnames: Optional[Set[str]] = None
+
+    def matches(
+        self,
+        host: NagiosHost
+    ) -> bool:
+        network, station = (host.hostname.split('-') + [''])[:2]
+        if self.networks and network not in self.networks:
+            return False
+        if self.stations and not any(
+                fnmatch.fnmatchcase(station, pattern)
+                for pattern in self.stations):
+            return False
+        if self.install_types and host.install_type not in self.install_types:
+            return False
+        if self.hostnames is not None and host.hostname not in self.hostnames:
+            return False
+        return True
+
+    def filter(
+        self,
+        hosts: Iterable[NagiosHost]
+    ) -> List[NagiosHost]:
+        return [host for host in hosts if self.matches(host)]
+
+
+@dataclass
+class RebaselineChange():
+    hostname: str
+    # new if the host has no golden image, changed or unchanged otherwise
+    status: str
+    # Lines of the golden image replaced by lines of the running config
+    removed: Tuple[str, ...] = ()
+    added: Tuple[str, ...] = ()
+
+
+def fetch_configs(
+    hosts: Sequence[NagiosHost],
+    fetch: Callable[[NagiosHost], str],
+    fetch_errors: Tuple[Type[Exception], ...] = (),
+    workers: int = 16
+) -> Tuple[Dict[str, str], List[str]]:
+    '''
+    Download the running configs of hosts concurrently
+
+    Parameters
+    ----------
+    hosts: Sequence
+        The hosts to download the running config of
+
+    fetch: Callable
+        Function downloading the running config of a single host
+
+    fetch_errors: Tuple
+        Exceptions raised by fetch when a host cannot be reached
+
+    workers: int
+        The number of configs downloaded at the same time
+
+    Returns
+    -------
+    Tuple: The running configs keyed by hostname, and the hostnames whose
+    config could not be downloaded
+    '''
+    configs: Dict[str, str] = {}
+    failed: List[str] = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch, host): host for host in hosts}
+        for future in concurrent.futures.as_completed(futures):
+            host = futures[future]
+            try:
+                configs[host.hostname] = future.result()
+            except fetch_errors as e:
+                logging.warning(
+                    f'Could not download the config of {host.hostname}: {e}')
+                failed.append(host.hostname)
+    return configs, failed
+
+
+def plan_rebaseline(
+    hosts: Sequence[NagiosHost],
+    configs: Dict[str, str],
+    golden_images: GoldenImageStore
+) -> List[RebaselineChange]:
+    '''
+    Compare the running configs downloaded to the golden images they would
+    replace
+
+    Hosts whose golden image comes from the template of their install type
+    are compared to the template, and are given their own golden image when
+    re-baselined.
+
+    Parameters
+    ----------
+    hosts: Sequence
+        The hosts selected
+
+    configs: Dict
+        The running configs keyed by hostname
+
+    golden_images: GoldenImageStore
+        The current golden images
+
+    Returns
+    -------
+    List: The change of each host whose config was downloaded
+    '''
+    changes = []
+    for host in hosts:
+        if host.hostname not in configs:
+            continue
+        running_config = configs[host.hostname]
+        try:
+            golden_image = golden_images.load(
+                host_name=host.hostname,
+                install_type=host.install_type,
+                variables={'IP_ADDRESS': host.ip_address}
+            )
+        # An unreadable golden image is replaced as if there was none
+        except (GoldenImageMissing, GoldenImageUnreadable):
+            changes.append(RebaselineChange(host.hostname, 'new'))
+            continue
+
+        if golden_image == running_config:
+            changes.append(RebaselineChange(host.hostname, 'unchanged'))
+            continue
+
+        golden_lines = golden_image.splitlines()
+        running_lines = running_config.splitlines()
+        removed: List[str] = []
+        added: List[str] = []
+        matcher = difflib.SequenceMatcher(
+            None, golden_lines, running_lines, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag != 'equal':
+                removed.extend(golden_lines[i1:i2])
+                added.extend(running_lines[j1:j2])
+        changes.append(RebaselineChange(
+            host.hostname, 'changed', tuple(removed), tuple(added)))
+    return changes
+
+
+def summarize_rebaseline(
+    changes: Sequence[RebaselineChange],
+    failed: Sequence[str] = (),
+    hosts_shown: int = 5,
+    lines_shown: int = 20
+) -> str:
+    '''
+    Summarize the changes of a re-baseline, grouping the hosts going through
+    the same change so a fleet-wide change reads as a single diff
+
+    Parameters
+    ----------
+    changes: Sequence
+        The changes of the hosts
+
+    failed: Sequence
+        The hostnames whose config could not be downloaded
+
+    hosts_shown: int
+        The number of hostnames listed for each group of hosts
+
+    lines_shown: int
+        The number of diff lines listed for each group of hosts
+
+    Returns
+    -------
+    str: The summary
+    '''
+    counts: Dict[str, int] = {}
+    groups: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], List[str]] = {}
+    for change in changes:
+        counts[change.status] = counts.get(change.status, 0) + 1
+        if change.status == 'changed':
+            groups.setdefault(
+                (change.removed, change.added), []).append(change.hostname)
+
+    lines = [
+        f'{counts.get("changed", 0)} changed, ' +
+        f'{counts.get("new", 0)} new, ' +
+        f'{counts.get("unchanged", 0)} unchanged, ' +
+        f'{len(failed)} unreachable'
+    ]
+
+    # The most common changes first
+    for (removed, added), hostnames in sorted(
+            groups.items(), key=lambda group: -len(group[1])):
+        shown = ', '.join(sorted(hostnames)[:hosts_shown])
+        if len(hostnames) > hosts_shown:
+            shown += f' and {len(hostnames) - hosts_shown} more'
+        lines.append('')
+        lines.append(f'{len(hostnames)} hosts: {shown}')
+        diff = [f'- {line}' for line in removed] + \
+            [f'+ {line}' for line in added]
+        lines.extend(f'    {line}' for line in diff[:lines_shown])
+        if len(diff) > lines_shown:
+            lines.append(f'    ... {len(diff) - lines_shown} more lines')
+
+    new = sorted(
+        change.hostname for change in changes if change.status == 'new')
+    if new:
+        lines.append('')
+        lines.append('New: ' + ', '.join(new))
+    if failed:
+        lines.append('')
+        lines.append('Unreachable: ' + ', '.join(sorted(failed)))
+
+    return '\n'.join(lines)
+
+
+def apply_rebaseline(
+    changes: Sequence[RebaselineChange],
+    configs: Dict[str, str],
+    golden_images: GoldenImageStore
+) -> int:
+    '''
+    Write the running configs of the hosts whose golden image changes as
+    their new golden images, all at once
+
+    Returns
+    -------
+    int: The number of golden images written
+    '''
+    batch = {
+        change.hostname: configs[change.hostname]
+        for change in changes if change.status != 'unchanged'
+    }
+    golden_images.write_many(batch)
+    logging.info(f'{len(batch)} golden images written')
+    return len(batch)
@@ -0,0 +1,383 @@
+import configparser
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, \
+    Optional, Tuple, Union
+from station_config_check.nagios.nagios_api import NagiosHost
+
+
+# Section prefix used in the cred file to describe a link class, for example
+# [link:vsat]
+LINK_SECTION_PREFIX = 'link:'
+
+# Link class used for hosts that do not define the LINK_CLASS custom variable
+DEFAULT_LINK_CLASS = 'default'
+
+# Portion of the check window over which the downloads of a spread link class
+# are started. The remainder is kept free so the last downloads can finish
+# before the window closes.
+SPREAD_FRACTION = 0.75
+
+# A host along with either its running config or the exception raised while
+# downloading it
+FetchResult = Tuple[NagiosHost, Union[str, Exception]]
+
+
+@dataclass
+class LinkClass():
+    name: str
+    concurrency: int = 1
+    byte_rate: Optional[float] = None
+    spread: bool = False
+
+
+def load_link_classes(
+    config: configparser.ConfigParser
+) -> Dict[str, LinkClass]:
+    '''
+    Read the link classes defined in the cred file
+
+    Each link class is a section named link:<name> with the optional keys
+    concurrency (simultaneous downloads), byte_rate (bytes per second allowed
+    over the link) and spread (start downloads evenly across the window).
+
+    Parameters
+    ----------
+    config: ConfigParser
+        The parsed cred file
+
+    Returns
+    -------
+    Dict: Link classes keyed by name. A default class allowing a single
+    download at a time is always present.
+    '''
+    link_classes = {DEFAULT_LINK_CLASS: LinkClass(name=DEFAULT_LINK_CLASS)}
+
+    for section in config.sections():
+        if not section.startswith(LINK_SECTION_PREFIX):
+            continue
+        name = section[len(LINK_SECTION_PREFIX):]
+        byte_rate = config[section].getfloat('byte_rate', fallback=None)
+        link_classes[name] = LinkClass(
+            name=name,
+            concurrency=config[section].getint('concurrency', fallback=1),
+            byte_rate=byte_rate,
+            spread=config[section].getboolean('spread', fallback=False)
+        )
+
+    return link_classes
+
+
+class _Backlog:
+    '''
+    Room for the hosts waiting to be downloaded on every link. Each link
+    holds up to capacity hosts, and the links that are full share room for
+    as many more, so a slow link only holds back the hosts of the others once
+    that room is taken too.
+    '''
+    def __init__(
+        self,
+        capacity: int
+    ):
+        self.capacity = max(1, capacity)
+        self.condition = threading.Condition()
+        # Hosts held by links beyond their own capacity
+        self.overflow = 0
+        # Whether the feeder waits for room
+        self.full = False
+
+
+class _LinkLane:
+    '''
+    Queue of hosts sharing a link class, along with the pacing state used to
+    respect the byte rate of the link
+    '''
+    def __init__(
+        self,
+        link_class: LinkClass,
+        backlog: _Backlog,
+        start: float,
+        window: float
+    ):
+        self.link_class = link_class
+        self.backlog = backlog
+        self.hosts: Deque[NagiosHost] = deque()
+        self.lock = threading.Lock()
+        self.start = start
+        self.next_start = start
+        self.added = 0
+        self.started = 0
+        # Set once every host of the link was queued
+        self.complete = False
+
+        # Hosts on a spread link are given evenly spaced start times across
+        # the window, all other hosts may start right away
+        self.spread = link_class.spread and window > 0
+        self.window = window
+        # Number of hosts the downloads are spaced for
+        self.count: Optional[int] = None
+
+    def put(
+        self,
+        host: NagiosHost
+    ):
+        '''
+        Queue a host, waiting for room if the link is full and so is the
+        room shared by full links
+        '''
+        backlog = self.backlog
+        with backlog.condition:
+            while len(self.hosts) >= backlog.capacity and \
+                    backlog.overflow >= backlog.capacity:
+                backlog.full = True
+                backlog.condition.notify_all()
+                backlog.condition.wait()
+            backlog.full = False
+            if len(self.hosts) >= backlog.capacity:
+                backlog.overflow += 1
+            self.hosts.append(host)
+            self.added += 1
+            backlog.condition.notify_all()
+
+    def get(self) -> Optional[NagiosHost]:
+        '''
+        Take the next host of the link, waiting for one to be queued
+
+        Returns
+        -------
+        NagiosHost: The host, or None once every host of the link was taken
+        '''
+        backlog = self.backlog
+        with backlog.condition:
+            while not self.hosts and not self.complete:
+                backlog.condition.wait()
+            if not self.hosts:
+                return None
+            if len(self.hosts) > backlog.capacity:
+                backlog.overflow -= 1
+            host = self.hosts.popleft()
+            backlog.condition.notify_all()
+            return host
+
+    def close(self):
+        '''
+        Mark the end of the hosts of the link, stopping each worker once it
+        reaches it
+        '''
+        with self.backlog.condition:
+            self.complete = True
+            self.backlog.condition.notify_all()
+
+    def _spread_start(self) -> float:
+        '''
+        Get the time the next download on a spread link may start
+        '''
+        backlog = self.backlog
+        with backlog.condition:
+            # Spacing the downloads needs the number of hosts on the link,
+            # known once the whole inventory was read. If the backlog fills
+            # up first, the hosts read so far are all that is known.
+            while not self.complete and not backlog.full:
+                backlog.condition.wait()
+            if self.count is None:
+                self.count = self.added
+                if not self.complete:
+                    logging.warning(
+                        f'More hosts on link class {self.link_class.name} ' +
+                        'than the queues hold, downloads are spread for the ' +
+                        f'first {self.count} hosts only')
+            index = self.started
+            self.started += 1
+        return self.start + \
+            index * self.window * SPREAD_FRACTION / self.count
+
+    def wait_turn(
+        self,
+        deadline: Optional[float]
+    ):
+        '''
+        Sleep until the host is allowed to start and the link has recovered
+        from the bytes transferred by previous downloads
+        '''
+        not_before = self._spread_start() if self.spread else self.start
+
+        with self.lock:
+            start = max(not_before, self.next_start)
+            # Pacing reserves the link until the download is accounted for
+            self.next_start = start
+
+        if deadline is not None and start > deadline:
+            logging.warning(
+                f'Link class {self.link_class.name} is behind schedule, ' +
+                'starting download past the check window')
+            start = deadline
+
+        delay = start - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def account(
+        self,
+        transferred: int
+    ):
+        '''
+        Push back the next allowed start on the link according to the
+        amount of bytes that were transferred
+        '''
+        if not self.link_class.byte_rate:
+            return
+        with self.lock:
+            self.next_start = max(self.next_start, time.monotonic()) + \
+                transferred / self.link_class.byte_rate
+
+
+class LinkScheduler:
+    def __init__(
+        self,
+        link_classes: Dict[str, LinkClass],
+        window: float = 0
+    ):
+        '''
+        Initialize the scheduler
+
+        Parameters
+        ----------
+        link_classes: Dict
+            The link classes, as returned by load_link_classes
+
+        window: float
+            Time budget for the whole sweep in seconds. Spread link classes
+            have their downloads distributed across it. 0 disables spreading.
+        '''
+        self.link_classes = link_classes
+        self.window = window
+
+    def get_link_class(
+        self,
+        host: NagiosHost
+    ) -> LinkClass:
+        '''
+        Get the link class of a host, falling back to the default class
+        '''
+        if host.link_class not in self.link_classes:
+            logging.debug(
+                f'Unknown link class {host.link_class} for {host.hostname}')
+            return self.link_classes[DEFAULT_LINK_CLASS]
+        return self.link_classes[host.link_class]
+
+    def fetch_all(
+        self,
+        hosts: Iterable[NagiosHost],
+        fetch: Callable[[NagiosHost], str],
+        queue_size: int = 64
+    ) -> Iterator[FetchResult]:
+        '''
+        Download the running config of every host while respecting the
+        concurrency and byte rate of each link class
+
+        Parameters
+        ----------
+        hosts: Iterable
+            The hosts to download configs from. Hosts are taken from it
+            while the downloads run, so it may be a generator. Downloads over
+            spread link classes start once it is exhausted or the queues are
+            full, as spacing them needs the number of hosts on each link.
+
+        fetch: Callable
+            Function downloading the running config of a single host
+
+        queue_size: int
+            The number of hosts waiting to be downloaded per link class,
+            along with as many shared by the link classes that are full, and
+            the number of downloaded configs waiting to be consumed. Hosts
+            are taken from the inventory while there is room, and downloads
+            pause while the configs are not consumed.
+
+        Returns
+        -------
+        Iterator: Tuples of the host and either its running config or the
+        exception raised while downloading it, in order of completion
+
+        Raises
+        ------
+        Exception: Any exception raised while iterating over the hosts, once
+        the configs of the hosts taken so far were returned
+        '''
+        start = time.monotonic()
+        deadline = start + self.window if self.window > 0 else None
+
+        results: 'queue.Queue[Optional[FetchResult]]' = \
+            queue.Queue(maxsize=queue_size)
+        errors: List[Exception] = []
+        backlog = _Backlog(queue_size)
+
+        def feed() -> None:
+            lanes: Dict[str, _LinkLane] = {}
+            threads: List[threading.Thread] = []
+            try:
+                for host in hosts:
+                    link_class = self.get_link_class(host)
+                    if link_class.name not in lanes:
+                        lanes[link_class.name] = _LinkLane(
+                            link_class=link_class,
+                            backlog=backlog,
+                            start=start,
+                            window=self.window)
+                        for _ in range(max(1, link_class.concurrency)):
+                            thread = threading.Thread(
+                                target=self._work,
+                                args=(lanes[link_class.name], fetch, results,
+                                      deadline),
+                                daemon=True)
+                            thread.start()
+                            threads.append(thread)
+                    lanes[link_class.name].put(host)
+            except Exception as e:
+                errors.append(e)
+
+            for lane in lanes.values():
+                lane.close()
+            for thread in threads:
+                thread.join()
+            results.put(None)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+
+        while True:
+            result = results.get()
+            if result is None:
+                break
+            yield result
+
+        feeder.join()
+        if errors:
+            raise errors[0]
+
+    def _work(
+        self,
+        lane: _LinkLane,
+        fetch: Callable[[NagiosHost], str],
+        results: 'queue.Queue[Optional[FetchResult]]',
+        deadline: Optional[float]
+    ):
+        '''
+        Download configs for the hosts of a lane until its end is reached
+        '''
+        while True:
+            host = lane.get()
+            if host is None:
+                return
+
+            lane.wait_turn(deadline)
+            try:
+                config = fetch(host)
+            except Exception as e:
+                results.put((host, e))
+                continue
+            lane.account(len(config.encode()))
+            results.put((host, config))
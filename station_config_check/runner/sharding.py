@@ -0,0 +1,98 @@
+import bisect
+import hashlib
+from typing import Iterable, Iterator, List, Tuple
+from station_config_check.nagios.nagios_api import NagiosHost
+
+
+# Number of points each shard is given on the hash ring. More points spread
+# hosts more evenly between shards.
+POINTS_PER_SHARD = 128
+
+
+class InvalidShard(Exception):
+    pass
+
+
+def _hash(
+    key: str
+) -> int:
+    return int.from_bytes(
+        hashlib.sha1(key.encode()).digest()[:8], 'big')
+
+
+class Shard:
+    def __init__(
+        self,
+        index: int,
+        count: int
+    ):
+        '''
+        Part of the fleet checked by a runner. Hosts are assigned to shards
+        by consistent hashing of their hostname, so runners agree on the
+        assignment without coordinating, adding hosts never moves existing
+        ones, and changing the number of shards only moves the hosts of about
+        one shard.
+
+        Parameters
+        ----------
+        index: int
+            The index of the shard, from 1 to count
+
+        count: int
+            The number of shards the fleet is divided in
+        '''
+        if count < 1 or not 1 <= index <= count:
+            raise InvalidShard(f'Invalid shard {index}/{count}')
+        self.index = index
+        self.count = count
+
+        ring: List[Tuple[int, int]] = sorted(
+            (_hash(f'{shard}-{point}'), shard)
+            for shard in range(1, count + 1)
+            for point in range(POINTS_PER_SHARD)
+        )
+        self._points = [point for point, _ in ring]
+        self._shards = [shard for _, shard in ring]
+
+    @classmethod
+    def parse(
+        cls,
+        shard: str
+    ) -> 'Shard':
+        '''
+        Create a shard from its i/N notation
+
+        Raises
+        ------
+        InvalidShard: If the notation is not valid
+        '''
+        try:
+            index, count = (int(part) for part in shard.split('/'))
+        except ValueError:
+            raise InvalidShard(f'Shard {shard} is not in the i/N notation')
+        return cls(index=index, count=count)
+
+    def shard_of(
+        self,
+        hostname: str
+    ) -> int:
+        '''
+        Get the index of the shard a host is assigned to
+        '''
+        position = bisect.bisect(self._points, _hash(hostname))
+        return self._shards[position % len(self._shards)]
+
+    def owns(
+        self,
+        hostname: str
+    ) -> bool:
+        return self.shard_of(hostname) == self.index
+
+    def filter(
+        self,
+        hosts: Iterable[NagiosHost]
+    ) -> Iterator[NagiosHost]:
+        '''
+        Keep the hosts assigned to this shard, as they are iterated over
+        '''
+        return (host for host in hosts if self.owns(host.hostname))
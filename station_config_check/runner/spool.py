@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+import pathlib
+import time
+from typing import Callable, Dict, Iterable, Tuple, Type
+from station_config_check.nagios.nrdp import NagiosCheckResult, \
+    NagiosCheckResults, NRDPUnavailable
+
+
+class SubmissionSpool:
+    def __init__(
+        self,
+        path: str,
+        retry_errors: Tuple[Type[Exception], ...] = (NRDPUnavailable,),
+        backoff: float = 60,
+        max_backoff: float = 3600,
+        max_age: float = 86400,
+        batch_size: int = 500
+    ):
+        '''
+        Keep the results that could not be submitted on disk so they are
+        submitted once Nagios is back, instead of being lost with the sweep
+        that produced them
+
+        Only the newest result of each host and service is kept. Spooled
+        results are retried with an exponential backoff, by the next
+        submission or the next run.
+
+        Parameters
+        ----------
+        path: str
+            The spool file
+
+        retry_errors: Tuple
+            Exceptions raised when submitting that are worth retrying later.
+            Other exceptions are raised as they are.
+
+        backoff: float
+            Time in seconds before the first retry, doubled after each
+            failed retry
+
+        max_backoff: float
+            Maximum time in seconds between two retries
+
+        max_age: float
+            Age in seconds after which spooled results are discarded, as
+            they no longer describe the state of the hosts
+
+        batch_size: int
+            The number of spooled results submitted at once
+        '''
+        self.path = pathlib.Path(path)
+        self.retry_errors = retry_errors
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.attempts = 0
+        self.next_attempt = 0.0
+        # Results as dicts, with the time they were spooled, keyed by host
+        # and service
+        self.results: Dict[Tuple[str, str], Dict] = {}
+        self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, mode='r') as f:
+                spool = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logging.warning(f'Discarding unreadable spool {self.path}')
+            return
+        self.attempts = spool['attempts']
+        self.next_attempt = spool['next_attempt']
+        expired = time.time() - self.max_age
+        for result in spool['results']:
+            if result['time'] < expired:
+                continue
+            self.results[(result['hostname'], result['servicename'])] = \
+                result
+        dropped = len(spool['results']) - len(self.results)
+        if dropped:
+            logging.warning(f'Discarding {dropped} expired spooled results')
+
+    def save(self):
+        '''
+        Write the spool to disk, replacing the previous file atomically, or
+        remove it once empty
+        '''
+        if not self.results:
+            if self.path.exists():
+                os.remove(self.path)
+            return
+
+        if not self.path.parent.exists():
+            os.makedirs(str(self.path.parent))
+
+        tmp_path = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, mode='w') as f:
+            json.dump({
+                'attempts': self.attempts,
+                'next_attempt': self.next_attempt,
+                'results': list(self.results.values())
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def add(
+        self,
+        checkresults: Iterable[NagiosCheckResult]
+    ):
+        '''
+        Spool results, replacing the spooled results of the same host and
+        service
+        '''
+        now = time.time()
+        for result in checkresults:
+            self.results[(result.hostname, result.servicename)] = {
+                'hostname': result.hostname,
+                'servicename': result.servicename,
+                'state': result.state,
+                'output': result.output,
+                'time': now
+            }
+        if not self.next_attempt:
+            self.next_attempt = now + self.backoff
+        self.save()
+
+    def discard(
+        self,
+        checkresults: Iterable[NagiosCheckResult]
+    ):
+        '''
+        Drop the spooled results superseded by results that were submitted
+        '''
+        if not self.results:
+            return
+        count = len(self.results)
+        for result in checkresults:
+            self.results.pop((result.hostname, result.servicename), None)
+        if len(self.results) != count:
+            self.save()
+
+    def retry(
+        self,
+        submit_results: Callable[[NagiosCheckResults], None],
+        force: bool = False
+    ) -> bool:
+        '''
+        Submit the spooled results if they are due to be retried
+
+        Parameters
+        ----------
+        submit_results: Callable
+            Function submitting check results to Nagios
+
+        force: bool
+            Whether to retry regardless of the backoff, for instance once
+            Nagios accepted other results
+
+        Returns
+        -------
+        bool: Whether the spool is empty
+        '''
+        if not self.results:
+            return True
+        if not force and time.time() < self.next_attempt:
+            return False
+
+        logging.info(f'Retrying {len(self.results)} spooled results')
+        pending = list(self.results.items())
+        while pending:
+            batch = pending[:self.batch_size or len(pending)]
+            try:
+                submit_results(NagiosCheckResults(
+                    NagiosCheckResult(
+                        hostname=result['hostname'],
+                        servicename=result['servicename'],
+                        state=result['state'],
+                        output=result['output']
+                    ) for _, result in batch))
+            except self.retry_errors as e:
+                self.attempts += 1
+                self.next_attempt = time.time() + min(
+                    self.backoff * 2 ** self.attempts, self.max_backoff)
+                logging.warning(
+                    'Could not submit spooled results, ' +
+                    f'{len(self.results)} left: {e}')
+                self.save()
+                return False
+            for key, _ in batch:
+                del self.results[key]
+            pending = pending[len(batch):]
+
+        self.attempts = 0
+        self.next_attempt = 0.0
+        self.save()
+        return True
+
+    def submitting(
+        self,
+        submit_results: Callable[[NagiosCheckResults], None]
+    ) -> Callable[[NagiosCheckResults], None]:
+        '''
+        Wrap a function submitting results so results that cannot be
+        submitted are spooled rather than raised, and spooled results are
+        retried once Nagios accepts results again
+
+        Parameters
+        ----------
+        submit_results: Callable
+            Function submitting check results to Nagios
+
+        Returns
+        -------
+        Callable: The wrapped function
+        '''
+        def submit(checkresults: NagiosCheckResults):
+            try:
+                submit_results(checkresults)
+            except self.retry_errors as e:
+                logging.warning(
+                    f'Could not submit {len(checkresults)} results, ' +
+                    f'spooling them to {self.path}: {e}')
+                self.add(checkresults)
+                return
+            self.discard(checkresults)
+            self.retry(submit_results, force=True)
+
+        return submit
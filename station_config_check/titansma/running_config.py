@@ -1,10 +1,18 @@
 import logging
-from typing import List
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
 from dataclasses import dataclass
-from station_config_check.config_check import web_interface
+from station_config_check.lazy_import import lazy_import
 from station_config_check.nagios import nagios_api
+from station_config_check.nagios.inventory_cache import InventoryCache
 import configparser
 
+# The HTTP client is only loaded once configs are downloaded
+if TYPE_CHECKING:
+    from station_config_check.config_check import web_interface
+else:
+    web_interface = lazy_import(
+        'station_config_check.config_check.web_interface')
+
 
 class CredFileError(Exception):
     pass
@@ -18,10 +26,11 @@ class TitanSMACred():
 
 def get_titansma_list(
     nagios_ip: str,
-    api_key: str
-) -> List[nagios_api.NagiosHost]:
+    api_key: str,
+    inventory_cache: Optional[InventoryCache] = None
+) -> Iterable[nagios_api.NagiosHost]:
     '''
-    Get a list of all members of the TitanSMA hostgroup from nagios
+    Get all members of the TitanSMA hostgroup from nagios
 
     Parameters
     ----------
@@ -31,27 +40,32 @@ def get_titansma_list(
     api_key: str
         The api key used to retrieve the information from Nagios
 
+    inventory_cache: InventoryCache
+        Cache to take the hostgroup members from instead of querying each of
+        them from Nagios. Only their current state is refreshed.
+
     Returns
     -------
-    List: A list of NagiosHost objects containing hostnames, ip addresses, etc
+    Iterable: NagiosHost objects containing hostnames, ip addresses, etc.
+    Without a cache, hosts are queried from Nagios as they are iterated over.
     '''
-    titansma_list = nagios_api.fetch_hostgroup_members(
-        hostgroup_name='titan-sma',
-        nagios_ip=nagios_ip,
-        api_key=api_key
-    )
-
-    host_list: List[nagios_api.NagiosHost] = []
-
-    for titansma in titansma_list:
-        nagioshost = nagios_api.fetch_host_information(
-            host_name=titansma,
+    def fetch() -> Iterator[nagios_api.NagiosHost]:
+        return nagios_api.iter_hostgroup_hosts(
+            hostgroup_name='titan-sma',
             nagios_ip=nagios_ip,
             api_key=api_key,
             get_type=True
         )
-        host_list.append(nagioshost)
-    return host_list
+
+    if inventory_cache is None:
+        return fetch()
+
+    return inventory_cache.get_hosts(
+        hostgroup_name='titan-sma',
+        nagios_ip=nagios_ip,
+        api_key=api_key,
+        fetch=fetch
+    )
 
 
 def get_running_config(
@@ -74,19 +88,26 @@ def get_running_config(
 
     str: The running config of the TitanSMA as a single string
     '''
+    # The opener is kept local to this download so that configs can be
+    # downloaded from several TitanSMAs at the same time
     cookieJar = web_interface.GlobalCookieJar()
-    cookieJar = cookieJar.addCookieToAllRequests()
+    # The key, login and config requests share a single connection
+    keepAlive = web_interface.KeepAliveHandler()
 
     digitizerInterface = web_interface.DigitizerInterface(
         address=titan_sma.ip_address,
         username=credentials.username,
-        password=credentials.password)
+        password=credentials.password,
+        opener=cookieJar.getOpener(keepAlive))
 
-    logging.debug(f"Trying to log into {titan_sma.hostname}")
-    digitizerInterface.login(cookieJar)
+    try:
+        logging.debug(f"Trying to log into {titan_sma.hostname}")
+        digitizerInterface.login(cookieJar)
 
-    logging.debug(f'Trying to download config for {titan_sma.hostname}')
-    config = digitizerInterface.getConfiguration()
+        logging.debug(f'Trying to download config for {titan_sma.hostname}')
+        config = digitizerInterface.getConfiguration()
+    finally:
+        keepAlive.close()
 
     return config
 
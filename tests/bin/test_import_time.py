@@ -0,0 +1,50 @@
+import subprocess
+import sys
+from typing import Dict
+import pytest
+
+# Modules only needed by some stages of a run, which must not be loaded when
+# an entry point starts
+DEFERRED = (
+    'requests',
+    'sqlite3',
+    'multiprocessing',
+    'cProfile',
+    'tracemalloc',
+    'difflib',
+    'xml.etree.ElementTree',
+    'http.cookiejar',
+)
+
+# Cumulative import time of an entry point in microseconds, several times
+# what it takes so that slow machines do not fail the test
+BUDGET = 300000
+
+
+def import_times(module: str) -> Dict[str, int]:
+    '''
+    Get the cumulative import time of each module loaded when importing a
+    module in a new interpreter
+    '''
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True)
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize('entry_point', [
+    'station_config_check.bin.check_all_titansma',
+    'station_config_check.bin.check_all_fortimus',
+    'station_config_check.bin.rebaseline',
+])
+def test_import_time(entry_point):
+    times = import_times(entry_point)
+
+    assert [name for name in DEFERRED if name in times] == []
+    assert times[entry_point] < BUDGET
@@ -0,0 +1,31 @@
+from station_config_check.config_check import diff_cache
+from station_config_check.config_check.diff_pool import DiffPool
+
+
+def test_diff_cache(tmp_path):
+    cache = diff_cache.DiffCache(str(tmp_path / 'diffs.db'), max_entries=2)
+
+    assert cache.get('a', 'b') is None
+    cache.put('a', 'b', 50.0, ['line'])
+    assert cache.get('a', 'b') == (50.0, ['line'])
+
+    # The least recently used comparison is evicted once the cache is full
+    cache.put('a', 'c', 60.0, [])
+    cache.get('a', 'b')
+    cache.put('a', 'd', 70.0, [])
+    assert cache.get('a', 'c') is None
+    assert cache.get('a', 'b') == (50.0, ['line'])
+
+
+def test_diff_pool_cache(tmp_path):
+    cache = diff_cache.DiffCache(str(tmp_path / 'diffs.db'))
+    pool = DiffPool(diff_cache=cache)
+
+    first = pool.submit('XX-STA1-TITAN', 'a\nb\n', 'a\nc\n').result()
+    assert cache.get(
+        diff_cache.config_digest('a\nb\n'),
+        diff_cache.config_digest('a\nc\n')) is not None
+
+    second = pool.submit('XX-STA2-TITAN', 'a\nb\n', 'a\nc\n').result()
+    assert second['hostname'] == 'XX-STA2-TITAN'
+    assert second['output'] == first['output']
@@ -0,0 +1,53 @@
+from station_config_check.config_check import compare_config, diff_pool
+
+
+def test_diff_pool():
+    golden_image = 'setting1 on\nsetting2 off\n' * 50
+    running_config = 'setting1 on\nsetting2 on\n' * 50
+
+    expected = compare_config.get_config_check_results(
+        hostname='DummyHost',
+        golden_image=golden_image,
+        running_config=running_config
+    )
+
+    with diff_pool.DiffPool(workers=1, threshold=1000) as pool:
+        inline = pool.submit('DummyHost', 'a', 'a')
+        offloaded = pool.submit('DummyHost', golden_image, running_config)
+
+        assert inline.done()
+        assert inline.result()['state'] == 0
+        assert offloaded.result() == expected
+
+
+def test_diff_pool_dedup(caplog):
+    pool = diff_pool.DiffPool()
+
+    results = [
+        pool.submit(f'XX-STA{i}-TITAN', 'a\nb\n', 'a\nc\n' if i else 'a\nb\n')
+        for i in range(4)]
+
+    assert pool.submitted == 4
+    assert pool.compared == 2
+    assert [result.result()['state'] for result in results] == [0, 2, 2, 2]
+    assert results[3].result()['hostname'] == 'XX-STA3-TITAN'
+
+    pool.report()
+    assert pool.submitted == 0
+    # The dedup ratio shows at the default log level
+    assert [
+        record.levelname for record in caplog.records
+        if 'dedup ratio 2.00' in record.getMessage()] == ['WARNING']
+
+
+def test_diff_pool_bounded():
+    pool = diff_pool.DiffPool(max_shared=2)
+
+    for i in range(10):
+        pool.submit(f'XX-STA{i}-TITAN', 'a\n', f'a\n{i}\n').result()
+    # The first config was dropped, and is compared again
+    pool.submit('XX-STA0-TITAN', 'a\n', 'a\n0\n').result()
+
+    assert len(pool._comparisons) == 2
+    assert pool.compared == 11
+    assert pool.distinct == 11
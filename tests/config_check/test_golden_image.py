@@ -0,0 +1,96 @@
+import pytest
+from station_config_check.config_check import golden_image
+
+
+def test_golden_image_template(tmp_path):
+    templates = tmp_path / 'templates' / 'titansma'
+    templates.mkdir(parents=True)
+    (templates / 'vault.txt').write_text(
+        'station ${STATION}\nip ${IP_ADDRESS}\ngain ${GAIN}\n' +
+        'password $$1$$salt$hash $STATION\n')
+
+    override_dir = tmp_path / 'XX' / 'STA2' / 'titansma'
+    override_dir.mkdir(parents=True)
+    (override_dir / 'override.txt').write_text('# gain\nGAIN = 2\n')
+
+    store = golden_image.GoldenImageStore(str(tmp_path), 'titansma')
+
+    assert store.load(
+        'XX-STA1-TITAN', 'vault', {'IP_ADDRESS': '10.0.0.1'}) == \
+        'station STA1\nip 10.0.0.1\ngain ${GAIN}\n' + \
+        'password $$1$$salt$hash $STATION\n'
+    assert store.load(
+        'XX-STA2-TITAN', 'vault', {'IP_ADDRESS': '10.0.0.2'}) == \
+        'station STA2\nip 10.0.0.2\ngain 2\n' + \
+        'password $$1$$salt$hash $STATION\n'
+
+    # A golden image of the host takes precedence over the template
+    store.write('XX-STA2-TITAN', 'own config\n')
+    assert store.load('XX-STA2-TITAN', 'vault') == 'own config\n'
+
+    with pytest.raises(golden_image.GoldenImageMissing):
+        store.load('XX-STA3-TITAN', 'surface')
+
+
+@pytest.mark.parametrize('image_format', ['gzip', 'zdict'])
+def test_golden_image_compressed(tmp_path, image_format):
+    golden_image.write_golden_image(
+        str(tmp_path), 'XX-STA1-TITAN', 'gain 1\nstation STA1\n', 'titansma')
+    golden_image.write_golden_image(
+        str(tmp_path), 'XX-STA2-TITAN', 'gain 1\nstation STA2\n', 'titansma')
+
+    store = golden_image.GoldenImageStore(
+        str(tmp_path), 'titansma', image_format=image_format)
+    assert store.load('XX-STA1-TITAN') == 'gain 1\nstation STA1\n'
+
+    # The plain text image is replaced by the compressed one
+    store.write('XX-STA1-TITAN', 'gain 2\nstation STA1\n')
+    host_dir = tmp_path / 'XX' / 'STA1' / 'titansma'
+    assert [path.name for path in host_dir.iterdir()] == \
+        [golden_image.GOLDEN_IMAGE_FORMATS[image_format]]
+    assert store.load('XX-STA1-TITAN') == 'gain 2\nstation STA1\n'
+    assert golden_image.load_golden_image(
+        str(tmp_path), 'XX-STA1-TITAN', 'titansma') == \
+        'gain 2\nstation STA1\n'
+
+    if image_format == 'zdict':
+        # Images compressed with a previous dictionary remain readable
+        dictionary = golden_image.current_golden_dictionary(
+            str(tmp_path), 'titansma')
+        assert dictionary == b'gain 1\n'
+        golden_image.write_golden_image(
+            str(tmp_path), 'XX-STA3-TITAN', 'gain 2\nstation STA3\n',
+            'titansma')
+        assert golden_image.train_golden_dictionary(
+            str(tmp_path), 'titansma') == b'gain 2\n'
+        assert golden_image.load_golden_image(
+            str(tmp_path), 'XX-STA1-TITAN', 'titansma') == \
+            'gain 2\nstation STA1\n'
+
+
+@pytest.mark.parametrize('image_format', ['gzip', 'zdict'])
+def test_golden_image_truncated(tmp_path, image_format):
+    config = ''.join(f'setting{i} {i * 7919 % 1000}\n' for i in range(5000))
+    store = golden_image.GoldenImageStore(
+        str(tmp_path), 'titansma', image_format=image_format)
+    store.write('XX-STA1-TITAN', config)
+
+    path = tmp_path / 'XX' / 'STA1' / 'titansma' / \
+        golden_image.GOLDEN_IMAGE_FORMATS[image_format]
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) // 2])
+
+    with pytest.raises(golden_image.GoldenImageUnreadable):
+        golden_image.load_golden_image(
+            str(tmp_path), 'XX-STA1-TITAN', 'titansma')
+
+
+def test_golden_image_cache_bounded(tmp_path):
+    store = golden_image.GoldenImageStore(
+        str(tmp_path), 'titansma', max_cached=2)
+    for i in range(5):
+        store.write(f'XX-STA{i}-TITAN', f'station STA{i}\n')
+    for i in range(5):
+        assert store.load(f'XX-STA{i}-TITAN') == f'station STA{i}\n'
+
+    assert list(store._cache) == ['XX-STA3-TITAN', 'XX-STA4-TITAN']
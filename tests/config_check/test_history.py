@@ -0,0 +1,35 @@
+from station_config_check.config_check.compare_config import \
+    build_config_check_results
+from station_config_check.config_check.history import SimilarityHistory
+
+
+def test_similarity_history(tmp_path):
+    path = str(tmp_path / 'similarity')
+    history = SimilarityHistory(path)
+    for day, values in enumerate([(100, 100), (100, 100), (98.5, 100),
+                                  (97, 100), (100, 100)]):
+        for host, value in enumerate(values):
+            history.record(f'XX-STA{host}-TITAN', value, day * 86400)
+        history.flush()
+
+    # Points are only stored when the similarity changes, and the history is
+    # read back by a new run
+    history = SimilarityHistory(path)
+    assert history.series('XX-STA0-TITAN') == [
+        (0, 100), (2 * 86400, 98.5), (3 * 86400, 97), (4 * 86400, 100)]
+    assert history.series('XX-STA1-TITAN') == [(0, 100)]
+
+    drifts = {drift.hostname: drift for drift in history.drift(86400)}
+    assert (drifts['XX-STA0-TITAN'].start, drifts['XX-STA0-TITAN'].lowest,
+            drifts['XX-STA0-TITAN'].current) == (100, 97, 100)
+    drift = history.drift(2.5 * 86400, ['XX-STA0-TITAN'])[0]
+    assert (drift.start, drift.lowest, drift.changed) == \
+        (98.5, 97, 4 * 86400)
+
+    # Results of config checks are recorded as they are emitted
+    emitted = []
+    emit = history.recording(emitted.append)
+    emit(build_config_check_results('XX-STA1-TITAN', 90.0, ['changed']))
+    history.flush()
+    assert len(emitted) == 1
+    assert SimilarityHistory(path).series('XX-STA1-TITAN')[-1][1] == 90
@@ -0,0 +1,29 @@
+from station_config_check.config_check import compare_config, interning
+
+
+def test_line_table():
+    table = interning.LineTable()
+
+    assert list(table.intern(['a', 'b', 'a'])) == [0, 1, 0]
+    assert list(table.intern(['b', 'c'])) == [1, 2]
+    assert len(table) == 3
+
+
+def test_compare_interned():
+    golden_image = '\n'.join(f'setting{i} "{i % 3}"' for i in range(300))
+    running = golden_image.split('\n')
+    running[10] = 'setting10 "changed"'
+    running.insert(50, 'new setting')
+    del running[200]
+    running_config = '\n'.join(running)
+
+    percentage, differences = interning.compare_interned(
+        golden_image=golden_image, running_config=running_config)
+
+    assert differences == compare_config.diff_list(
+        golden_image=golden_image, running_config=running_config)
+    assert differences == [' setting10 "changed"', ' new setting']
+    assert round(percentage, 2) == 99.33
+
+    assert interning.compare_interned(golden_image, golden_image) == \
+        (100.0, [])
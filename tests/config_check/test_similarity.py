@@ -0,0 +1,84 @@
+import random
+import time
+from station_config_check.config_check import similarity
+
+
+def make_config(generator: random.Random, changes: int) -> str:
+    lines = [f'setting{i} "{i % 7}"' for i in range(400)]
+    for i in generator.sample(range(len(lines)), changes):
+        lines[i] = f'setting{i} "changed{generator.random()}"'
+    return '\n'.join(lines)
+
+
+def test_find_outliers():
+    generator = random.Random(0)
+    sketches = {
+        f'station{i}': similarity.minhash_signature(
+            make_config(generator, changes=5))
+        for i in range(20)
+    }
+    sketches['misconfigured'] = similarity.minhash_signature(
+        make_config(generator, changes=300))
+
+    scores = similarity.find_outliers(sketches)
+
+    assert scores[0].hostname == 'misconfigured'
+    assert scores[0].similarity < 50
+    assert all(score.similarity > 90 for score in scores[1:])
+    assert len(scores[1].neighbours) == 3
+
+
+def test_outlier_check_results(tmp_path):
+    store = similarity.SketchStore(path=str(tmp_path / 'sketches.json'))
+    store.add('station0', 'a\nb\nc')
+    store.add('station1', 'a\nb\nc')
+    store.add('station2', 'd\ne\nf')
+    store.save()
+
+    sketches = similarity.SketchStore(path=str(tmp_path / 'sketches.json'))
+    scores = {
+        score.hostname: score
+        for score in similarity.find_outliers(sketches.sketches)
+    }
+
+    assert scores['station0'].neighbours == [('station1', 1.0)]
+    assert similarity.build_outlier_check_results(
+        scores['station0'])['state'] == 0
+    result = similarity.build_outlier_check_results(scores['station2'])
+    assert result['state'] == 1
+    # Nagios alerts on similarities below the threshold
+    assert "'Nearest'=0.0%;50:;;;" in result['output']
+
+
+def test_sketch_store_shards(tmp_path):
+    path = str(tmp_path / 'sketches.json')
+    store = similarity.SketchStore(path=path)
+    store.add('decommissioned', 'a\nb\nc')
+    store.seen['decommissioned'] -= 40 * 86400
+    store.add('station0', 'a\nb\nc')
+    store.save()
+
+    # Two shards read the file and save one after the other
+    shard1 = similarity.SketchStore(path=path)
+    shard2 = similarity.SketchStore(path=path)
+    shard1.add('station1', 'a\nb\nc')
+    shard2.add('station2', 'd\ne\nf')
+    shard1.save()
+    shard2.save()
+
+    assert sorted(similarity.SketchStore(path=path).sketches) == \
+        ['station0', 'station1', 'station2']
+
+
+def test_find_outliers_identical():
+    signature = similarity.minhash_signature('a\nb\nc')
+    sketches = {f'station{i:04}': signature for i in range(3000)}
+
+    start = time.monotonic()
+    scores = similarity.find_outliers(sketches)
+
+    # Identical configs are scored once rather than against each other
+    assert time.monotonic() - start < 2
+    assert len(scores) == 3000
+    assert scores[0].neighbours == [
+        ('station0001', 1.0), ('station0002', 1.0), ('station0003', 1.0)]
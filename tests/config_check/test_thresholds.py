@@ -0,0 +1,47 @@
+import configparser
+import pytest
+from station_config_check.config_check.compare_config import \
+    build_config_check_results
+from station_config_check.config_check.thresholds import load_thresholds
+from station_config_check.nagios import range_check
+from station_config_check.nagios.models import NagiosOutputCode, NagiosRange
+
+
+def test_range():
+    assert [NagiosRange('10').in_range(value) for value in (-1, 5, 11)] == \
+        [True, False, True]
+    assert NagiosRange('~:10').in_range(11)
+    assert not NagiosRange('10:').in_range(10)
+    assert NagiosRange('@10:20').in_range(15)
+    assert range_check(95, '100:') and not range_check(100, 100.0)
+    with pytest.raises(ValueError):
+        NagiosRange('1:2:3')
+
+
+def test_thresholds():
+    config = configparser.ConfigParser()
+    config.read_string(
+        '[threshold:titansma]\n'
+        'warning = 100:\n'
+        'critical = 90:\n'
+        '[threshold:titansma:vault]\n'
+        'critical =\n')
+    thresholds = load_thresholds(config, 'titansma')
+
+    states = [
+        build_config_check_results(
+            'XX-STA1-TITAN', percentage, [],
+            thresholds.get(install_type))['state']
+        for install_type, percentage in [
+            ('surface', 100), ('surface', 95), ('surface', 80),
+            ('vault', 80)]]
+    assert states == [NagiosOutputCode.ok, NagiosOutputCode.warning,
+                      NagiosOutputCode.critical, NagiosOutputCode.warning]
+
+    # Checks are critical as soon as configs differ by default, and the
+    # ranges are carried in the performance data
+    result = build_config_check_results('XX-STA1-TITAN', 99.5, ['changed'])
+    assert result['state'] == NagiosOutputCode.critical
+    assert "'Config'=99.5%;;100:;;" in result['output']
+    default = load_thresholds(configparser.ConfigParser(), 'fortimus')
+    assert default.get('vault').evaluate(100) == NagiosOutputCode.ok
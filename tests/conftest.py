@@ -0,0 +1,22 @@
+from typing import Callable
+import pytest
+from station_config_check.nagios.nagios_api import NagiosHost
+
+
+@pytest.fixture
+def make_host() -> Callable[..., NagiosHost]:
+    '''
+    Factory of NagiosHost objects, with defaults for every field but the
+    hostname
+    '''
+    def make(
+        hostname: str,
+        ip_address: str = '10.0.0.1',
+        install_type: str = 'default',
+        status: int = 0
+    ) -> NagiosHost:
+        return NagiosHost(
+            hostname=hostname, ip_address=ip_address,
+            install_type=install_type, status=status)
+
+    return make
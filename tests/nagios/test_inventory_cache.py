@@ -0,0 +1,65 @@
+import json
+from station_config_check.nagios import inventory_cache, nagios_api
+
+
+def test_inventory_cache(tmp_path, monkeypatch, make_host):
+    cache = inventory_cache.InventoryCache(cache_dir=str(tmp_path), ttl=3600)
+    fetched = []
+
+    def fetch():
+        fetched.append(True)
+        return [make_host('XX-STA1-TITAN'), make_host('XX-STA2-TITAN')]
+
+    monkeypatch.setattr(
+        nagios_api, 'fetch_host_states',
+        lambda **kwargs: {'XX-STA1-TITAN': 1})
+
+    hosts = cache.get_hosts('titan-sma', '127.0.0.1', 'key', fetch)
+    assert len(fetched) == 1
+    assert [host.status for host in hosts] == [0, 0]
+
+    # The cached inventory is used and only the states are refreshed
+    hosts = cache.get_hosts('titan-sma', '127.0.0.1', 'key', fetch)
+    assert len(fetched) == 1
+    assert [host.status for host in hosts] == [1, 0]
+
+
+def test_stale_inventory_cache(tmp_path, monkeypatch, make_host):
+    cache = inventory_cache.InventoryCache(cache_dir=str(tmp_path), ttl=0)
+    cache.write('titan-sma', [make_host('XX-STA1-TITAN')])
+
+    def fetch():
+        raise ConnectionError('Nagios is down')
+
+    def fetch_host_states(**kwargs):
+        raise ConnectionError('Nagios is down')
+
+    monkeypatch.setattr(nagios_api, 'fetch_host_states', fetch_host_states)
+
+    # The last good inventory is used while Nagios cannot be reached
+    hosts = cache.get_hosts('titan-sma', '127.0.0.1', 'key', fetch)
+    cache.wait()
+    assert [host.hostname for host in hosts] == ['XX-STA1-TITAN']
+    with open(tmp_path / 'titan-sma.json') as f:
+        assert json.load(f)['hosts'][0]['hostname'] == 'XX-STA1-TITAN'
+
+
+def test_inventory_cache_without_age(tmp_path, monkeypatch, make_host):
+    cache = inventory_cache.InventoryCache(cache_dir=str(tmp_path), ttl=3600)
+    cache.write('titan-sma', [make_host('XX-STA1-TITAN')])
+    with open(tmp_path / 'titan-sma.json') as f:
+        cached = json.load(f)
+    del cached['fetched_at']
+    with open(tmp_path / 'titan-sma.json', mode='w') as f:
+        json.dump(cached, f)
+
+    monkeypatch.setattr(
+        nagios_api, 'fetch_host_states', lambda **kwargs: {})
+
+    # The cached hosts are used while the inventory is refreshed
+    hosts = cache.get_hosts(
+        'titan-sma', '127.0.0.1', 'key',
+        lambda: [make_host('XX-STA2-TITAN')])
+    cache.wait()
+    assert [host.hostname for host in hosts] == ['XX-STA1-TITAN']
+    assert cache.read('titan-sma')['hosts'] == [make_host('XX-STA2-TITAN')]
@@ -0,0 +1,86 @@
+from typing import List, Optional
+from station_config_check.nagios import nagios_api
+
+
+class FakeResponse:
+    def __init__(self, content: dict):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+    def json(self) -> dict:
+        return self.content
+
+
+def test_iter_hostgroup_hosts(monkeypatch):
+    host_names = [f'XX-STA{i}-TITAN' for i in range(5)]
+    requested: List[str] = []
+
+    def get(
+        url: str,
+        params: Optional[dict] = None,
+        timeout: Optional[float] = None
+    ):
+        if params is None:
+            assert 'pretty' not in url
+            return FakeResponse({'hostgroup': [{'members': {'host': [
+                {'host_name': host_name} for host_name in host_names]}}]})
+
+        object_type = url.rsplit('/', 1)[1]
+        requested.append(f"{object_type} {params['records']}")
+        amount, offset = (int(n) for n in params['records'].split(':'))
+        # Nagios only knows of the first four hosts
+        names = [
+            host_name for host_name in params['host_name'][3:].split(',')
+            if host_name != 'XX-STA4-TITAN'][offset:offset + amount]
+        if object_type == 'hoststatus':
+            records = [
+                {'host_name': name, 'address': '10.0.0.1',
+                 'current_state': '0'} for name in names]
+        else:
+            assert params['customvars'] == 1
+            records = [
+                {'host_name': name,
+                 'customvars': {'INSTALL_TYPE': 'nrcan'}} for name in names]
+        return FakeResponse({object_type: records})
+
+    monkeypatch.setattr(nagios_api.requests, 'get', get)
+
+    hosts = nagios_api.iter_hostgroup_hosts(
+        hostgroup_name='titan-sma',
+        nagios_ip='127.0.0.1',
+        api_key='key',
+        get_type=True,
+        page_size=2)
+
+    # Pages are only queried as the hosts are iterated over
+    assert next(hosts).hostname == 'XX-STA0-TITAN'
+    assert requested == ['hoststatus 3:0', 'host 3:0']
+
+    assert [host.hostname for host in hosts] == \
+        ['XX-STA1-TITAN', 'XX-STA2-TITAN', 'XX-STA3-TITAN']
+    assert requested[2:] == [
+        'hoststatus 3:0', 'host 3:0', 'hoststatus 2:0', 'host 2:0']
+
+
+def test_iter_object_query(monkeypatch):
+    def get(
+        url: str,
+        params: Optional[dict] = None,
+        timeout: Optional[float] = None
+    ):
+        assert params is not None
+        amount, offset = (int(n) for n in params['records'].split(':'))
+        return FakeResponse({'host': [
+            {'host_name': f'host{i}'}
+            for i in range(offset, min(offset + amount, 5))]})
+
+    monkeypatch.setattr(nagios_api.requests, 'get', get)
+
+    records = nagios_api.iter_object_query(
+        nagios_ip='127.0.0.1', object_type='host', api_key='key',
+        page_size=2)
+
+    assert [record['host_name'] for record in records] == \
+        [f'host{i}' for i in range(5)]
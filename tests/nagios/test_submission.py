@@ -0,0 +1,55 @@
+import pytest
+from station_config_check.nagios import submission
+from station_config_check.nagios.nrdp import NagiosCheckResult, \
+    NagiosCheckResults
+
+RESULTS = NagiosCheckResults([
+    NagiosCheckResult('XX-STA1-TITAN', 'Config Check', 2, 'Changed\nline'),
+    NagiosCheckResult('XX-STA2-TITAN', '', 0, 'Up'),
+])
+
+
+def test_command_file(tmp_path):
+    path = tmp_path / 'nagios.cmd'
+    path.touch()
+    backend = submission.open_backend('command-file', path=str(path))
+    backend.submit(RESULTS)
+
+    commands = [line.split('] ', 1)[1]
+                for line in path.read_text().splitlines()]
+    assert commands == [
+        'PROCESS_SERVICE_CHECK_RESULT;XX-STA1-TITAN;Config Check;2;' +
+        'Changed\\nline',
+        'PROCESS_HOST_CHECK_RESULT;XX-STA2-TITAN;0;Up',
+    ]
+
+
+def test_checkresults_dir(tmp_path):
+    backend = submission.open_backend('checkresults', path=str(tmp_path))
+    backend.submit(RESULTS)
+
+    names = sorted(path.name for path in tmp_path.iterdir())
+    assert len(names) == 2 and names[1] == names[0] + '.ok'
+    assert len(names[0]) == 7 and names[0].startswith('c')
+    content = (tmp_path / names[0]).read_text()
+    assert 'service_description=Config Check\n' in content
+    assert 'return_code=2\noutput=Changed\\nline\n' in content
+
+
+def test_jsonl(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    backend = submission.open_backend('jsonl', path=path)
+    backend.submit(RESULTS)
+    backend.close()
+    assert submission.read_results(path) == RESULTS
+
+    with pytest.raises(submission.InvalidBackend):
+        submission.open_backend('jsonl')
+
+
+def test_incomplete_backend():
+    class Incomplete(submission.SubmissionBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,71 @@
+from station_config_check.config_check.diff_pool import DiffPool
+from station_config_check.config_check.golden_image import GoldenImageStore
+from station_config_check.nagios.nagios_api import NagiosHost
+from station_config_check.runner import archive
+
+
+def test_record_and_replay(tmp_path):
+    recorder = archive.SweepRecorder(str(tmp_path / 'records'), 'titansma')
+    fetch = recorder.record_fetch(
+        lambda host: f'setting {host.ip_address}\n')
+    for i in range(3):
+        fetch(NagiosHost(
+            hostname=f'XX-STA{i}-TITAN', ip_address=f'10.0.0.{i}',
+            install_type='default', status=0, link_class='vsat'))
+    recorder.close()
+
+    records = list(archive.read_archive(recorder.path))
+    assert [host.link_class for host, _ in records] == ['vsat'] * 3
+    assert records[2][1] == 'setting 10.0.0.2\n'
+
+    golden_images = GoldenImageStore(str(tmp_path / 'golden'), 'titansma')
+    golden_images.write('XX-STA0-TITAN', 'setting 10.0.0.0\n')
+    golden_images.write('XX-STA1-TITAN', 'setting 10.0.0.9\n')
+    golden_files = sorted(
+        (str(path), path.read_bytes())
+        for path in (tmp_path / 'golden').rglob('*') if path.is_file())
+
+    output = tmp_path / 'replay.xml'
+    results = archive.run_replay(
+        path=recorder.path,
+        golden_images=golden_images,
+        diff_pool=DiffPool(),
+        output=str(output)
+    )
+
+    states = dict((result.hostname, result.state) for result in results)
+    assert states == {
+        'XX-STA0-TITAN': 0, 'XX-STA1-TITAN': 2, 'XX-STA2-TITAN': 3}
+    assert output.read_bytes().startswith(b'<checkresults>')
+    # Replays never write golden images, even for hosts without one
+    assert sorted(
+        (str(path), path.read_bytes())
+        for path in (tmp_path / 'golden').rglob('*')
+        if path.is_file()) == golden_files
+    assert [
+        result.output for result in results
+        if result.hostname == 'XX-STA2-TITAN'
+    ] == ['No Golden Image present.']
+
+
+def test_record_rotate(tmp_path, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(archive.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(archive.time, 'strftime', lambda _: f'{now[0]:.0f}')
+    recorder = archive.SweepRecorder(
+        str(tmp_path), 'titansma', rotate_after=60)
+
+    paths = []
+    for i in range(3):
+        recorder.record(NagiosHost(
+            hostname=f'XX-STA{i}-TITAN', ip_address=f'10.0.0.{i}',
+            install_type='default', status=0), f'setting {i}\n')
+        paths.append(recorder.path)
+        now[0] += 40
+    recorder.close()
+
+    assert paths[0] == paths[1] != paths[2]
+    assert [host.hostname for host, _ in archive.read_archive(paths[0])] == \
+        ['XX-STA0-TITAN', 'XX-STA1-TITAN']
+    assert [config for _, config in archive.read_archive(paths[2])] == \
+        ['setting 2\n']
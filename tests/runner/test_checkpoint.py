@@ -0,0 +1,58 @@
+import os
+import socket
+import subprocess
+import sys
+import pytest
+from station_config_check.nagios.nagios_api import NagiosHost
+from station_config_check.runner.checkpoint import Checkpoint, RunLock, \
+    RunLocked
+
+
+def test_run_lock(tmp_path):
+    path = str(tmp_path / 'check.lock')
+
+    with RunLock(path=path):
+        with open(path, mode='r') as f:
+            assert f.read() == f'{socket.gethostname()}:{os.getpid()}'
+        with pytest.raises(RunLocked):
+            RunLock(path=path).acquire()
+    # The lock file is kept, the lock itself is released
+    assert os.path.exists(path)
+    with RunLock(path=path):
+        pass
+
+
+def test_run_lock_dead_process(tmp_path):
+    path = str(tmp_path / 'check.lock')
+    code = (
+        'import os, sys\n'
+        'from station_config_check.runner.checkpoint import RunLock\n'
+        f'RunLock(path={path!r}).acquire()\n'
+        'os._exit(0)\n')
+
+    # A run killed while holding the lock leaves it free
+    subprocess.run([sys.executable, '-c', code], check=True)
+    with RunLock(path=path):
+        pass
+
+
+def test_checkpoint_resume(tmp_path):
+    path = str(tmp_path / 'check.journal')
+    hosts = [
+        NagiosHost(
+            hostname=f'station{i}', ip_address='', install_type='', status=0)
+        for i in range(5)
+    ]
+
+    checkpoint = Checkpoint(path=path)
+    assert list(checkpoint.filter(hosts)) == hosts
+    checkpoint.record(['station0', 'station3'])
+
+    # The run is interrupted and restarted
+    resumed = Checkpoint(path=path)
+    assert [host.hostname for host in resumed.filter(hosts)] == \
+        ['station1', 'station2', 'station4']
+    resumed.complete()
+
+    assert list(Checkpoint(path=path).filter(hosts)) == hosts
+    assert Checkpoint(path=path, max_age=-1).done == set()
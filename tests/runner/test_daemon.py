@@ -0,0 +1,71 @@
+import threading
+from station_config_check.nagios.nrdp import NagiosCheckResult
+from station_config_check.runner import daemon
+
+
+def test_rolling_schedule(make_host):
+    schedule = daemon.RollingSchedule(interval=10, jitter=0.1)
+    schedule.update_inventory([make_host('A'), make_host('B')])
+
+    next_due = schedule.next_due()
+    assert next_due is not None
+    due = schedule.pop_due(next_due + 10)
+    assert sorted(host.hostname for host in due) == ['A', 'B']
+
+    # Removed hosts are no longer returned
+    schedule.update_inventory([make_host('A')])
+    due = schedule.pop_due(next_due + 30)
+    assert [host.hostname for host in due] == ['A']
+
+
+def test_run_daemon(make_host):
+    stop = threading.Event()
+    submitted = []
+
+    def check(hosts):
+        stop.set()
+        return [NagiosCheckResult(hostname=host.hostname) for host in hosts]
+
+    daemon.run_daemon(
+        load_inventory=lambda: [make_host('A')],
+        check=check,
+        submit_results=submitted.extend,
+        interval=0,
+        inventory_refresh=60,
+        stop=stop)
+
+    assert [result['hostname'] for result in submitted] == ['A']
+
+
+def test_run_daemon_failures(make_host):
+    stop = threading.Event()
+    checks = []
+    submitted = []
+
+    def check(hosts):
+        checks.append(hosts)
+        if len(checks) == 1:
+            raise RuntimeError('check failed')
+        if len(checks) == 4:
+            stop.set()
+        return [NagiosCheckResult(hostname=host.hostname) for host in hosts]
+
+    def submit_results(checkresults):
+        if not stop.is_set():
+            raise ConnectionError('NRDP unreachable')
+        submitted.extend(checkresults)
+
+    daemon.run_daemon(
+        load_inventory=lambda: [make_host('A'), make_host('B')],
+        check=check,
+        submit_results=submit_results,
+        interval=0,
+        inventory_refresh=60,
+        flush_interval=0,
+        max_pending=3,
+        stop=stop)
+
+    # The failed check does not stop the daemon, and only the most recent
+    # results are kept while submissions fail
+    assert len(checks) == 4
+    assert len(submitted) == 5
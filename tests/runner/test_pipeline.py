@@ -0,0 +1,77 @@
+import urllib.error
+from station_config_check.config_check.diff_pool import DiffPool
+from station_config_check.config_check.golden_image import GoldenImageStore
+from station_config_check.nagios.nagios_api import NagiosHost
+from station_config_check.runner import pipeline
+from station_config_check.runner.scheduler import LinkClass, LinkScheduler
+
+
+def test_run_sweep(tmp_path):
+    hosts = (
+        NagiosHost(
+            hostname=f'XX-STA{i}-TITAN', ip_address=f'10.0.0.{i}',
+            install_type='default', status=1 if i == 0 else 0)
+        for i in range(4))
+
+    def fetch(host: NagiosHost) -> str:
+        if host.hostname == 'XX-STA1-TITAN':
+            raise urllib.error.URLError('timed out')
+        return 'setting on\n'
+
+    golden_images = GoldenImageStore(str(tmp_path), 'titansma')
+    golden_images.write('XX-STA3-TITAN', 'setting off\n')
+
+    submitted = []
+    submitter = pipeline.BatchSubmitter(submitted.append, batch_size=3)
+
+    pipeline.run_sweep(
+        hosts=hosts,
+        fetch=fetch,
+        golden_images=golden_images,
+        scheduler=LinkScheduler(
+            {'default': LinkClass(name='default', concurrency=2)}),
+        diff_pool=DiffPool(),
+        emit=submitter.add,
+        fetch_errors=(urllib.error.URLError,),
+        queue_size=1)
+    submitter.flush()
+
+    assert [len(batch) for batch in submitted] == [3, 1]
+    states = dict(
+        (result['hostname'], result['state'])
+        for batch in submitted for result in batch)
+    assert states == {
+        'XX-STA0-TITAN': 3,
+        'XX-STA1-TITAN': 2,
+        'XX-STA2-TITAN': 3,
+        'XX-STA3-TITAN': 2}
+    assert golden_images.load('XX-STA2-TITAN') == 'setting on\n'
+
+
+def test_run_sweep_unreadable_golden_image(tmp_path):
+    hosts = [
+        NagiosHost(
+            hostname=f'XX-STA{i}-TITAN', ip_address=f'10.0.0.{i}',
+            install_type='default', status=0)
+        for i in range(2)]
+
+    golden_images = GoldenImageStore(str(tmp_path), 'titansma')
+    golden_images.write('XX-STA1-TITAN', 'setting on\n')
+    # The golden image of the first host is corrupt
+    corrupt = tmp_path / 'XX' / 'STA0' / 'titansma' / 'latest.txt.gz'
+    corrupt.parent.mkdir(parents=True)
+    corrupt.write_bytes(b'not gzip')
+
+    results = []
+    pipeline.run_sweep(
+        hosts=hosts,
+        fetch=lambda host: 'setting on\n',
+        golden_images=golden_images,
+        scheduler=LinkScheduler({'default': LinkClass(name='default')}),
+        diff_pool=DiffPool(),
+        emit=results.append,
+        fetch_errors=())
+
+    states = dict((result['hostname'], result['state']) for result in results)
+    assert states == {'XX-STA0-TITAN': 3, 'XX-STA1-TITAN': 0}
+    assert corrupt.read_bytes() == b'not gzip'
@@ -0,0 +1,37 @@
+import socket
+import time
+from station_config_check.runner.probe import TcpProbe
+
+
+def test_tcp_probe(make_host):
+    listening = socket.socket()
+    listening.bind(('127.0.0.1', 0))
+    listening.listen(16)
+    port = listening.getsockname()[1]
+
+    closed = socket.socket()
+    closed.bind(('127.0.0.1', 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+
+    probe = TcpProbe(port=port, timeout=0.5, concurrency=2)
+    hosts = [make_host(f'up{i}', '127.0.0.1') for i in range(3)] + [
+        # Names are left for the download to resolve
+        make_host('named', 'localhost'),
+        # Documentation address, never answers
+        make_host('unroutable', '192.0.2.1'),
+    ]
+
+    start = time.monotonic()
+    reachable = dict(
+        (host.hostname, accepted) for host, accepted in probe.probe(hosts))
+    assert time.monotonic() - start < 2
+
+    assert reachable == {
+        'up0': True, 'up1': True, 'up2': True, 'named': True,
+        'unroutable': False}
+
+    probe = TcpProbe(port=closed_port, timeout=0.5)
+    assert list(probe.probe([make_host('refused', '127.0.0.1')])) == \
+        [(make_host('refused', '127.0.0.1'), False)]
+    listening.close()
@@ -0,0 +1,54 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from station_config_check.nagios.nagios_api import NagiosHost
+from station_config_check.runner.profiling import RunProfiler
+
+
+def test_run_profiler(tmp_path):
+    profiler = RunProfiler(
+        output_dir=str(tmp_path / 'profiles'),
+        profile=True,
+        host_sample=1,
+        trace_alloc=True
+    )
+    profiler.start()
+    fetch = profiler.profile_fetch(lambda host: 'config ' * 1000)
+    config = fetch(NagiosHost(
+        hostname='XX-STA1-TITAN', ip_address='10.0.0.1',
+        install_type='default', status=0))
+    profiler.stop()
+
+    assert config.startswith('config')
+    written = sorted(
+        name[len(profiler.prefix) + 1:]
+        for name in os.listdir(tmp_path / 'profiles'))
+    expected = ['alloc.txt', 'run.pstats', 'run.txt']
+    # From Python 3.12, hosts are only timed while the run is profiled
+    if sys.version_info < (3, 12):
+        expected[1:1] = [
+            'host-XX-STA1-TITAN.pstats', 'host-XX-STA1-TITAN.txt']
+    assert written == expected
+
+
+def test_run_profiler_threads(tmp_path):
+    profiler = RunProfiler(
+        output_dir=str(tmp_path / 'profiles'),
+        profile=True,
+        host_sample=1
+    )
+    profiler.start()
+    fetch = profiler.profile_fetch(lambda host: host.hostname)
+    hosts = [
+        NagiosHost(
+            hostname=f'XX-STA{i}-TITAN', ip_address=f'10.0.0.{i}',
+            install_type='default', status=0)
+        for i in range(4)]
+
+    # Sampled downloads run in worker threads while the run is profiled
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        configs = list(pool.map(fetch, hosts))
+    profiler.stop()
+
+    assert configs == [host.hostname for host in hosts]
+    assert os.path.exists(profiler._path('run.pstats'))
@@ -0,0 +1,59 @@
+import urllib.error
+import pytest
+from station_config_check.config_check.golden_image import GoldenImageStore
+from station_config_check.nagios.nagios_api import NagiosHost
+from station_config_check.runner import rebaseline
+
+
+def test_rebaseline(tmp_path, make_host):
+    hosts = [
+        make_host(hostname, install_type='vault') for hostname in
+        [f'XX-STA{i}-TITAN' for i in range(4)] +
+        ['XX-OTH1-TITAN', 'YY-STA1-TITAN']
+    ] + [make_host('XX-STA9-TITAN', install_type='surface')]
+
+    selector = rebaseline.HostSelector(
+        networks=['XX'], stations=['STA*'], install_types=['vault'])
+    selected = selector.filter(hosts)
+    assert [host.hostname for host in selected] == \
+        [f'XX-STA{i}-TITAN' for i in range(4)]
+
+    def fetch(host: NagiosHost) -> str:
+        if host.hostname == 'XX-STA3-TITAN':
+            raise urllib.error.URLError('timed out')
+        return 'firmware 2\n'
+
+    configs, failed = rebaseline.fetch_configs(
+        selected, fetch, fetch_errors=(urllib.error.URLError,), workers=2)
+    assert failed == ['XX-STA3-TITAN']
+
+    golden_images = GoldenImageStore(str(tmp_path), 'titansma')
+    golden_images.write('XX-STA0-TITAN', 'firmware 1\n')
+    golden_images.write('XX-STA1-TITAN', 'firmware 2\n')
+
+    changes = rebaseline.plan_rebaseline(selected, configs, golden_images)
+    assert [change.status for change in changes] == \
+        ['changed', 'unchanged', 'new']
+    assert changes[0].removed == ('firmware 1',)
+    summary = rebaseline.summarize_rebaseline(changes, failed)
+    assert summary.startswith('1 changed, 1 new, 1 unchanged, 1 unreachable')
+    assert '    + firmware 2' in summary
+
+    assert rebaseline.apply_rebaseline(changes, configs, golden_images) == 2
+    assert golden_images.load('XX-STA0-TITAN') == 'firmware 2\n'
+    assert golden_images.load('XX-STA2-TITAN') == 'firmware 2\n'
+
+
+def test_write_many_is_all_or_nothing(tmp_path):
+    golden_images = GoldenImageStore(str(tmp_path), 'titansma')
+    golden_images.write('XX-STA1-TITAN', 'firmware 1\n')
+
+    # The hostname of the second host has no station to store it under
+    with pytest.raises(ValueError):
+        golden_images.write_many(
+            {'XX-STA1-TITAN': 'firmware 2\n', 'XX': 'firmware 2\n'})
+
+    assert golden_images.load('XX-STA1-TITAN') == 'firmware 1\n'
+    assert [path.name for path in
+            (tmp_path / 'XX' / 'STA1' / 'titansma').iterdir()] == \
+        ['latest.txt']
@@ -0,0 +1,131 @@
+import configparser
+import time
+from station_config_check.nagios.nagios_api import NagiosHost
+from station_config_check.runner import scheduler
+
+
+def test_load_link_classes():
+    config = configparser.ConfigParser()
+    config.read_string(
+        '[nagios]\napi_key = x\n' +
+        '[link:vsat]\nconcurrency = 2\nbyte_rate = 1000\nspread = yes\n')
+
+    link_classes = scheduler.load_link_classes(config)
+
+    assert link_classes['default'].concurrency == 1
+    assert link_classes['vsat'].concurrency == 2
+    assert link_classes['vsat'].byte_rate == 1000
+    assert link_classes['vsat'].spread is True
+
+
+def test_fetch_all():
+    hosts = [
+        NagiosHost(
+            hostname=f'XX-STA{i}-TITAN', ip_address=f'10.0.0.{i}',
+            install_type='default', status=0,
+            link_class='vsat' if i % 2 else 'unknown')
+        for i in range(6)]
+
+    def fetch(host: NagiosHost) -> str:
+        if host.hostname == 'XX-STA3-TITAN':
+            raise ValueError('download failed')
+        return host.ip_address
+
+    link_scheduler = scheduler.LinkScheduler(link_classes={
+        'default': scheduler.LinkClass(name='default', concurrency=2),
+        'vsat': scheduler.LinkClass(name='vsat', byte_rate=1e6)
+    })
+    results = dict(
+        (host.hostname, config)
+        for host, config in link_scheduler.fetch_all(hosts, fetch))
+
+    assert len(results) == 6
+    assert results['XX-STA0-TITAN'] == '10.0.0.0'
+    assert isinstance(results['XX-STA3-TITAN'], ValueError)
+
+
+def test_fetch_all_slow_link():
+    # Hosts of a slow link come first in the inventory, and must not hold
+    # back the hosts of the other links
+    def inventory():
+        for i in range(20):
+            yield NagiosHost(
+                hostname=f'XX-STA{i}-TITAN', ip_address=f'10.0.0.{i}',
+                install_type='default', status=0,
+                link_class='vsat' if i < 10 else 'default')
+
+    def fetch(host: NagiosHost) -> str:
+        if host.link_class == 'vsat':
+            time.sleep(0.05)
+        return host.ip_address
+
+    link_scheduler = scheduler.LinkScheduler(link_classes={
+        'default': scheduler.LinkClass(name='default', concurrency=2),
+        'vsat': scheduler.LinkClass(name='vsat')
+    })
+    order = [
+        host.link_class
+        for host, _ in link_scheduler.fetch_all(
+            inventory(), fetch, queue_size=8)]
+
+    assert len(order) == 20
+    assert order.index('default') < order.index('vsat')
+
+
+def test_fetch_all_bounded():
+    taken = []
+    fetched = []
+    ahead = []
+
+    def inventory():
+        for i in range(30):
+            taken.append(i)
+            ahead.append(len(taken) - len(fetched))
+            yield NagiosHost(
+                hostname=f'XX-STA{i}-TITAN', ip_address=f'10.0.0.{i}',
+                install_type='default', status=0, link_class='vsat')
+
+    def fetch(host: NagiosHost) -> str:
+        time.sleep(0.005)
+        fetched.append(host)
+        return host.ip_address
+
+    link_scheduler = scheduler.LinkScheduler(link_classes={
+        'default': scheduler.LinkClass(name='default'),
+        'vsat': scheduler.LinkClass(name='vsat')
+    })
+    results = list(link_scheduler.fetch_all(inventory(), fetch, queue_size=2))
+
+    assert len(results) == 30
+    # Hosts waiting on the link and in the shared room, the host being
+    # downloaded and the host waiting for room
+    assert max(ahead) <= 2 + 2 + 1 + 1
+
+
+def test_fetch_all_spread_generator():
+    def inventory():
+        for i in range(4):
+            yield NagiosHost(
+                hostname=f'XX-STA{i}-TITAN', ip_address=f'10.0.0.{i}',
+                install_type='default', status=0, link_class='vsat')
+
+    starts = []
+
+    def fetch(host: NagiosHost) -> str:
+        starts.append(time.monotonic())
+        return host.ip_address
+
+    link_scheduler = scheduler.LinkScheduler(
+        link_classes={
+            'default': scheduler.LinkClass(name='default'),
+            'vsat': scheduler.LinkClass(
+                name='vsat', concurrency=4, spread=True)
+        },
+        window=0.4)
+    start = time.monotonic()
+    results = list(link_scheduler.fetch_all(inventory(), fetch))
+
+    assert len(results) == 4
+    # Downloads start every 0.4 * SPREAD_FRACTION / 4 seconds
+    spacing = 0.4 * scheduler.SPREAD_FRACTION / 4
+    assert max(starts) - start >= 3 * spacing - 0.01
@@ -0,0 +1,48 @@
+import pytest
+from station_config_check.nagios.nagios_api import NagiosHost
+from station_config_check.runner.sharding import InvalidShard, Shard
+
+
+def test_shards_cover_fleet_once():
+    hostnames = [f'station{i}' for i in range(1000)]
+    shards = [Shard(index=i, count=4) for i in range(1, 5)]
+
+    owners = [
+        [shard.index for shard in shards if shard.owns(hostname)]
+        for hostname in hostnames
+    ]
+
+    assert all(len(owner) == 1 for owner in owners)
+    sizes = [sum(owner == [i] for owner in owners) for i in range(1, 5)]
+    assert all(150 < size < 350 for size in sizes)
+
+
+def test_shard_membership_stable():
+    hostnames = [f'station{i}' for i in range(1000)]
+    four = Shard(index=1, count=4)
+    five = Shard(index=1, count=5)
+
+    moved = sum(
+        four.shard_of(hostname) != five.shard_of(hostname)
+        for hostname in hostnames)
+
+    # Only the hosts taken over by the new shard move
+    assert moved == sum(five.shard_of(hostname) == 5 for hostname in hostnames)
+    assert moved < 300
+
+
+def test_shard_filter():
+    hosts = [
+        NagiosHost(
+            hostname=f'station{i}', ip_address='', install_type='', status=0)
+        for i in range(10)
+    ]
+    shard = Shard.parse('2/3')
+
+    assert list(shard.filter(hosts)) == [
+        host for host in hosts if shard.owns(host.hostname)]
+
+    with pytest.raises(InvalidShard):
+        Shard.parse('4/3')
+    with pytest.raises(InvalidShard):
+        Shard.parse('two')
@@ -0,0 +1,40 @@
+from station_config_check.nagios.nrdp import NagiosCheckResult, \
+    NagiosCheckResults, NRDPUnavailable
+from station_config_check.runner.spool import SubmissionSpool
+
+
+def test_spool(tmp_path):
+    path = str(tmp_path / 'spool.json')
+    submitted = []
+    available = False
+
+    def submit_results(checkresults: NagiosCheckResults):
+        if not available:
+            raise NRDPUnavailable('503')
+        submitted.extend(checkresults)
+
+    spool = SubmissionSpool(path, backoff=3600)
+    submit = spool.submitting(submit_results)
+    submit(NagiosCheckResults([
+        NagiosCheckResult('XX-STA1-TITAN', 'Config Check', 0, 'old'),
+        NagiosCheckResult('XX-STA2-TITAN', 'Config Check', 0, 'ok')]))
+    # Only the newest result of a host and service is kept
+    submit(NagiosCheckResults([
+        NagiosCheckResult('XX-STA1-TITAN', 'Config Check', 2, 'new')]))
+    assert submitted == []
+
+    # The next run waits for the backoff before retrying
+    available = True
+    spool = SubmissionSpool(path, backoff=3600)
+    assert len(spool) == 2
+    assert not spool.retry(submit_results)
+    assert submitted == []
+
+    # Results accepted by Nagios supersede spooled ones and flush the spool
+    submit = spool.submitting(submit_results)
+    submit(NagiosCheckResults([
+        NagiosCheckResult('XX-STA2-TITAN', 'Config Check', 1, 'newer')]))
+    assert [(result.hostname, result.output) for result in submitted] == [
+        ('XX-STA2-TITAN', 'newer'), ('XX-STA1-TITAN', 'new')]
+    assert len(spool) == 0
+    assert not (tmp_path / 'spool.json').exists()
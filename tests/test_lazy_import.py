@@ -0,0 +1,38 @@
+import sys
+import threading
+from station_config_check.lazy_import import lazy_import
+
+
+def test_lazy_import_threads(tmp_path, monkeypatch):
+    # A module slow enough to load that every thread uses it while it is
+    # still loading
+    (tmp_path / 'slow_module.py').write_text(
+        'import time\n'
+        'time.sleep(0.2)\n'
+        'VALUE = 42\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'slow_module', raising=False)
+
+    module = lazy_import('slow_module')
+    assert 'slow_module' not in sys.modules
+
+    barrier = threading.Barrier(16)
+    values = []
+    errors = []
+
+    def use():
+        barrier.wait()
+        try:
+            values.append(module.VALUE)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=use) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert values == [42] * 16
+    sys.modules.pop('slow_module', None)
@@ -0,0 +1,76 @@
+import http.server
+import threading
+from station_config_check.config_check import web_interface
+
+
+class StubDigitizer(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+    # Close the connection without notice after this many requests
+    requests_per_connection = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+        self.served = 0
+
+    def respond(self, body: bytes, cookie: bool = False):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        if cookie:
+            self.send_header('Set-Cookie', 'session=1; Path=/')
+        self.end_headers()
+        self.wfile.write(body)
+        self.served += 1
+        if self.served == self.requests_per_connection:
+            self.close_connection = True
+
+    def do_GET(self):
+        if self.path == '/key':
+            self.respond(b'somekey', cookie=True)
+        else:
+            assert self.headers['Cookie'] == 'session=1'
+            self.respond(b'some config')
+
+    def do_POST(self):
+        self.respond(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+def download(port: int) -> str:
+    cookiejar = web_interface.GlobalCookieJar()
+    keep_alive = web_interface.KeepAliveHandler()
+    digitizer = web_interface.DigitizerInterface(
+        address=f'127.0.0.1:{port}',
+        username='someone',
+        password='fakepass',
+        opener=cookiejar.getOpener(keep_alive))
+    try:
+        digitizer.login(cookiejar)
+        return digitizer.getConfiguration()
+    finally:
+        keep_alive.close()
+
+
+def test_keep_alive():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubDigitizer)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        port = server.server_address[1]
+
+        StubDigitizer.connections = 0
+        assert download(port) == 'some config'
+        assert StubDigitizer.connections == 1
+
+        # The device dropping the connection after the login falls back to a
+        # new connection
+        StubDigitizer.connections = 0
+        StubDigitizer.requests_per_connection = 2
+        assert download(port) == 'some config'
+        assert StubDigitizer.connections == 2
+    finally:
+        server.shutdown()
+        server.server_close()